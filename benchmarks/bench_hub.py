@@ -0,0 +1,106 @@
+"""Hub polling throughput and CPU cost against locally spawned stub agents.
+
+Stub agents run in separate processes and answer /metrics with a canned body over
+keep-alive HTTP/1.1, so only the hub's own work is measured in this process.
+
+    python benchmarks/bench_hub.py --agents 500 --refresh-rate 2 --duration 20
+"""
+import argparse
+import json
+import multiprocessing
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ez_monitor.hub import Hub
+
+BODY = json.dumps({
+    'cpu': {'usage': 12.5},
+    'memory': {'percent': 40.0},
+    'disk': {'percent': 55.0},
+    'network': {'upload_speed': 0.1, 'download_speed': 0.2, 'static_info': {'general': {'hostname': 'stub'}}},
+    'docker_containers': [],
+    'top_processes': [{'pid': i, 'name': 'stub', 'cpu_percent': 1.0} for i in range(10)],
+    'last_update': '2024-01-01T00:00:00',
+}).encode('utf-8')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_stubs(count, ports):
+    servers = [ThreadingHTTPServer(('127.0.0.1', 0), StubHandler) for _ in range(count)]
+    for server in servers:
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    ports.put([server.server_address[1] for server in servers])
+    threading.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark hub polling against stub agents')
+    parser.add_argument('--agents', type=int, default=500, help='Number of stub agents')
+    parser.add_argument('--stub-processes', type=int, default=4, help='Processes serving the stub agents')
+    parser.add_argument('--refresh-rate', type=float, default=2, help='Hub refresh rate in seconds')
+    parser.add_argument('--workers', type=int, default=32, help='Concurrent hub requests')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds to measure')
+    args = parser.parse_args()
+
+    ports = multiprocessing.Queue()
+    per_process = -(-args.agents // args.stub_processes)
+    processes = []
+    for i in range(args.stub_processes):
+        count = min(per_process, args.agents - i * per_process)
+        if count <= 0:
+            break
+        process = multiprocessing.Process(target=run_stubs, args=(count, ports), daemon=True)
+        process.start()
+        processes.append(process)
+    urls = [f"http://127.0.0.1:{port}" for _ in processes for port in ports.get()]
+
+    hub = Hub(urls, refresh_rate=args.refresh_rate, timeout=1.5, workers=args.workers)
+    polls = [0]
+    poll = hub.poll
+
+    def counted_poll(agent):
+        poll(agent)
+        polls[0] += 1
+
+    hub.poll = counted_poll
+    threading.Thread(target=hub.run, daemon=True).start()
+
+    # Let connections warm up before measuring
+    time.sleep(args.refresh_rate * 2)
+    start_polls, start_cpu, start_time = polls[0], time.process_time(), time.perf_counter()
+    time.sleep(args.duration)
+    elapsed = time.perf_counter() - start_time
+    cpu = time.process_time() - start_cpu
+    hub.stop()
+
+    overview = hub.overview()
+    up = sum(1 for agent in overview if agent['status'] == 'up')
+    latencies = sorted(agent['latency'] for agent in overview if agent['latency'] is not None)
+    print(f"agents            {len(urls)}")
+    print(f"polls/s           {(polls[0] - start_polls) / elapsed:.1f} (target {len(urls) / args.refresh_rate:.1f})")
+    print(f"hub CPU           {cpu / elapsed * 100:.1f}% of one core")
+    print(f"agents up         {up}")
+    if latencies:
+        print(f"p99 latency       {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+
+    for process in processes:
+        process.terminate()
+
+
+if __name__ == '__main__':
+    main()
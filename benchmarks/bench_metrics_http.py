@@ -0,0 +1,128 @@
+"""Requests per second of /metrics under concurrent clients.
+
+Compares the pre-serialized snapshot handler with the previous implementation, which
+rebuilt and re-encoded the response under metrics_lock on every request. Metrics are
+synthetic and republished in the background, so no collectors run.
+
+    python benchmarks/bench_metrics_http.py --clients 32 --duration 10
+"""
+import argparse
+import http.client
+import random
+import threading
+import time
+
+from flask import jsonify, request
+from werkzeug.serving import make_server
+
+from ez_monitor import app as ez_app
+
+
+def synthetic_metrics(disks=20, processes=10, containers=10):
+    process = {'pid': 1, 'name': 'python', 'status': 'running', 'username': 'root',
+               'cpu_percent': 12.5, 'memory_percent': 1.5, 'memory_mb': 120.5, 'cpu_time': 33.2}
+    container = {'id': 'f' * 64, 'short_id': 'f' * 12, 'name': 'web', 'status': 'running', 'image': 'nginx:latest',
+                 'cpu_percent': 1.5, 'mem_percent': 2.5, 'mem_usage': '20.00MB', 'mem_limit': '800.00MB',
+                 'net_io': '1.00MB / 2.00MB', 'block_io': '0.00MB / 0.00MB', 'pid': 1234}
+    return {
+        'cpu': {'count': 8, 'name': 'Synthetic CPU', 'usage': random.random() * 100, 'frequency': '2400 MHz',
+                'tasks': 400, 'threads': 8, 'running': 2, 'load_average': '0.50, 0.40, 0.30',
+                'user': 10.0, 'system': 5.0, 'idle': 85.0},
+        'memory': {'total': '15.52', 'used': '7.10', 'percent': 45.7, 'available': '8.42',
+                   'swap_total': '2.00', 'swap_used': '0.10', 'swap_percent': 5.0},
+        'disk': {f'/mnt/disk{i}': {'device': f'/dev/sd{i}', 'mountpoint': f'/mnt/disk{i}', 'fstype': 'ext4',
+                                   'opts': 'rw', 'remote': False, 'total': '100.00 GB', 'used': '50.00 GB',
+                                   'free': '50.00 GB', 'percent': 50.0} for i in range(disks)},
+        'gpu': {'error': 'No GPU found'},
+        'disk_io': {'read_speed': random.random(), 'write_speed': random.random(), 'filesystem': 'ext4'},
+        'network': {'upload_speed': random.random(), 'download_speed': random.random()},
+        'network_info': {'general': {'hostname': 'bench', 'local_ip': '10.0.0.2', 'public_ip': 'Unable to retrieve'}},
+        'top_processes': [dict(process, pid=i) for i in range(processes)],
+        'docker_containers': [dict(container, name=f'web{i}') for i in range(containers)],
+    }
+
+
+def publish(values):
+    for metric, value in values.items():
+        ez_app.publish_metric(metric, value, time.time(), 0.001)
+
+
+def legacy_get_metrics():
+    # The /metrics handler before snapshots were pre-serialized
+    selected_disk = request.args.get('disk', '/')
+    with ez_app.metrics_lock:
+        metrics = ez_app.metrics
+        response = {
+            'cpu': metrics.get('cpu', {}),
+            'memory': metrics.get('memory', {}),
+            'disk': metrics.get('disk', {}).get(selected_disk, ez_app.get_disk_info(selected_disk)),
+            'gpu': metrics.get('gpu', {}),
+            'disk_io': metrics.get('disk_io', {}),
+            'network': {**metrics.get('network', {}), 'static_info': metrics.get('network_info', {})},
+            'top_processes': metrics.get('top_processes', []),
+            'docker_containers': metrics.get('docker_containers'),
+        }
+        if ez_app.last_update_time:
+            response['last_update'] = ez_app.last_update_time.isoformat()
+        response['metric_collection_times'] = {k: f"{v:.6f}" for k, v in ez_app.metric_collection_times.items()}
+    return jsonify(response)
+
+
+def run_clients(port, path, clients, duration, headers):
+    counts = [0] * clients
+    latencies = [[] for _ in range(clients)]
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            connection.request('GET', path, headers=headers)
+            connection.getresponse().read()
+            connection.close()
+            latencies[index].append(time.perf_counter() - start)
+            counts[index] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    all_latencies = sorted(latency for client_latencies in latencies for latency in client_latencies)
+    p99 = all_latencies[int(len(all_latencies) * 0.99)] if all_latencies else 0
+    return sum(counts) / duration, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /metrics requests per second')
+    parser.add_argument('--clients', type=int, default=32, help='Number of concurrent clients')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run each endpoint')
+    parser.add_argument('--publish-interval', type=float, default=0.5, help='Seconds between synthetic publishes')
+    parser.add_argument('--gzip', action='store_true', help='Request gzip encoded responses')
+    args = parser.parse_args()
+
+    ez_app.app.add_url_rule('/metrics-legacy', 'metrics_legacy', legacy_get_metrics)
+    publish(synthetic_metrics())
+
+    stop = threading.Event()
+
+    def publisher():
+        while not stop.wait(args.publish_interval):
+            publish(synthetic_metrics())
+
+    threading.Thread(target=publisher, daemon=True).start()
+    server = make_server('127.0.0.1', 0, ez_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    headers = {'Accept-Encoding': 'gzip'} if args.gzip else {}
+    for label, path in [('before (legacy)', '/metrics-legacy?disk=/mnt/disk0'), ('after (snapshot)', '/metrics?disk=/mnt/disk0')]:
+        rps, p99 = run_clients(server.port, path, args.clients, args.duration, headers)
+        print(f"{label:<18} {rps:10.1f} req/s   p99 {p99 * 1000:8.2f} ms")
+
+    stop.set()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Cost of the system counter reads with the psutil and /proc fast-path backends.
+
+Times each call the CPU, memory, disk I/O and network collectors make, and one full
+cycle of them, with psutil and with ProcfsBackend on the local machine. Every timed run
+starts a new cycle, so ProcfsBackend parses /proc/stat again instead of reusing the
+parse it shares between the CPU calls of a cycle. Linux only.
+
+    python benchmarks/bench_procfs.py --iterations 2000
+"""
+import argparse
+import statistics
+import time
+
+import psutil
+
+from ez_monitor.procfs import ProcfsBackend
+
+CALLS = [
+    ('cpu_percent', lambda s: s.cpu_percent(interval=None)),
+    ('cpu_times_percent', lambda s: s.cpu_times_percent(interval=None)),
+    ('cpu_times(percpu)', lambda s: s.cpu_times(percpu=True)),
+    ('cpu_freq', lambda s: s.cpu_freq()),
+    ('getloadavg', lambda s: s.getloadavg()),
+    ('virtual_memory', lambda s: s.virtual_memory()),
+    ('swap_memory', lambda s: s.swap_memory()),
+    ('disk_io_counters(perdisk)', lambda s: s.disk_io_counters(perdisk=True)),
+    ('net_io_counters(pernic)', lambda s: s.net_io_counters(pernic=True)),
+]
+
+
+def cycle(system):
+    for _, call in CALLS:
+        call(system)
+
+
+def new_cycle(system):
+    # Drops the /proc/stat parse shared within a cycle, psutil has nothing to drop
+    if isinstance(system, ProcfsBackend):
+        system.stat_time = None
+
+
+def time_call(func, system, iterations):
+    new_cycle(system)
+    func(system)  # Warm up
+    durations = []
+    for _ in range(iterations):
+        new_cycle(system)
+        start_time = time.perf_counter()
+        func(system)
+        durations.append(time.perf_counter() - start_time)
+    return statistics.mean(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare psutil with the /proc fast-path backend')
+    parser.add_argument('--iterations', type=int, default=1000, help='Runs per call')
+    parser.add_argument('--proc', default='/proc', help='/proc root, e.g. a captured copy')
+    parser.add_argument('--sys', default='/sys', help='/sys root, e.g. a captured copy')
+    args = parser.parse_args()
+
+    procfs = ProcfsBackend(args.proc, args.sys)
+    print(f"{'call':<28} {'psutil':>12} {'procfs':>12} {'speedup':>8}")
+    for name, func in CALLS + [('full cycle', cycle)]:
+        psutil_time = time_call(func, psutil, args.iterations)
+        procfs_time = time_call(func, procfs, args.iterations)
+        print(f"{name:<28} {psutil_time * 1e6:9.1f} us {procfs_time * 1e6:9.1f} us {psutil_time / procfs_time:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Startup time of the agent: module import, first dashboard page and first full /metrics.
+
+Each run starts a fresh `python -m ez_monitor` process on a free port and polls it until
+the dashboard is served and /metrics carries CPU data. With --budget the script exits
+with status 1 when the median time to first metrics is over budget, so it can guard CI.
+
+    python benchmarks/bench_startup.py --runs 5 --budget 3
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def import_time():
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import ez_monitor.app'], check=True)
+    return time.perf_counter() - start_time
+
+
+def fetch(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, response.read()
+    except OSError:
+        return None, None
+
+
+def startup_time(cache_dir, offline, timeout):
+    port = free_port()
+    command = [sys.executable, '-m', 'ez_monitor', '--host', '127.0.0.1', '-p', str(port), '--cache-dir', cache_dir]
+    if offline:
+        command.append('--offline')
+    start_time = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    first_page = first_metrics = None
+    try:
+        while time.perf_counter() - start_time < timeout:
+            if first_page is None and fetch(f"http://127.0.0.1:{port}/")[0] == 200:
+                first_page = time.perf_counter() - start_time
+            if first_page is not None:
+                status, body = fetch(f"http://127.0.0.1:{port}/metrics")
+                if status == 200 and json.loads(body).get('cpu'):
+                    first_metrics = time.perf_counter() - start_time
+                    break
+            time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait()
+    return first_page, first_metrics
+
+
+def summarize(name, values):
+    values = [v for v in values if v is not None]
+    if not values:
+        print(f"{name:<22} no result")
+        return None
+    median = statistics.median(values)
+    print(f"{name:<22} median {median:6.3f}s  min {min(values):6.3f}s  max {max(values):6.3f}s")
+    return median
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark agent startup time')
+    parser.add_argument('--runs', type=int, default=5, help='Number of agent starts')
+    parser.add_argument('--timeout', type=float, default=30, help='Seconds to wait for one agent to serve metrics')
+    parser.add_argument('--offline', action='store_true', help='Start the agent with --offline')
+    parser.add_argument('--budget', type=float, default=None, help='Fail when the median time to first metrics exceeds this many seconds')
+    args = parser.parse_args()
+
+    imports = [import_time() for _ in range(args.runs)]
+    pages, first_metrics = [], []
+    # The first run starts with an empty cache, later runs reuse the one it wrote
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for _ in range(args.runs):
+            page, metrics = startup_time(os.path.join(cache_dir, 'cache'), args.offline, args.timeout)
+            pages.append(page)
+            first_metrics.append(metrics)
+
+    summarize('import ez_monitor.app', imports)
+    summarize('first page', pages)
+    median = summarize('first metrics', first_metrics)
+    print(f"cold start first metrics: {first_metrics[0] if first_metrics[0] is not None else 'no result'}")
+    if args.budget is not None and (median is None or median > args.budget):
+        print(f"over budget of {args.budget}s")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Collector, update cycle and /metrics benchmarks against a synthetic system.
+
+Runs offline on the fake backend in fake_system.py, for one or more process table
+sizes, and reports:
+
+- per collector latency (mean, p50, p99) and allocations (peak and retained bytes)
+- the full update cycle, every collector run and published once
+- /metrics requests per second and p99 latency under concurrent clients
+
+Results are written as JSON, and --compare prints the change against an earlier run.
+
+    python benchmarks/bench_suite.py --processes 1000,10000,100000 --output results.json
+    python benchmarks/bench_suite.py --compare results.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+from werkzeug.serving import make_server
+
+from bench_metrics_http import run_clients
+from fake_system import FakeSystem, install
+from ez_monitor import app as ez_app
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def latency_stats(durations):
+    durations = sorted(durations)
+    return {
+        'mean': sum(durations) / len(durations),
+        'p50': percentile(durations, 0.5),
+        'p99': percentile(durations, 0.99),
+    }
+
+
+def measure_allocations(func):
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        func()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'peak_bytes': peak - before, 'retained_bytes': after - before}
+
+
+def bench_collectors(collectors, iterations):
+    results = {}
+    for metric, func in collectors:
+        func()  # Warm up caches and counters
+        durations = []
+        for _ in range(iterations):
+            start_time = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - start_time)
+        results[metric] = {**latency_stats(durations), 'allocations': measure_allocations(func)}
+    return results
+
+
+def bench_update_cycle(collectors, iterations):
+    durations = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        for metric, func in collectors:
+            collect_start = time.perf_counter()
+            value = func()
+            on_result = ez_app.publish_process_scan if metric == 'process_scan' else ez_app.publish_metric
+            on_result(metric, value, time.time(), time.perf_counter() - collect_start)
+        durations.append(time.perf_counter() - start_time)
+    return latency_stats(durations)
+
+
+def bench_http(clients, duration):
+    server = make_server('127.0.0.1', 0, ez_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        results = {}
+        for label, headers in [('identity', {}), ('gzip', {'Accept-Encoding': 'gzip'})]:
+            rps, p99 = run_clients(server.port, '/metrics', clients, duration, headers)
+            results[label] = {'requests_per_second': rps, 'p99': p99}
+        return results
+    finally:
+        server.shutdown()
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    for run in results['runs']:
+        print(f"\n{run['processes']} processes")
+        for metric, stats in run['collectors'].items():
+            print(f"  {metric:<28} mean {stats['mean'] * 1000:9.3f} ms  p99 {stats['p99'] * 1000:9.3f} ms  "
+                  f"peak {stats['allocations']['peak_bytes'] / 1024:9.1f} KB")
+        cycle = run['update_cycle']
+        print(f"  {'update cycle':<28} mean {cycle['mean'] * 1000:9.3f} ms  p99 {cycle['p99'] * 1000:9.3f} ms")
+        for label, stats in run.get('http', {}).items():
+            print(f"  {'/metrics ' + label:<28} {stats['requests_per_second']:9.1f} req/s  p99 {stats['p99'] * 1000:9.3f} ms")
+
+
+def compare(results, baseline):
+    # Positive changes are slower, or fewer requests per second for /metrics
+    print(f"\nChange against {baseline.get('revision') or 'baseline'}")
+    baseline_runs = {run['processes']: run for run in baseline['runs']}
+    for run in results['runs']:
+        old = baseline_runs.get(run['processes'])
+        if old is None:
+            continue
+        print(f"{run['processes']} processes")
+        for metric, stats in run['collectors'].items():
+            if metric in old['collectors'] and old['collectors'][metric]['mean'] > 0:
+                change = stats['mean'] / old['collectors'][metric]['mean'] - 1
+                print(f"  {metric:<28} {change * 100:+7.1f}%")
+        if old['update_cycle']['mean'] > 0:
+            print(f"  {'update cycle':<28} {(run['update_cycle']['mean'] / old['update_cycle']['mean'] - 1) * 100:+7.1f}%")
+        for label, stats in run.get('http', {}).items():
+            old_rps = old.get('http', {}).get(label, {}).get('requests_per_second')
+            if old_rps:
+                print(f"  {'/metrics ' + label:<28} {(1 - stats['requests_per_second'] / old_rps) * 100:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark collectors and /metrics against a synthetic system')
+    parser.add_argument('--processes', default='1000,10000,100000', help='Comma separated process table sizes')
+    parser.add_argument('--disks', type=int, default=32, help='Number of synthetic disks and mounts')
+    parser.add_argument('--nics', type=int, default=16, help='Number of synthetic network interfaces')
+    parser.add_argument('--containers', type=int, default=10, help='Number of synthetic containers')
+    parser.add_argument('--iterations', type=int, default=20, help='Runs per collector and update cycles')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent /metrics clients, 0 to skip')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds of /metrics load per encoding')
+    parser.add_argument('--output', default=None, help='Write the results to this JSON file')
+    parser.add_argument('--compare', default=None, help='Compare with the results in this JSON file')
+    args = parser.parse_args()
+
+    results = {
+        'revision': git_revision(),
+        'timestamp': time.time(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'parameters': vars(args),
+        'runs': [],
+    }
+    for processes in [int(count) for count in args.processes.split(',') if count]:
+        install(FakeSystem(processes=processes, disks=args.disks, nics=args.nics, containers=args.containers))
+        collectors = ez_app.create_collectors()
+        run = {
+            'processes': processes,
+            'collectors': bench_collectors(collectors, args.iterations),
+            'update_cycle': bench_update_cycle(collectors, args.iterations),
+        }
+        if args.clients > 0:
+            run['http'] = bench_http(args.clients, args.duration)
+        results['runs'].append(run)
+
+    print_results(results)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Size and encode cost of the JSON and compact /metrics encodings.
+
+Collects one full snapshot of a synthetic system (see fake_system.py) and encodes
+its /metrics body as JSON and in the compact format, reporting raw and gzip sizes,
+the encode time including gzip, and the Python reference decode time.
+
+    python benchmarks/bench_wire.py --processes 10000 --containers 50
+"""
+import argparse
+import json
+import statistics
+import time
+
+from fake_system import FakeSystem, install
+from ez_monitor import app as ez_app
+from ez_monitor.compact import decode_compact
+from ez_monitor.snapshot import MetricsSnapshot
+
+
+def time_call(func, iterations):
+    func()  # Warm up
+    durations = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start_time)
+    return statistics.mean(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the JSON and compact /metrics encodings')
+    parser.add_argument('--processes', type=int, default=10000, help='Synthetic process table size')
+    parser.add_argument('--disks', type=int, default=32, help='Number of synthetic disks and mounts')
+    parser.add_argument('--nics', type=int, default=16, help='Number of synthetic network interfaces')
+    parser.add_argument('--containers', type=int, default=10, help='Number of synthetic containers')
+    parser.add_argument('--iterations', type=int, default=200, help='Encodes per format')
+    args = parser.parse_args()
+
+    install(FakeSystem(processes=args.processes, disks=args.disks, nics=args.nics, containers=args.containers))
+    for metric, func in ez_app.create_collectors():
+        func()  # Rates need two samples
+        on_result = ez_app.publish_process_scan if metric == 'process_scan' else ez_app.publish_metric
+        on_result(metric, func(), time.time(), 0)
+    snapshot = ez_app.get_snapshot()
+    disk = next(iter(snapshot.disks), '/')
+
+    def encode(compact):
+        return MetricsSnapshot(snapshot.snapshot_id, snapshot.response, snapshot.disks).get_body(disk, compact)
+
+    _, json_data, json_gzip = encode(False)
+    _, compact_data, compact_gzip = encode(True)
+    print(f"{'format':<8} {'bytes':>10} {'gzip':>10} {'encode':>12} {'decode':>12}")
+    print(f"{'json':<8} {len(json_data):>10} {len(json_gzip):>10} "
+          f"{time_call(lambda: encode(False), args.iterations) * 1e3:9.2f} ms "
+          f"{time_call(lambda: json.loads(json_data), args.iterations) * 1e3:9.2f} ms")
+    print(f"{'compact':<8} {len(compact_data):>10} {len(compact_gzip):>10} "
+          f"{time_call(lambda: encode(True), args.iterations) * 1e3:9.2f} ms "
+          f"{time_call(lambda: decode_compact(compact_data), args.iterations) * 1e3:9.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
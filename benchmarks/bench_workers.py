@@ -0,0 +1,100 @@
+"""/metrics throughput of `ez_monitor --workers N` as the number of workers grows.
+
+For every worker count a fresh agent is started, then client processes hammer
+/metrics for a fixed duration. Clients run in their own processes, so the load
+generator is not limited to one core. Throughput should grow close to linearly
+with the number of workers until the cores run out.
+
+    python benchmarks/bench_workers.py --workers 1,2,4,8 --clients 16 --duration 10
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1) as response:
+                if b'"cpu":{"' in response.read():
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.1)
+    return False
+
+
+def client(port, duration, results):
+    count = 0
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start_time = time.perf_counter()
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        connection.request('GET', '/metrics')
+        connection.getresponse().read()
+        connection.close()
+        latencies.append(time.perf_counter() - start_time)
+        count += 1
+    results.put((count, latencies))
+
+
+def run_load(port, clients, duration):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=client, args=(port, duration, results)) for _ in range(clients)]
+    for process in processes:
+        process.start()
+    counts, latencies = 0, []
+    for _ in processes:
+        count, client_latencies = results.get()
+        counts += count
+        latencies.extend(client_latencies)
+    for process in processes:
+        process.join()
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+    return counts / duration, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /metrics scaling across worker processes')
+    parser.add_argument('--workers', default=','.join(str(n) for n in (1, 2, 4, 8) if n <= (os.cpu_count() or 1)),
+                        help='Comma separated worker counts')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent client processes')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of load per worker count')
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'workers':>8} {'req/s':>10} {'p99 ms':>9} {'speedup':>8}")
+    for workers in [int(n) for n in args.workers.split(',') if n]:
+        port = free_port()
+        command = [sys.executable, '-m', 'ez_monitor', '--host', '127.0.0.1', '-p', str(port), '--offline',
+                   '--cache-dir', '', '--workers', str(workers)]
+        agent = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_ready(port, 30):
+                print(f"{workers:>8} agent did not become ready")
+                continue
+            rps, p99 = run_load(port, args.clients, args.duration)
+        finally:
+            agent.terminate()
+            agent.wait()
+        baseline = baseline or rps
+        print(f"{workers:>8} {rps:10.1f} {p99 * 1000:9.2f} {rps / baseline:7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Stand-in for `nvidia-smi` that streams canned query output for synthetic GPUs.
+
+Understands the --query-gpu, --query-compute-apps and --loop-ms options the GPU
+collector passes, and prints a block of rows per loop like the real tool:
+
+    ez_monitor --nvidia-smi "python benchmarks/fake_nvidia_smi.py --gpus 8"
+"""
+import argparse
+import random
+import sys
+import time
+
+
+def gpu_row(index, field):
+    values = {
+        'index': str(index),
+        'uuid': f"GPU-{index:08x}-0000-0000-0000-000000000000",
+        'name': 'Synthetic GPU',
+        'driver_version': '550.00',
+        'utilization.gpu': str(random.randint(0, 100)),
+        'utilization.memory': str(random.randint(0, 100)),
+        'memory.used': str(random.randint(0, 81920)),
+        'memory.total': '81920',
+        'temperature.gpu': str(random.randint(30, 85)),
+        'power.draw': f"{random.uniform(60, 700):.2f}",
+        'power.limit': '700.00',
+    }
+    return values.get(field, '[N/A]')
+
+
+def process_row(index, pid, field):
+    values = {
+        'gpu_uuid': f"GPU-{index:08x}-0000-0000-0000-000000000000",
+        'pid': str(pid),
+        'used_memory': str(random.randint(256, 40960)),
+        'process_name': f"/usr/bin/python3 train.py --rank {index}",
+    }
+    return values.get(field, '[N/A]')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake nvidia-smi query stream')
+    parser.add_argument('--gpus', type=int, default=8, help='Number of synthetic GPUs')
+    parser.add_argument('--processes', type=int, default=2, help='Compute processes per GPU')
+    parser.add_argument('--query-gpu', default=None)
+    parser.add_argument('--query-compute-apps', default=None)
+    parser.add_argument('--format', default='csv')
+    parser.add_argument('--loop-ms', type=int, default=0)
+    args = parser.parse_args()
+
+    while True:
+        lines = []
+        if args.query_gpu:
+            fields = args.query_gpu.split(',')
+            for index in range(args.gpus):
+                lines.append(', '.join(gpu_row(index, field) for field in fields))
+        if args.query_compute_apps:
+            fields = args.query_compute_apps.split(',')
+            for index in range(args.gpus):
+                for i in range(args.processes):
+                    lines.append(', '.join(process_row(index, 10000 + index * args.processes + i, field) for field in fields))
+        sys.stdout.write(''.join(f"{line}\n" for line in lines))
+        sys.stdout.flush()
+        if not args.loop_ms:
+            break
+        time.sleep(args.loop_ms / 1000)
+
+
+if __name__ == '__main__':
+    main()
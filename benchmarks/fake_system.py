@@ -0,0 +1,322 @@
+"""Synthetic system backend for benchmarking the collectors offline.
+
+FakeSystem implements the subset of the psutil API the collectors use, backed by a
+synthetic process table, disks, NICs and Docker containers whose counters advance on
+every read. install() swaps it into ez_monitor in place of psutil, nvidia-smi (see
+fake_nvidia_smi.py), the Docker client and disk usage, so collectors run unchanged
+against it.
+
+    from fake_system import FakeSystem, install
+    install(FakeSystem(processes=10000, disks=20, nics=8, containers=10))
+"""
+import os
+import random
+import sys
+import time
+import types
+from collections import namedtuple
+from contextlib import contextmanager
+
+FAKE_NVIDIA_SMI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_nvidia_smi.py')
+
+STATUS_RUNNING = 'running'
+STATUS_SLEEPING = 'sleeping'
+AF_LINK = 17
+
+scputimes = namedtuple('scputimes', 'user nice system idle iowait irq softirq steal guest guest_nice')
+scputimes_percent = namedtuple('scputimes_percent', 'user system idle')
+scpufreq = namedtuple('scpufreq', 'current min max')
+svmem = namedtuple('svmem', 'total available percent used free cached buffers')
+sswap = namedtuple('sswap', 'total used free percent')
+sdiskpart = namedtuple('sdiskpart', 'device mountpoint fstype opts')
+sdiskio = namedtuple('sdiskio', 'read_count write_count read_bytes write_bytes read_time write_time')
+snetio = namedtuple('snetio', 'bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout')
+snicaddr = namedtuple('snicaddr', 'family address netmask broadcast ptp')
+snicstats = namedtuple('snicstats', 'isup duplex speed mtu flags')
+sdiskusage = namedtuple('sdiskusage', 'total used free')
+pcputimes = namedtuple('pcputimes', 'user system')
+pmem = namedtuple('pmem', 'rss vms')
+pio = namedtuple('pio', 'read_count write_count read_bytes write_bytes')
+
+
+class Error(Exception):
+    pass
+
+
+class NoSuchProcess(Error):
+    pass
+
+
+class AccessDenied(Error):
+    pass
+
+
+class ZombieProcess(NoSuchProcess):
+    pass
+
+
+class FakeProcess:
+    def __init__(self, system, pid):
+        entry = system.table.get(pid)
+        if entry is None:
+            raise NoSuchProcess(pid)
+        self.system = system
+        self.pid = pid
+        self.entry = entry
+
+    def _check(self):
+        if self.system.table.get(self.pid) is not self.entry:
+            raise NoSuchProcess(self.pid)
+
+    @contextmanager
+    def oneshot(self):
+        yield
+
+    def name(self):
+        self._check()
+        return self.entry['name']
+
+    def username(self):
+        return self.entry['username']
+
+    def status(self):
+        self._check()
+        return self.entry['status']
+
+    def cpu_times(self):
+        self._check()
+        return pcputimes(self.entry['user'], self.entry['system'])
+
+    def create_time(self):
+        return self.entry['create_time']
+
+    def memory_info(self):
+        self._check()
+        return pmem(self.entry['rss'], self.entry['rss'] * 2)
+
+    def io_counters(self):
+        self._check()
+        return pio(0, 0, self.entry['read_bytes'], self.entry['write_bytes'])
+
+
+class FakeContainer:
+    def __init__(self, index):
+        self.id = f"{index:064x}"
+        self.status = 'running' if index % 5 else 'exited'
+        self.attrs = {
+            'Id': self.id,
+            'Names': [f"/container{index}"],
+            'Image': f"image{index % 7}:latest",
+            'Status': 'Up 5 minutes (healthy)' if self.status == 'running' else 'Exited (0) 1 hour ago',
+            'State': {'Pid': 10000 + index},
+        }
+        self.cpu_usage = 0
+        self.system_usage = 0
+
+    def stats(self, stream=True, decode=True):
+        while True:
+            previous = (self.cpu_usage, self.system_usage)
+            self.cpu_usage += random.randint(0, 10 ** 8)
+            self.system_usage += 10 ** 9
+            yield {
+                'cpu_stats': {'cpu_usage': {'total_usage': self.cpu_usage}, 'system_cpu_usage': self.system_usage, 'online_cpus': 8},
+                'precpu_stats': {'cpu_usage': {'total_usage': previous[0]}, 'system_cpu_usage': previous[1]},
+                'memory_stats': {'usage': random.randint(10 ** 7, 10 ** 9), 'limit': 2 * 10 ** 9},
+                'networks': {'eth0': {'rx_bytes': self.system_usage // 100, 'tx_bytes': self.system_usage // 200}},
+                'blkio_stats': {'io_service_bytes_recursive': []},
+            }
+            time.sleep(1)
+
+
+class FakeContainers:
+    def __init__(self, count):
+        self.containers = [FakeContainer(i) for i in range(count)]
+        self.by_id = {c.id: c for c in self.containers}
+
+    def list(self, all=True, sparse=True):
+        return list(self.containers)
+
+    def get(self, container_id):
+        return self.by_id[container_id]
+
+
+class FakeDockerClient:
+    def __init__(self, count):
+        self.containers = FakeContainers(count)
+
+    def ping(self):
+        return True
+
+
+class FakeSystem:
+    """psutil-compatible view of a synthetic host whose counters advance on every read."""
+
+    STATUS_RUNNING = STATUS_RUNNING
+    AF_LINK = AF_LINK
+    NoSuchProcess = NoSuchProcess
+    AccessDenied = AccessDenied
+    ZombieProcess = ZombieProcess
+
+    def __init__(self, processes=1000, disks=8, nics=4, containers=10, cores=16, gpus=8, churn=0.01, seed=1):
+        self.random = random.Random(seed)
+        self.cores = cores
+        self.gpus = gpus
+        self.churn = churn
+        self.next_pid = 1
+        self.table = {}
+        for _ in range(processes):
+            self._spawn()
+        self.disks = [f"nvme{i}n1" for i in range(disks)]
+        self.disk_counters = {name: [0] * 6 for name in self.disks}
+        self.nics = ['lo'] + [f"eth{i}" for i in range(nics - 1)]
+        self.nic_counters = {name: [0] * 8 for name in self.nics}
+        self.core_times = [[0.0] * 10 for _ in range(cores)]
+        self.docker_client = FakeDockerClient(containers)
+        self.last_scan = None
+        self.elapsed = 0
+
+    def _spawn(self):
+        pid = self.next_pid
+        self.next_pid += 1
+        user = self.random.random() * 100
+        system = self.random.random() * 10
+        self.table[pid] = {
+            'name': f"proc{pid % 500}",
+            'username': 'root' if pid % 3 else 'user',
+            'status': STATUS_RUNNING if self.random.random() < 0.02 else STATUS_SLEEPING,
+            'user': user,
+            'system': system,
+            'rss': self.random.randint(1 << 20, 1 << 30),
+            'read_bytes': 0,
+            'write_bytes': 0,
+            # Started long enough ago to have used its CPU time on one core
+            'create_time': time.time() - user - system,
+        }
+
+    # Processes
+    def Process(self, pid):
+        return FakeProcess(self, pid)
+
+    def pids(self):
+        now = time.monotonic()
+        self.elapsed = now - self.last_scan if self.last_scan is not None else 0
+        self.last_scan = now
+        # Replace a share of the processes and advance the CPU time of the others
+        for pid in self.random.sample(list(self.table), int(len(self.table) * self.churn)):
+            del self.table[pid]
+            self._spawn()
+        for entry in self.table.values():
+            if entry['status'] == STATUS_RUNNING:
+                entry['user'] += self.elapsed * 0.5
+                entry['read_bytes'] += int(self.elapsed * (1 << 20))
+                entry['write_bytes'] += int(self.elapsed * (1 << 18))
+        return list(self.table)
+
+    # CPU
+    def cpu_count(self, logical=True):
+        return self.cores
+
+    def cpu_percent(self, interval=None):
+        return self.random.random() * 100
+
+    def cpu_times_percent(self, interval=None):
+        user = self.random.random() * 60
+        system = self.random.random() * 20
+        return scputimes_percent(user, system, 100 - user - system)
+
+    def cpu_times(self, percpu=False):
+        for times in self.core_times:
+            times[0] += self.random.random()
+            times[2] += self.random.random() * 0.3
+            times[3] += self.random.random()
+        rows = [scputimes(*times) for times in self.core_times]
+        return rows if percpu else scputimes(*map(sum, zip(*rows)))
+
+    def cpu_freq(self):
+        return scpufreq(2400 + self.random.random() * 1000, 800, 4800)
+
+    def getloadavg(self):
+        return self.random.random() * self.cores, 1.0, 0.5
+
+    # Memory
+    def virtual_memory(self):
+        total = 64 << 30
+        used = self.random.randint(8 << 30, 48 << 30)
+        return svmem(total, total - used, used / total * 100, used, total - used, 4 << 30, 1 << 30)
+
+    def swap_memory(self):
+        return sswap(8 << 30, 1 << 30, 7 << 30, 12.5)
+
+    # Disks
+    def disk_partitions(self, all=False):
+        return [sdiskpart(f"/dev/{name}p1", '/' if i == 0 else f"/mnt/{name}", 'ext4', 'rw,relatime')
+                for i, name in enumerate(self.disks)]
+
+    def disk_usage(self, path):
+        return sdiskusage(1 << 40, 1 << 39, 1 << 39)
+
+    def disk_io_counters(self, perdisk=False):
+        for counters in self.disk_counters.values():
+            counters[0] += self.random.randint(0, 100)
+            counters[1] += self.random.randint(0, 100)
+            counters[2] += self.random.randint(0, 1 << 24)
+            counters[3] += self.random.randint(0, 1 << 24)
+        rows = {name: sdiskio(*counters) for name, counters in self.disk_counters.items()}
+        return rows if perdisk else sdiskio(*map(sum, zip(*rows.values())))
+
+    # Network
+    def net_io_counters(self, pernic=False):
+        for counters in self.nic_counters.values():
+            counters[0] += self.random.randint(0, 1 << 20)
+            counters[1] += self.random.randint(0, 1 << 20)
+            counters[2] += self.random.randint(0, 1000)
+            counters[3] += self.random.randint(0, 1000)
+        rows = {name: snetio(*counters) for name, counters in self.nic_counters.items()}
+        return rows if pernic else snetio(*map(sum, zip(*rows.values())))
+
+    def net_if_addrs(self):
+        return {name: [snicaddr(AF_LINK, f"02:00:00:00:00:{i:02x}", None, None, None),
+                       snicaddr(2, f"10.0.0.{i + 1}", '255.255.255.0', None, None)]
+                for i, name in enumerate(self.nics)}
+
+    def net_if_stats(self):
+        return {name: snicstats(True, 2, 10000, 1500, 'up,broadcast,running,multicast') for name in self.nics}
+
+
+def install(system):
+    """Points ez_monitor's collectors at the fake system instead of the real host."""
+    from ez_monitor import app, procscan
+    from ez_monitor.docker_stats import DockerStatsCollector
+    from ez_monitor.gpu import NvidiaSmiCollector
+    from ez_monitor import mounts, interfaces
+
+    app.psutil = system
+    app.system = system
+    app.config['offline'] = True
+    procscan.psutil = system
+    app.shutil = types.SimpleNamespace(disk_usage=system.disk_usage)
+    # Fake disk names do not exist under /sys/block
+    app.is_whole_disk = lambda name: True
+    app.is_physical_disk = lambda name: True
+    app.is_docker_available = lambda: True
+    # Fake mounts come from disk_partitions rather than the host's mountinfo
+    mounts.psutil = system
+    app.mount_table = mounts.MountTable(mounts.MountFilter(exclude_fstypes=()), path=None)
+    app.disk_collector = mounts.DiskUsageCollector(app.mount_table, usage=system.disk_usage)
+    # Fake interfaces are polled through net_if_stats, without netlink or sysfs
+    interfaces.psutil = system
+    app.interface_table = interfaces.InterfaceTable(app.publish_interfaces, netlink=False, sys_class_net=None)
+
+    app.process_scanner = procscan.ProcessScanner()
+    app.docker_collector = DockerStatsCollector(limit=app.config['docker_limit'])
+    if app.gpu_collector is not None:
+        app.gpu_collector.stop()
+    app.gpu_collector = NvidiaSmiCollector([sys.executable, FAKE_NVIDIA_SMI, '--gpus', str(system.gpus)],
+                                           interval=app.config['intervals']['gpu'])
+    app.docker_collector.client = system.docker_client
+    app.discovery = app.create_discovery()
+    app.discovery.values.update(
+        cpu={'count': system.cpu_count(), 'name': 'Synthetic CPU'},
+        network=app.get_static_network_info(),
+        disk=app.get_static_disk_info(),
+    )
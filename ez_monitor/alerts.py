@@ -0,0 +1,345 @@
+import json
+import logging
+import math
+import operator
+import queue
+import shlex
+import subprocess
+import urllib.request
+from collections import deque
+from threading import Thread, Lock
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# 'last' needs no window, the others aggregate the samples of the last `window` seconds
+AGGREGATES = {'last', 'mean', 'min', 'max', 'rate'}
+
+# Samples waiting for evaluation, further samples are dropped and counted
+QUEUE_SIZE = 10000
+
+# The running sum of a mean window is recomputed after this many evictions, so float error cannot build up
+RESUM_EVERY = 100000
+
+
+def resolve(value, path, keys=()):
+    # Yields (wildcard keys, leaf) for every value the path matches, '*' matches every dict key or list item
+    if not path:
+        yield keys, value
+        return
+    part, rest = path[0], path[1:]
+    if part == '*':
+        if isinstance(value, dict):
+            for key, item in value.items():
+                yield from resolve(item, rest, keys + (str(key),))
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                # Containers and processes are named by their name rather than their position
+                key = item.get('name') or item.get('id') or index if isinstance(item, dict) else index
+                yield from resolve(item, rest, keys + (str(key),))
+    elif isinstance(value, dict) and part in value:
+        yield from resolve(value[part], rest, keys)
+
+
+def public_alert(alert):
+    # Drops the engine's bookkeeping fields
+    return {key: value for key, value in alert.items() if key != 'notified'}
+
+
+class Window:
+    """Mean, min, max or rate of the samples in the last `seconds`, in O(1) amortized per sample.
+
+    Samples are kept in arrival order next to a running sum for the mean, and min and
+    max come from a monotonic deque whose front is the extreme of the window.
+    """
+
+    def __init__(self, aggregate, seconds):
+        self.aggregate = aggregate
+        self.seconds = seconds
+        self.samples = deque()
+        self.extremes = deque()
+        self.better = operator.le if aggregate == 'min' else operator.ge
+        self.total = 0.0
+        self.added = 0
+        self.evicted = 0
+        self.first_time = None
+
+    def add(self, timestamp, value):
+        if self.first_time is None:
+            self.first_time = timestamp
+        self.samples.append((timestamp, value))
+        self.added += 1
+        if self.aggregate == 'mean':
+            self.total += value
+        elif self.aggregate in ('min', 'max'):
+            # Samples that can never be the extreme again are dropped from the back
+            while self.extremes and self.better(value, self.extremes[-1][1]):
+                self.extremes.pop()
+            self.extremes.append((self.added, value))
+
+        cutoff = timestamp - self.seconds
+        while self.samples[0][0] < cutoff:
+            _, old = self.samples.popleft()
+            self.evicted += 1
+            if self.aggregate == 'mean':
+                self.total -= old
+                if self.evicted % RESUM_EVERY == 0:
+                    self.total = math.fsum(value for _, value in self.samples)
+            elif self.extremes and self.extremes[0][0] <= self.evicted:
+                self.extremes.popleft()
+
+    def full(self, timestamp):
+        # Only a window that has seen its whole span can claim e.g. "above 90% for 5 minutes"
+        return self.first_time is not None and timestamp - self.first_time >= self.seconds
+
+    def value(self):
+        if self.aggregate == 'mean':
+            return self.total / len(self.samples)
+        if self.aggregate in ('min', 'max'):
+            return self.extremes[0][1]
+        (first_time, first), (last_time, last) = self.samples[0], self.samples[-1]
+        return (last - first) / (last_time - first_time) if last_time > first_time else 0.0
+
+
+class Rule:
+    """Condition on one metric path, e.g. min of cpu.usage over 300 s > 90.
+
+    The path starts with the metric name and may use '*' to match every mount,
+    interface or container. An alert fires when the aggregate passes `threshold` and
+    resolves once it no longer passes `clear`, which defaults to the threshold.
+    """
+
+    def __init__(self, name, metric, op, threshold, aggregate='last', window=0, clear=None, severity='warning', summary=None):
+        if op not in OPERATORS:
+            raise ValueError(f"Rule {name}: unknown operator {op}, expected one of {', '.join(OPERATORS)}")
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"Rule {name}: unknown aggregate {aggregate}, expected one of {', '.join(sorted(AGGREGATES))}")
+        if aggregate != 'last' and not window > 0:
+            raise ValueError(f"Rule {name}: aggregate {aggregate} needs a window in seconds")
+        # Numeric thresholds compare numbers, others, e.g. a container status, compare the raw value
+        self.numeric = isinstance(threshold, (int, float)) and not isinstance(threshold, bool)
+        if aggregate != 'last' and not self.numeric:
+            raise ValueError(f"Rule {name}: aggregate {aggregate} needs a numeric threshold")
+        self.name = name
+        self.metric = metric
+        self.path = metric.split('.')
+        self.op = op
+        self.compare = OPERATORS[op]
+        self.threshold = threshold
+        self.clear = threshold if clear is None else clear
+        self.aggregate = aggregate
+        self.window = window
+        self.severity = severity
+        self.summary = summary
+        self.targets = set()
+
+    def describe(self, target, value):
+        if self.summary:
+            return self.summary.format(name=self.name, target=target, value=value, threshold=self.threshold)
+        subject = self.metric if self.aggregate == 'last' else f"{self.aggregate}({self.metric}, {self.window:g}s)"
+        return f"{subject}{f' [{target}]' if target else ''} {self.op} {self.threshold} (value {value})"
+
+
+class WebhookNotifier:
+    """POSTs each alert change as JSON to a URL."""
+
+    def __init__(self, url, timeout=5, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.headers = {'Content-Type': 'application/json', **(headers or {})}
+
+    def send(self, event):
+        request = urllib.request.Request(self.url, json.dumps(event).encode('utf-8'), self.headers, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class CommandNotifier:
+    """Runs a local command per alert change, with the event as JSON on stdin."""
+
+    def __init__(self, command, timeout=30):
+        self.args = shlex.split(command) if isinstance(command, str) else list(command)
+        self.timeout = timeout
+
+    def send(self, event):
+        subprocess.run(self.args, input=json.dumps(event).encode('utf-8'), timeout=self.timeout, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+NOTIFIERS = {'webhook': WebhookNotifier, 'command': CommandNotifier}
+
+
+def load_rules(path):
+    # {"rules": [...], "notifiers": [{"type": "webhook", "url": ...}], "repeat_interval": seconds}
+    with open(path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    rules = []
+    for rule in spec.get('rules', []):
+        try:
+            rules.append(Rule(**rule))
+        except TypeError as e:
+            raise ValueError(f"Invalid rule {rule.get('name', rule)}: {e}")
+    names = [rule.name for rule in rules]
+    if len(set(names)) != len(names):
+        raise ValueError("Rule names must be unique")
+    notifiers = []
+    for notifier in spec.get('notifiers', []):
+        notifier = dict(notifier)
+        kind = notifier.pop('type', None)
+        if kind not in NOTIFIERS:
+            raise ValueError(f"Unknown notifier type {kind}, expected one of {', '.join(NOTIFIERS)}")
+        notifiers.append(NOTIFIERS[kind](**notifier))
+    return rules, notifiers, spec.get('repeat_interval')
+
+
+class AlertEngine:
+    """Evaluates alert rules on every published sample, off the collector threads.
+
+    submit() only queues the sample. A worker thread updates the windows of the rules
+    on that metric, rules on the same path share windows, and fires or resolves
+    alerts. Notifications go out on their own thread, once per state change and
+    again every repeat_interval while an alert stays active.
+    """
+
+    def __init__(self, rules, notifiers=(), repeat_interval=None, on_change=None):
+        self.rules = {}
+        for rule in rules:
+            self.rules.setdefault(rule.path[0], []).append(rule)
+        self.notifiers = list(notifiers)
+        self.repeat_interval = repeat_interval
+        self.on_change = on_change
+        self.windows = {}
+        self.active = {}
+        self.samples = queue.Queue(QUEUE_SIZE)
+        self.notifications = queue.Queue()
+        self.dropped = 0
+        self.lock = Lock()
+
+    def submit(self, metric, value, timestamp):
+        if metric not in self.rules:
+            return
+        try:
+            self.samples.put_nowait((metric, value, timestamp))
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        Thread(target=self._run, daemon=True, name='alert-engine').start()
+        Thread(target=self._notify, daemon=True, name='alert-notifier').start()
+
+    def _run(self):
+        while True:
+            metric, value, timestamp = self.samples.get()
+            try:
+                self.evaluate(metric, value, timestamp)
+            except Exception as e:
+                logger.error(f"Error evaluating alert rules for {metric}: {e}")
+
+    def evaluate(self, metric, value, timestamp):
+        changed = False
+        updated = set()
+        for rule in self.rules.get(metric, []):
+            seen = set()
+            for keys, leaf in resolve(value, rule.path[1:]):
+                target = '/'.join(keys)
+                if rule.numeric:
+                    try:
+                        leaf = float(leaf)
+                    except (TypeError, ValueError):
+                        continue
+                    if math.isnan(leaf):
+                        continue
+                seen.add(target)
+                if rule.aggregate == 'last':
+                    result = leaf
+                else:
+                    window_key = (rule.metric, target, rule.aggregate, rule.window)
+                    window = self.windows.get(window_key)
+                    if window is None:
+                        window = self.windows[window_key] = Window(rule.aggregate, rule.window)
+                    # A window shared by several rules takes each sample once
+                    if window_key not in updated:
+                        window.add(timestamp, leaf)
+                        updated.add(window_key)
+                    if not window.full(timestamp):
+                        continue
+                    result = window.value()
+                changed |= self._update(rule, target, result, timestamp)
+
+            # Mounts and containers that went away resolve their alerts
+            for target in rule.targets - seen:
+                self.windows.pop((rule.metric, target, rule.aggregate, rule.window), None)
+                changed |= self._resolve(rule, target, None, timestamp)
+            rule.targets = seen
+
+        if changed and self.on_change is not None:
+            self.on_change(self.get_active(), timestamp)
+
+    def _update(self, rule, target, value, timestamp):
+        key = (rule.name, target)
+        alert = self.active.get(key)
+        if alert is None:
+            if not rule.compare(value, rule.threshold):
+                return False
+            alert = {
+                'rule': rule.name,
+                'target': target,
+                'severity': rule.severity,
+                'metric': rule.metric,
+                'value': value,
+                'threshold': rule.threshold,
+                'summary': rule.describe(target, value),
+                'since': timestamp,
+                'notified': timestamp,
+            }
+            with self.lock:
+                self.active[key] = alert
+            self.notifications.put(('firing', public_alert(alert)))
+            logger.warning(f"Alert {rule.name} firing: {alert['summary']}")
+            return True
+        if not rule.compare(value, rule.clear):
+            return self._resolve(rule, target, value, timestamp)
+        with self.lock:
+            alert['value'] = value
+            alert['summary'] = rule.describe(target, value)
+            repeat = self.repeat_interval and timestamp - alert['notified'] >= self.repeat_interval
+            if repeat:
+                alert['notified'] = timestamp
+        if repeat:
+            self.notifications.put(('firing', public_alert(alert)))
+        return False
+
+    def _resolve(self, rule, target, value, timestamp):
+        with self.lock:
+            alert = self.active.pop((rule.name, target), None)
+        if alert is None:
+            return False
+        resolved = {**public_alert(alert), 'resolved': timestamp}
+        if value is not None:
+            resolved['value'] = value
+        self.notifications.put(('resolved', resolved))
+        logger.info(f"Alert {rule.name} resolved{f' for {target}' if target else ''}")
+        return True
+
+    def _notify(self):
+        while True:
+            status, alert = self.notifications.get()
+            event = {'status': status, 'alert': alert}
+            for notifier in self.notifiers:
+                try:
+                    notifier.send(event)
+                except Exception as e:
+                    logger.error(f"Error sending alert {alert['rule']} with {type(notifier).__name__}: {e}")
+
+    def get_active(self):
+        with self.lock:
+            alerts = [public_alert(alert) for alert in self.active.values()]
+        return sorted(alerts, key=lambda alert: (alert['since'], alert['rule'], alert['target']))
@@ -1,23 +1,37 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response, g
 import psutil
 import time
 import os
-import cpuinfo
 import shutil
-import GPUtil
 import sys
 import platform
-from functools import lru_cache
-from threading import Thread, Lock
+from threading import Thread, Lock, Condition
 import argparse
 import socket
-import requests
 import logging
-import docker
 import datetime
+import json
+import re
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import importlib
-import subprocess
+import importlib.util
+from .history import HistoryStore
+from .procscan import ProcessScanner
+from .docker_stats import DockerStatsCollector
+from .procfs import create_backend
+from .gpu import NvidiaSmiCollector
+from .interfaces import InterfaceTable
+from .mounts import MountTable, MountFilter, DiskUsageCollector, STATFS_TIMEOUT, DEFAULT_EXCLUDE_DEVICES
+from .alerts import AlertEngine, load_rules
+from .recording import RecordingWriter, Recording, UNCHANGED
+from .cgroups import CgroupContainerCollector, is_cgroup_v2
+from .scheduler import Scheduler
+from .snapshot import RUN_ID, MetricsSnapshot
+from .tsdb import TimeSeriesStore, RESOLUTIONS
+from . import openmetrics, compact
+from .instrumentation import LatencyHistogram, ProcessUsage, sample_stacks, MAX_PROFILE_SECONDS
+from .shm import SeqlockBuffer, SharedSnapshotReader, default_shm_path, DEFAULT_SIZE
+from .discovery import StaticDiscovery, DISCOVERY_TIMEOUT, default_cache_dir
+from .rates import CounterRates, is_whole_disk, is_physical_disk, time_delta
 
 # Conditionally import Windows-specific modules
 if platform.system() == 'Windows':
@@ -37,23 +51,156 @@ metrics = {
     'cpu': {}, 'memory': {}, 'disk': {}, 'gpu': {}, 'disk_io': {}, 'network': {}
 }
 metrics_lock = Lock()
+# Notified whenever a collector publishes a changed metric
+metrics_updated = Condition(metrics_lock)
 config = {
     'refresh_rate': 2,
-    'max_data_points': 1800
+    'max_data_points': 1800,
+    'docker_limit': 10,
+    'docker_url': None,
+    # 'docker' reads container stats from the Docker API, 'cgroup' from cgroup v2 files
+    'container_backend': 'docker',
+    # nvidia-smi command the GPU collector keeps running, may include arguments
+    'nvidia_smi': 'nvidia-smi',
+    # Seconds each mount's statfs may take before it is reported as stale
+    'disk_timeout': STATFS_TIMEOUT,
+    # Filesystem types and a device regex the disk collector skips, None for the pseudo filesystems
+    'mount_exclude_fstypes': None,
+    'mount_exclude_devices': DEFAULT_EXCLUDE_DEVICES,
+    'remote_mounts': True,
+    # Read per-process I/O counters for the read/write rates and the top processes by I/O
+    'process_io': True,
+    # Collection interval per collector in seconds, collectors not listed use refresh_rate
+    'intervals': {
+        'memory': 5,
+        'disk': 10,
+        'gpu': 5,
+        'top_processes': 5,
+        'top_processes_by_memory': 5,
+        'top_processes_by_cpu_time': 5,
+        'top_processes_by_io': 5,
+        'docker_containers': 10,
+        'self': 5,
+    },
+    # Adapt the CPU, memory, GPU, disk I/O and network intervals to how fast their values change,
+    # between these fractions and multiples of the configured interval
+    'adaptive': False,
+    'adaptive_range': (0.25, 4),
+    # Collector CPU time limit as a fraction of one core, None for no limit
+    'cpu_budget': None,
+    # Per collector timeout in seconds, defaults to three intervals
+    'timeouts': {},
+    # Directory of the on-disk time series store, disabled when None
+    'data_dir': None,
+    'storage_limit_mb': 256,
+    # Skip lookups that need internet access, e.g. the public IP
+    'offline': False,
+    # 'procfs' reads /proc through kept-open files, 'psutil' goes through psutil, 'auto' picks procfs on Linux
+    'backend': 'auto',
 }
 
 # Add this global variable to store the last update time
 last_update_time = None
 
-# Add this global variable
-last_metrics_update = {}
-
 # Add this global variable to store metric collection times
 metric_collection_times = {}
 
+# Unix time each metric was last sampled, so charts plot samples when they were taken
+metric_timestamps = {}
+
+# Per metric version and the sequence number of its last change, used by /stream
+metric_versions = {}
+metric_sequences = {}
+metrics_sequence = 0
+
+# Pre-serialized server-sent event for the latest value of every metric
+metric_events = {}
+
+# Immutable snapshot served by /metrics, replaced on every publish
+snapshot_id = 0
+current_snapshot = MetricsSnapshot(snapshot_id, {}, {})
+
+# Seconds between keep-alive comments on idle streams
+STREAM_KEEPALIVE = 15
+
+# Set in the collector process when worker processes serve its snapshots from shared memory
+shared_writer = None
+# Set in worker processes, which serve the shared snapshots and never collect
+shared_reader = None
+# Seconds between checks for a new shared snapshot on worker /stream connections
+SHARED_POLL_INTERVAL = 0.25
+
+# System counters for the CPU, memory, disk I/O and network collectors, psutil or the /proc fast path
+system = psutil
+
+# Shared process table scanner used by the CPU and top processes collectors
+process_scanner = ProcessScanner()
+
+# Runs every collector on its own interval and worker thread
+scheduler = Scheduler()
+
+# Value each adaptive collector watches, and the change in it that counts as movement
+ADAPTIVE_SIGNALS = {
+    'cpu': (lambda cpu: cpu['usage'], 5),
+    'memory': (lambda memory: memory['percent'], 2),
+    'gpu': (lambda gpu: gpu['percent'], 5),
+    'disk_io': (lambda disk_io: disk_io['read_speed'] + disk_io['write_speed'], 1),
+    'network': (lambda network: network['upload_speed'] + network['download_speed'], 1),
+}
+
+# Shortest interval an adaptive collector speeds up to, in seconds
+MIN_ADAPTIVE_INTERVAL = 0.5
+
+# Long-lived container stats collector for the configured backend, created on first use
+docker_collector = None
+
+# Long-lived nvidia-smi query streams, started on first use
+gpu_collector = None
+
+# Mount table kept current by the kernel's mount notifications, and the per mount usage collector
+mount_table = None
+disk_collector = None
+
+# Network interfaces kept current by the kernel's link and address notifications
+interface_table = None
+
+# Per-device, per-interface and per-core rates, computed over all devices at once
+disk_device_rates = CounterRates({
+    'read_bytes': ('read_speed', 1 / 1024 / 1024),
+    'write_bytes': ('write_speed', 1 / 1024 / 1024),
+    'read_count': ('read_iops', 1),
+    'write_count': ('write_iops', 1),
+})
+interface_rates = CounterRates({
+    'bytes_sent': ('upload_speed', 1 / 1024 / 1024),
+    'bytes_recv': ('download_speed', 1 / 1024 / 1024),
+    'packets_sent': ('packets_sent_rate', 1),
+    'packets_recv': ('packets_recv_rate', 1),
+})
+cpu_core_rates = CounterRates({'total': ('total', 1), 'idle': ('idle', 1)}, delta=time_delta)
+
+# Rolling request latency per route, and the monitor's own resource usage
+route_latencies = {}
+self_usage = ProcessUsage()
+# Only one /debug/profile runs at a time
+profile_lock = Lock()
+
+# Server-side history of numeric series, sized by max_data_points
+history = HistoryStore(config['max_data_points'])
+
+# Durable history with rollups, enabled with --data-dir
+tsdb = None
+
+# Evaluates the --alert-rules file against every published sample
+alert_engine = None
+
+# Appends every published sample to the file of the `record` command
+recorder = None
+
 # CPU Information
-@lru_cache(maxsize=1)
 def get_static_cpu_info():
+    # Imported on first use, cpuinfo is slow to import and slower to query
+    import cpuinfo
     cpu_info = cpuinfo.get_cpu_info()
     return {
         'count': psutil.cpu_count(),
@@ -61,31 +208,48 @@ def get_static_cpu_info():
     }
 
 def get_cpu_info():
-    static_info = get_static_cpu_info()
-    cpu_times_percent = psutil.cpu_times_percent(interval=None)
+    static_info = discovery.get('cpu')
+    cpu_times_percent = system.cpu_times_percent(interval=None)
+    process_scan = process_scanner.latest()
+    cpu_freq = system.cpu_freq()
+    # Read once, the compact encoding rebuilds load_average from load
+    load_avg = system.getloadavg() if hasattr(os, 'getloadavg') else None
     dynamic_info = {
-        'usage': psutil.cpu_percent(interval=None),
-        'frequency': f"{psutil.cpu_freq().current:.0f} MHz",
-        'tasks': len(psutil.pids()),
+        'usage': system.cpu_percent(interval=None),
+        'frequency': f"{cpu_freq.current:.0f} MHz",
+        'frequency_hz': cpu_freq.current * 1e6,
+        'tasks': process_scan['tasks'],
         'threads': psutil.cpu_count(logical=True),
-        'running': sum(1 for p in psutil.process_iter(['status']) if p.info['status'] == psutil.STATUS_RUNNING),
-        'load_average': get_load_average(),
+        'running': process_scan['running'],
+        'load_average': get_load_average(load_avg),
         'user': cpu_times_percent.user,
         'system': cpu_times_percent.system,
         'idle': cpu_times_percent.idle,
     }
+    if load_avg is not None:
+        dynamic_info['load'] = list(load_avg)
+    dynamic_info['cores'] = get_cpu_core_usage()
     return {**static_info, **dynamic_info}
 
-def get_load_average():
-    if hasattr(os, 'getloadavg'):
-        load_avg = os.getloadavg()
+def get_cpu_core_usage():
+    core_times = {}
+    for index, times in enumerate(system.cpu_times(percpu=True)):
+        # Guest time is already included in user time on Linux
+        total = sum(times) - getattr(times, 'guest', 0) - getattr(times, 'guest_nice', 0)
+        core_times[f'cpu{index}'] = {'total': total, 'idle': times.idle + getattr(times, 'iowait', 0)}
+    rates = cpu_core_rates.update(core_times, time.monotonic())
+    return [round(min(max(100 * (1 - rate['idle'] / rate['total']), 0.0), 100.0), 1) if rate['total'] > 0 else 0.0
+            for rate in rates.values()]
+
+def get_load_average(load_avg):
+    if load_avg is not None:
         return f"{load_avg[0]:.2f}, {load_avg[1]:.2f}, {load_avg[2]:.2f}"
     return "N/A"
 
 # Memory Information
 def get_memory_info():
-    mem = psutil.virtual_memory()
-    swap = psutil.swap_memory()
+    mem = system.virtual_memory()
+    swap = system.swap_memory()
     total_gb = mem.total / (1024 ** 3)
     used_gb = mem.used / (1024 ** 3)
     
@@ -96,67 +260,93 @@ def get_memory_info():
         'available': f"{mem.available / (1024 ** 3):.2f}",
         'swap_total': f"{swap.total / (1024 ** 3):.2f}",
         'swap_used': f"{swap.used / (1024 ** 3):.2f}",
-        'swap_percent': swap.percent
+        'swap_percent': swap.percent,
+        'total_bytes': mem.total,
+        'used_bytes': mem.used,
+        'available_bytes': mem.available,
+        'swap_total_bytes': swap.total,
+        'swap_used_bytes': swap.used,
     }
     
     if hasattr(mem, 'cached'):
         memory_info['cached'] = f"{mem.cached / (1024 ** 3):.2f}"
+        memory_info['cached_bytes'] = mem.cached
     if hasattr(mem, 'buffers'):
         memory_info['buffers'] = f"{mem.buffers / (1024 ** 3):.2f}"
+        memory_info['buffers_bytes'] = mem.buffers
     
     return memory_info
 
 # Disk Information
+def get_mount_table():
+    global mount_table
+    if mount_table is None:
+        mount_filter = MountFilter(config['mount_exclude_fstypes'], config['mount_exclude_devices'], config['remote_mounts'])
+        mount_table = MountTable(mount_filter)
+    return mount_table
+
 def get_static_disk_info():
-    partitions = psutil.disk_partitions()
-    static_disk_info = {}
-    for partition in partitions:
-        try:
-            static_disk_info[partition.mountpoint] = {
-                'device': partition.device,
-                'mountpoint': partition.mountpoint,
-                'fstype': partition.fstype,
-                'opts': partition.opts,
-                'remote': 'remote' in partition.opts
-            }
-        except Exception as e:
-            logger.error(f"Error getting static disk info for {partition.mountpoint}: {e}")
-    return static_disk_info
+    return dict(get_mount_table().get())
+
+def format_disk_usage(usage):
+    if usage is None:
+        return {'total': "N/A", 'used': "N/A", 'free': "N/A", 'percent': 0}
+    total_gb = usage.total / (1024 ** 3)
+    used_gb = usage.used / (1024 ** 3)
+    free_gb = usage.free / (1024 ** 3)
+    
+    percent = (usage.used / usage.total) * 100 if usage.total else 0
+    
+    return {
+        'total': f"{total_gb:.2f} GB",
+        'used': f"{used_gb:.2f} GB",
+        'free': f"{free_gb:.2f} GB",
+        'percent': round(percent, 1),
+        'total_bytes': usage.total,
+        'used_bytes': usage.used,
+        'free_bytes': usage.free,
+    }
 
 def get_disk_info(path='/'):
     try:
-        usage = shutil.disk_usage(path)
-        total_gb = usage.total / (1024 ** 3)
-        used_gb = usage.used / (1024 ** 3)
-        free_gb = usage.free / (1024 ** 3)
-        
-        percent = (usage.used / usage.total) * 100
-        
-        return {
-            'total': f"{total_gb:.2f} GB",
-            'used': f"{used_gb:.2f} GB",
-            'free': f"{free_gb:.2f} GB",
-            'percent': round(percent, 1),
-        }
+        return format_disk_usage(shutil.disk_usage(path))
     except Exception as e:
         logger.error(f"Error getting disk info: {e}")
-        return {
-            'total': "N/A", 'used': "N/A", 'free': "N/A", 'percent': 0,
-        }
+        return format_disk_usage(None)
+
+def get_disks():
+    # Usage of every current mount, hung or failing mounts report their last usage as stale
+    global disk_collector
+    if disk_collector is None:
+        disk_collector = DiskUsageCollector(get_mount_table(), config['disk_timeout'])
+    return {mountpoint: {**mount, **format_disk_usage(usage), **status}
+            for mountpoint, (mount, usage, status) in disk_collector.collect().items()}
 
 # GPU Information
 def get_gpu_info():
+    global gpu_collector
     try:
-        gpus = GPUtil.getGPUs()
+        if gpu_collector is None:
+            gpu_collector = NvidiaSmiCollector(config['nvidia_smi'], interval=config['intervals']['gpu'])
+        gpus = gpu_collector.collect()
         if gpus:
-            gpu = gpus[0]  # Get the first GPU
+            # Top-level fields cover all GPUs, per-GPU details are under 'gpus'
+            memory_used = sum(gpu['memory_used_bytes'] for gpu in gpus)
+            memory_total = sum(gpu['memory_total_bytes'] for gpu in gpus)
+            temperatures = [gpu['temperature'] for gpu in gpus if gpu['temperature'] is not None]
+            power = [gpu['power_draw'] for gpu in gpus if gpu['power_draw'] is not None]
             return {
-                'name': gpu.name,
-                'percent': gpu.load * 100,
-                'memory_used': f"{gpu.memoryUsed} MB",
-                'memory_total': f"{gpu.memoryTotal} MB",
-                'temperature': gpu.temperature,
-                'driver': gpu.driver,
+                'name': gpus[0]['name'] if len(gpus) == 1 else f"{len(gpus)} x {gpus[0]['name']}",
+                'count': len(gpus),
+                'percent': sum(gpu['percent'] for gpu in gpus) / len(gpus),
+                'memory_used': f"{memory_used / (1024 * 1024):.0f} MB",
+                'memory_total': f"{memory_total / (1024 * 1024):.0f} MB",
+                'temperature': max(temperatures) if temperatures else None,
+                'power_draw': sum(power) if power else None,
+                'driver': gpus[0]['driver'],
+                'memory_used_bytes': memory_used,
+                'memory_total_bytes': memory_total,
+                'gpus': gpus,
             }
         else:
             return {'error': 'No GPU found'}
@@ -168,7 +358,7 @@ def get_gpu_info():
 def get_disk_io():
     try:
         if platform.system() == 'Windows':
-            io_counters = psutil.disk_io_counters()
+            io_counters = system.disk_io_counters()
             logger.debug(f"Windows disk I/O: {io_counters}")
             disk_info = {
                 'read_bytes': io_counters.read_bytes,
@@ -177,20 +367,21 @@ def get_disk_io():
                 'write_count': io_counters.write_count,
             }
         else:  # Linux and other Unix-like systems
-            io_counters = psutil.disk_io_counters(perdisk=True)
+            io_counters = system.disk_io_counters(perdisk=True)
+            # Only physical whole disks, partitions and loop/dm/md devices would double count
+            physical = [disk for name, disk in io_counters.items() if is_physical_disk(name)]
             disk_info = {
-                'read_bytes': sum(disk.read_bytes for disk in io_counters.values()),
-                'write_bytes': sum(disk.write_bytes for disk in io_counters.values()),
-                'read_count': sum(disk.read_count for disk in io_counters.values()),
-                'write_count': sum(disk.write_count for disk in io_counters.values()),
+                'read_bytes': sum(disk.read_bytes for disk in physical),
+                'write_bytes': sum(disk.write_bytes for disk in physical),
+                'read_count': sum(disk.read_count for disk in physical),
+                'write_count': sum(disk.write_count for disk in physical),
+                'devices': {name: disk for name, disk in io_counters.items() if is_whole_disk(name)},
             }
         
-        # Add filesystem type information
-        partitions = psutil.disk_partitions()
-        if partitions:
-            disk_info['filesystem'] = partitions[0].fstype
-        else:
-            disk_info['filesystem'] = 'Unknown'
+        # Add filesystem type information from the current mount table
+        partitions = get_mount_table().get()
+        root = partitions.get('/') or next(iter(partitions.values()), {})
+        disk_info['filesystem'] = root.get('fstype') or 'Unknown'
         
         return disk_info
     except Exception as e:
@@ -204,29 +395,42 @@ def get_disk_io():
         }
 
 def get_network_usage():
-    net_counters = psutil.net_io_counters()
+    # One per-interface read gives both the totals and the per-interface counters
+    nic_counters = system.net_io_counters(pernic=True)
     return {
-        'bytes_sent': net_counters.bytes_sent,
-        'bytes_recv': net_counters.bytes_recv,
-        'packets_sent': net_counters.packets_sent,
-        'packets_recv': net_counters.packets_recv,
+        'bytes_sent': sum(nic.bytes_sent for nic in nic_counters.values()),
+        'bytes_recv': sum(nic.bytes_recv for nic in nic_counters.values()),
+        'packets_sent': sum(nic.packets_sent for nic in nic_counters.values()),
+        'packets_recv': sum(nic.packets_recv for nic in nic_counters.values()),
+        'interfaces': nic_counters,
     }
 
 # Network Information
+def get_local_ip():
+    # Connecting a UDP socket sends nothing, it only selects the outgoing interface
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.settimeout(DISCOVERY_TIMEOUT)
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+    except OSError:
+        return "Unable to retrieve"
+
+def get_public_ip():
+    if config['offline']:
+        return "Offline"
+    try:
+        import requests
+        return requests.get('https://api.ipify.org', timeout=DISCOVERY_TIMEOUT).text
+    except Exception:
+        return "Unable to retrieve"
+
 def get_static_network_info():
     interfaces = {}
     try:
         hostname = socket.gethostname()
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            local_ip = s.getsockname()[0]
-        except:
-            local_ip = "Unable to retrieve"
-        try:
-            public_ip = requests.get('https://api.ipify.org').text
-        except:
-            public_ip = "Unable to retrieve"
+        local_ip = get_local_ip()
+        public_ip = get_public_ip()
 
         interfaces['general'] = {
             'hostname': hostname,
@@ -234,298 +438,592 @@ def get_static_network_info():
             'public_ip': public_ip
         }
 
-        for interface, addrs in psutil.net_if_addrs().items():
-            interfaces[interface] = {
-                'mac': next((addr.address for addr in addrs if addr.family == psutil.AF_LINK), 'Unknown'),
-                'ipv4': next((addr.address for addr in addrs if addr.family == socket.AF_INET), 'Unknown'),
-                'ipv6': next((addr.address for addr in addrs if addr.family == socket.AF_INET6), 'Unknown')
-            }
+        interfaces.update(get_interface_table().get())
     except Exception as e:
         logger.error(f"Error getting network info: {e}")
     return interfaces
 
+def get_interface_table():
+    global interface_table
+    if interface_table is None:
+        interface_table = InterfaceTable(on_change=publish_interfaces)
+    return interface_table
+
+def publish_interfaces(interfaces):
+    # Interface changes are published as they happen, with the discovered hostname and IPs
+    general = discovery.get('network').get('general', {})
+    publish_metric('network_info', {'general': general, **interfaces}, time.time(), 0)
+
 # Add this function to get Docker container information
 def is_docker_available():
-    try:
-        importlib.import_module('docker')
-        return True
-    except ImportError:
-        return False
+    if config['container_backend'] == 'cgroup':
+        return is_cgroup_v2()
+    # Only checks that the SDK is installed, it is imported when the collector first runs
+    return importlib.util.find_spec('docker') is not None
 
-def is_docker_running():
-    system = platform.system()
-    try:
-        if system == "Linux":
-            # Check if Docker daemon is running on Linux
-            subprocess.run(["docker", "info"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        elif system == "Windows":
-            # Check if Docker daemon is running on Windows
-            subprocess.run(["docker", "info"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, shell=True)
+def get_docker_containers(limit=None):
+    global docker_collector
+    if docker_collector is None:
+        if config['container_backend'] == 'cgroup':
+            docker_collector = CgroupContainerCollector(limit=config['docker_limit'], base_url=config['docker_url'],
+                                                        host_memory=psutil.virtual_memory().total)
         else:
-            logger.warning(f"Unsupported operating system: {system}")
-            return False
-        return True
-    except subprocess.CalledProcessError:
-        return False
-    except FileNotFoundError:
-        logger.warning("Docker command not found. Is Docker installed?")
-        return False
-
-def get_docker_containers(limit=10):
-    if not is_docker_running():
-        logger.info("Docker is not running")
-        return None
-
+            docker_collector = DockerStatsCollector(limit=config['docker_limit'], base_url=config['docker_url'])
+    if limit is not None:
+        docker_collector.limit = limit
     try:
-        client = docker.from_env()
-        containers = client.containers.list(all=True)
-        
-        if containers is None:
-            logger.warning("Docker client returned None for container list")
-            return []
-
-        container_info = []
-        for container in containers[:limit]:
-            try:
-                stats = container.stats(stream=False)
-                
-                # Check if stats is None or empty
-                if not stats:
-                    logger.warning(f"No stats available for container {container.id}")
-                    continue
-
-                # CPU usage calculation with fallback for Windows
-                cpu_percent = 0
-                try:
-                    cpu_delta = stats['cpu_stats']['cpu_usage']['total_usage'] - stats['precpu_stats']['cpu_usage']['total_usage']
-                    system_delta = stats['cpu_stats'].get('system_cpu_usage', 0) - stats['precpu_stats'].get('system_cpu_usage', 0)
-                    if system_delta > 0:
-                        cpu_percent = (cpu_delta / system_delta) * len(stats['cpu_stats']['cpu_usage']['percpu_usage']) * 100
-                except KeyError:
-                    # Fallback for Windows or if keys are missing
-                    cpu_percent = stats['cpu_stats']['cpu_usage']['total_usage'] / 10000000  # Rough estimate
-
-                # Memory usage calculation
-                mem_usage = stats['memory_stats'].get('usage', 0)
-                mem_limit = stats['memory_stats'].get('limit', 1)
-                mem_percent = (mem_usage / mem_limit) * 100 if mem_limit > 0 else 0
-
-                # Network I/O calculation
-                net_io = stats.get('networks', {}).get('eth0', {'rx_bytes': 0, 'tx_bytes': 0})
-                
-                # Block I/O calculation
-                blk_io = stats.get('blkio_stats', {}).get('io_service_bytes_recursive', [])
-                if blk_io is not None:
-                    blk_read = sum(item['value'] for item in blk_io if item.get('op') == 'Read')
-                    blk_write = sum(item['value'] for item in blk_io if item.get('op') == 'Write')
-                else:
-                    blk_read = blk_write = 0
-
-                # Get detailed container info
-                container_details = container.attrs
-                
-                # Determine the status
-                status = container.status
-                if status == 'running':
-                    health = container_details.get('State', {}).get('Health', {}).get('Status')
-                    if health:
-                        status = health  # This will be 'healthy', 'unhealthy', or 'starting'
-                
-                container_info.append({
-                    'id': container.id,  # Full container ID
-                    'short_id': container.short_id,
-                    'name': container.name,
-                    'status': status,
-                    'image': container.image.tags[0] if container.image.tags else 'N/A',
-                    'cpu_percent': round(cpu_percent, 2),
-                    'mem_percent': round(mem_percent, 2),
-                    'mem_usage': f"{mem_usage / (1024 * 1024):.2f}MB",
-                    'mem_limit': f"{mem_limit / (1024 * 1024):.2f}MB",
-                    'net_io': f"{net_io['rx_bytes'] / (1024 * 1024):.2f}MB / {net_io['tx_bytes'] / (1024 * 1024):.2f}MB",
-                    'block_io': f"{blk_read / (1024 * 1024):.2f}MB / {blk_write / (1024 * 1024):.2f}MB",
-                    'pid': container_details.get('State', {}).get('Pid', 'N/A')
-                })
-            except Exception as e:
-                import traceback
-                traceback.logging.info_exc()
-                logger.error(f"Error processing container {container.id}: {e}")
-                logger.error(f"Container state: {container.attrs.get('State', 'Unknown')}")
-                logger.error(f"Container status: {container.status}")
-        return container_info
-    except docker.errors.DockerException as e:
-        logger.warning(f"Docker is not available: {e}")
-        return []
+        return docker_collector.collect()
     except Exception as e:
         logger.error(f"Error getting Docker container info: {e}")
         return []
 
 # Metrics Update
-def update_metrics():
-    global metrics, last_update_time, last_metrics_update, metric_collection_times
-    last_disk_io = get_disk_io()
-    last_net_usage = get_network_usage()
-    last_time = time.time()
+def calculate_speed(last_counters, current_counters, key, elapsed):
+    if elapsed > 0:
+        return max(0, (current_counters[key] - last_counters[key])) / elapsed / 1024 / 1024
+    return 0
 
-    static_network_info = get_static_network_info()
-    static_disk_info = get_static_disk_info()
-    static_cpu_info = get_static_cpu_info()
+class RateCollector:
+    """Turns a counter collector into per-second speeds using its own sample timestamps."""
 
-    while True:
-        start_time = time.time()
-        current_time = start_time
-        elapsed = current_time - last_time
-
-        new_metrics = {}
-        new_collection_times = {}
-
-        # Update CPU metrics (every cycle)
-        cpu_start = time.time()
-        new_metrics['cpu'] = {**static_cpu_info, **get_cpu_info()}
-        new_collection_times['cpu'] = time.time() - cpu_start
-
-        # Update other metrics
-        for metric, func, interval in [
-            ('memory', get_memory_info, 5),
-            ('disk', lambda: {mountpoint: {**static_disk_info.get(mountpoint, {}), **get_disk_info(mountpoint)} for mountpoint in static_disk_info}, 10),
-            ('gpu', get_gpu_info, 5),
-            ('disk_io', get_disk_io, 2),
-            ('network', get_network_usage, 2),
-            ('top_processes', get_top_processes, 5),
-            ('docker_containers', get_docker_containers if is_docker_available() else lambda: None, 10)
-        ]:
-            if metric not in last_metrics_update or (current_time - last_metrics_update.get(metric, 0)) >= interval:
-                metric_start = time.time()
-                new_metrics[metric] = func()
-                new_collection_times[metric] = time.time() - metric_start
-                last_metrics_update[metric] = current_time
-
-        # Process disk_io and network metrics
-        if 'disk_io' in new_metrics and 'network' in new_metrics:
-            current_disk_io = new_metrics['disk_io']
-            current_net_usage = new_metrics['network']
-            disk_io_speed, net_speed = calculate_speeds(last_disk_io, current_disk_io, last_net_usage, current_net_usage, elapsed)
-            new_metrics['disk_io'] = {**disk_io_speed, 'filesystem': current_disk_io.get('filesystem', 'Unknown')}
-            new_metrics['network'] = {**net_speed, 'static_info': static_network_info}
-            last_disk_io = current_disk_io
-            last_net_usage = current_net_usage
+    def __init__(self, func, speeds):
+        self.func = func
+        self.speeds = speeds
+        self.last_counters = None
+        self.last_time = None
 
-        with metrics_lock:
-            metrics.update(new_metrics)
-            metric_collection_times.update(new_collection_times)
-            last_update_time = datetime.datetime.now()
+    def __call__(self):
+        current_time = time.monotonic()
+        current_counters = self.func()
+        if self.last_counters is None:
+            result = {speed: 0 for speed in self.speeds}
+        else:
+            elapsed = current_time - self.last_time
+            result = {speed: calculate_speed(self.last_counters, current_counters, key, elapsed)
+                      for speed, key in self.speeds.items()}
+        self.last_counters = current_counters
+        self.last_time = current_time
+        return result, current_counters
 
-        last_time = current_time
+def build_snapshot(scheduler_stats):
+    # Must be called with metrics_lock held
+    global current_snapshot, snapshot_id
+    snapshot_id += 1
+    response = {
+        'cpu': metrics.get('cpu', {}),
+        'memory': metrics.get('memory', {}),
+        'gpu': metrics.get('gpu', {}),
+        'disk_io': metrics.get('disk_io', {}),
+        'network': {**metrics.get('network', {}), 'static_info': metrics.get('network_info', {})},
+        'top_processes': metrics.get('top_processes', []),
+        'top_processes_by_memory': metrics.get('top_processes_by_memory', []),
+        'top_processes_by_cpu_time': metrics.get('top_processes_by_cpu_time', []),
+        'top_processes_by_io': metrics.get('top_processes_by_io', []),
+        'docker_containers': metrics.get('docker_containers'),
+        'self': metrics.get('self', {}),
+        'alerts': metrics.get('alerts', []),
+        'metric_collection_times': {k: f"{v:.6f}" for k, v in metric_collection_times.items()},
+        'timestamps': dict(metric_timestamps),
+        'scheduler': scheduler_stats,
+    }
+    if last_update_time:
+        response['last_update'] = last_update_time.isoformat()
+    current_snapshot = MetricsSnapshot(snapshot_id, response, metrics.get('disk', {}),
+                                       dict(metrics), dict(metric_collection_times))
+    if shared_writer is not None:
+        publish_shared_snapshot(response)
 
-        end_time = time.time()
-        sleep_time = max(0, config['refresh_rate'] - (end_time - start_time))
+def publish_shared_snapshot(response):
+    # Must be called with metrics_lock held, workers rebuild the snapshot and stream events from this
+    state = {
+        'id': snapshot_id,
+        'run_id': RUN_ID,
+        'response': response,
+        'disks': metrics.get('disk', {}),
+        'metrics': metrics,
+        'collection_times': metric_collection_times,
+        'timestamps': metric_timestamps,
+        'versions': metric_versions,
+        'sequences': metric_sequences,
+        'sequence': metrics_sequence,
+    }
+    try:
+        shared_writer.write(json.dumps(state, separators=(',', ':')).encode('utf-8'))
+    except ValueError as e:
+        logger.error(f"Error publishing shared snapshot: {e}")
 
-        time.sleep(sleep_time)
+def decode_shared_snapshot(data):
+    state = json.loads(data)
+    # Workers tag their ETags with the collector's run, so every worker gives a snapshot the same one
+    snapshot = MetricsSnapshot(state['id'], state['response'], state['disks'], state['metrics'], state['collection_times'],
+                               state['run_id'])
+    return snapshot, state
 
-def calculate_speeds(last_disk_io, current_disk_io, last_net_usage, current_net_usage, elapsed):
-    if elapsed > 0:
-        disk_io_speed = {
-            'read_speed': max(0, (current_disk_io['read_bytes'] - last_disk_io['read_bytes'])) / elapsed / 1024 / 1024,
-            'write_speed': max(0, (current_disk_io['write_bytes'] - last_disk_io['write_bytes'])) / elapsed / 1024 / 1024,
-        }
-        net_speed = {
-            'upload_speed': max(0, (current_net_usage['bytes_sent'] - last_net_usage['bytes_sent'])) / elapsed / 1024 / 1024,
-            'download_speed': max(0, (current_net_usage['bytes_recv'] - last_net_usage['bytes_recv'])) / elapsed / 1024 / 1024,
-        }
-    else:
-        disk_io_speed = {'read_speed': 0, 'write_speed': 0}
-        net_speed = {'upload_speed': 0, 'download_speed': 0}
-    
-    return disk_io_speed, net_speed
+def attach_shared_snapshot(path):
+    # Turns this process into a worker serving the snapshots a collector process publishes to path
+    global shared_reader
+    empty_state = {'metrics': {}, 'timestamps': {}, 'versions': {}, 'sequences': {}, 'sequence': 0}
+    shared_reader = SharedSnapshotReader(path, decode_shared_snapshot, (MetricsSnapshot(0, {}, {}), empty_state))
+
+def get_snapshot():
+    if shared_reader is not None:
+        return shared_reader.get()[0]
+    return current_snapshot
+
+def format_update_event(sequence, metric, version, payload, timestamp):
+    return (
+        f'id: {sequence}\nevent: update\n'
+        f'data: {{"metric": "{metric}", "version": {version}, "timestamp": {timestamp}, "value": {payload}}}\n\n'
+    )
+
+def publish_metric(metric, value, timestamp, duration):
+    global last_update_time, metrics_sequence
+    if alert_engine is not None:
+        alert_engine.submit(metric, value, timestamp)
+    history.record(timestamp, {metric: value})
+    if tsdb is not None:
+        tsdb.record(timestamp, {metric: value})
+    payload = json.dumps(value)
+    scheduler_stats = scheduler.get_stats()
+    with metrics_lock:
+        metric_collection_times[metric] = duration
+        metric_timestamps[metric] = timestamp
+        last_update_time = datetime.datetime.now()
+        # Unchanged values keep their version so streaming clients are not sent them again
+        changed = metric not in metric_versions or metrics.get(metric) != value
+        if recorder is not None:
+            # Queued under the lock, so samples are recorded in the order they were published
+            recorder.record(timestamp, metric, payload if changed else None, duration)
+        if changed:
+            metrics[metric] = value
+            metrics_sequence += 1
+            version = metric_versions.get(metric, 0) + 1
+            metric_versions[metric] = version
+            metric_sequences[metric] = metrics_sequence
+            metric_events[metric] = format_update_event(metrics_sequence, metric, version, payload, timestamp)
+            metrics_updated.notify_all()
+        build_snapshot(scheduler_stats)
+
+def publish_alerts(alerts, timestamp):
+    # Active alerts are published like a metric, so /metrics, /stream and workers carry them
+    publish_metric('alerts', alerts, timestamp, 0)
+
+def publish_process_scan(metric, process_scan, timestamp, duration):
+    scheduler_stats = scheduler.get_stats()
+    with metrics_lock:
+        metric_collection_times[metric] = duration
+        metric_collection_times['process_scan_per_1k'] = process_scan['duration_per_1k']
+        build_snapshot(scheduler_stats)
+
+def get_placeholder_static_info():
+    # Served until static discovery resolves, when there is no cache from a previous run
+    return {
+        'cpu': {'count': psutil.cpu_count(), 'name': platform.processor() or 'Unknown'},
+        'network': {'general': {'hostname': socket.gethostname(), 'local_ip': 'Resolving...', 'public_ip': 'Resolving...'}},
+        'disk': {},
+    }
+
+def publish_static_info(name, value):
+    # Static network information is published on its own instead of with every network sample
+    if name == 'network':
+        # Cached or slow discovery results must not undo interface changes published since
+        if interface_table is not None and interface_table.interfaces is not None:
+            value = {'general': value.get('general', {}), **interface_table.get()}
+        publish_metric('network_info', value, time.time(), 0)
+
+def create_discovery(cache_dir=None, timeout=DISCOVERY_TIMEOUT):
+    return StaticDiscovery(
+        {'cpu': get_static_cpu_info, 'network': get_static_network_info, 'disk': get_static_disk_info},
+        get_placeholder_static_info(), cache_dir=cache_dir, timeout=timeout, on_update=publish_static_info,
+    )
+
+# Public IP, CPU brand and partitions, resolved in the background and cached between runs
+discovery = create_discovery()
+
+def create_collectors():
+    # (metric, collect function) pairs, in the order the scheduler first runs them
+    disk_io_rates = RateCollector(get_disk_io, {'read_speed': 'read_bytes', 'write_speed': 'write_bytes'})
+    network_rates = RateCollector(get_network_usage, {'upload_speed': 'bytes_sent', 'download_speed': 'bytes_recv'})
+
+    def collect_disk_io():
+        speeds, counters = disk_io_rates()
+        devices = counters.pop('devices', {})
+        return {**counters, **speeds, 'devices': disk_device_rates.update(devices, time.monotonic())}
+
+    def collect_network():
+        speeds, counters = network_rates()
+        interfaces = counters.pop('interfaces', {})
+        return {**counters, **speeds, 'interfaces': interface_rates.update(interfaces, time.monotonic())}
+
+    return [
+        # Walk the process table once, shared by the CPU and top processes collectors
+        ('process_scan', process_scanner.scan),
+        ('cpu', get_cpu_info),
+        ('memory', get_memory_info),
+        ('disk', get_disks),
+        ('gpu', get_gpu_info),
+        ('disk_io', collect_disk_io),
+        ('network', collect_network),
+        ('top_processes', get_top_processes),
+        ('top_processes_by_memory', lambda: get_top_processes(sort_by='memory')),
+        ('top_processes_by_cpu_time', lambda: get_top_processes(sort_by='cpu_time')),
+        ('top_processes_by_io', lambda: get_top_processes(sort_by='io')),
+        ('docker_containers', get_docker_containers if is_docker_available() else lambda: None),
+        ('self', get_self_info),
+    ]
+
+def replay_recording(recording, speed=1, since=None, loop=False):
+    # Publishes the recorded samples like the collectors would, `speed` times faster than they were recorded
+    values = {}
+    shift = 0
+    while True:
+        wall_start = None
+        for timestamp, metric, duration, value in recording.read(since):
+            if value is UNCHANGED:
+                value = values.get(metric)
+            values[metric] = value
+            if metric == 'alerts' and alert_engine is not None:
+                continue  # Alerts come from the rules evaluated on the replayed samples instead
+            # Samples before the start are fast-forwarded, so the state is complete from the first one served
+            if since is None or timestamp >= since:
+                if wall_start is None:
+                    wall_start, first = time.monotonic(), timestamp
+                delay = wall_start + (timestamp - first) / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            publish_metric(metric, value, timestamp + shift, duration)
+        if not loop:
+            logging.info(f"Replay of {recording.path} finished, serving its last samples")
+            return
+        # Every pass is shifted past the previous one, so charts and history keep moving forward
+        shift += recording.end - (since if since is not None else recording.start) + config['refresh_rate']
+
+def update_metrics():
+    scheduler.cpu_budget = config['cpu_budget']
+    for metric, func in create_collectors():
+        interval = config['intervals'].get(metric, config['refresh_rate'])
+        on_result = publish_process_scan if metric == 'process_scan' else publish_metric
+        signal = ADAPTIVE_SIGNALS.get(metric) if config['adaptive'] else None
+        low, high = config['adaptive_range']
+        scheduler.add(metric, func, interval, config['timeouts'].get(metric), on_result, signal,
+                      max(MIN_ADAPTIVE_INTERVAL, interval * low), interval * high)
+
+    scheduler.run()
 
 # Add this function to get top processes
-def get_top_processes(limit=10):
-    processes = []
+def get_top_processes(limit=10, sort_by='cpu'):
     try:
-        for proc in psutil.process_iter(['pid', 'name', 'status', 'username']):
-            try:
-                pinfo = proc.as_dict(attrs=['pid', 'name', 'status', 'username'])
-                
-                # Get CPU usage (this is a lightweight call)
-                pinfo['cpu_percent'] = proc.cpu_percent(interval=None)
-                
-                # Get memory usage
-                with proc.oneshot():
-                    mem_info = proc.memory_info()
-                    pinfo['memory_percent'] = proc.memory_percent()
-                    pinfo['memory_mb'] = mem_info.rss / (1024 * 1024)
-                    
-                    # Get CPU time
-                    cpu_times = proc.cpu_times()
-                    pinfo['cpu_time'] = cpu_times.user + cpu_times.system
-                
-                processes.append(pinfo)
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
+        process_scan = process_scanner.latest()
     except Exception as e:
         logger.error(f"Error in get_top_processes: {e}")
         return []
 
-    # Sort processes by CPU usage
-    processes.sort(key=lambda x: x['cpu_percent'], reverse=True)
-    
-    # Take the top 'limit' processes
-    top_processes = processes[:limit]
-    
-    # Normalize CPU percentages for the top processes
-    total_cpu_percent = sum(p['cpu_percent'] for p in top_processes)
-    if total_cpu_percent > 0:
-        for p in top_processes:
-            p['cpu_percent'] = (p['cpu_percent'] / total_cpu_percent) * 100
+    # Copy the entries, the scan result is shared with other collectors
+    return [dict(p) for p in process_scan[f'top_{sort_by}'][:limit]]
 
-    return top_processes
+def get_self_info():
+    return {
+        **self_usage.collect(),
+        'collector_cpu': scheduler.get_budget_stats(),
+        'alert_samples_dropped': alert_engine.dropped if alert_engine is not None else 0,
+        'recorder_samples_dropped': recorder.dropped if recorder is not None else 0,
+        'tsdb_samples_dropped': tsdb.dropped if tsdb is not None else 0,
+        'routes': {route: histogram.percentiles() for route, histogram in list(route_latencies.items())},
+    }
 
 # Flask Routes
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    # Keyed by route pattern, not URL, so query strings and host indexes do not add series.
+    # Streaming responses are timed until the response starts.
+    start_time = g.get('request_start')
+    if start_time is not None and request.url_rule is not None:
+        rule = request.url_rule.rule
+        histogram = route_latencies.get(rule)
+        if histogram is None:
+            histogram = route_latencies.setdefault(rule, LatencyHistogram())
+        histogram.record(time.perf_counter() - start_time)
+    return response
+
+def get_disk_choices(snapshot):
+    return list(snapshot.disks) or list(discovery.get('disk')) or ['/']
+
 @app.route('/')
 def index():
-    disks = psutil.disk_partitions()
-    hostname = socket.gethostname()
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-    except:
-        local_ip = "Unable to retrieve"
-    
-    return render_template('index.html', disks=[p.mountpoint for p in disks], hostname=hostname, ip_address=local_ip)
+    # Served from discovered static info, so the page never waits on partitions or the network
+    snapshot = get_snapshot()
+    general = (snapshot.metrics.get('network_info') or discovery.get('network')).get('general', {})
+    return render_template('index.html', disks=get_disk_choices(snapshot), hostname=general.get('hostname'),
+                           ip_address=general.get('local_ip'), max_data_points=config['max_data_points'], api_base='')
+
+@app.route('/disks')
+def get_disks():
+    # The disks the dashboard offers, a hub renders an agent's dashboard with them
+    return jsonify(get_disk_choices(get_snapshot()))
 
 @app.route('/metrics')
 def get_metrics():
     selected_disk = request.args.get('disk', '/')
+    # The snapshot is immutable, so requests only need to grab the current reference
+    snapshot = get_snapshot()
+    if not snapshot.has_disk(selected_disk):
+        return jsonify({'error': f"Unknown disk: {selected_disk}"}), 404
+
+    # The compact encoding is opt-in, with ?format=compact or its content type in Accept
+    use_compact = request.args.get('format') == 'compact' or compact.CONTENT_TYPE in request.headers.get('Accept', '')
+    etag, body, gzip_body = snapshot.get_body(selected_disk, use_compact)
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept, Accept-Encoding'}
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers=headers)
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        headers['Content-Encoding'] = 'gzip'
+        body = gzip_body
+    return Response(body, mimetype=compact.CONTENT_TYPE if use_compact else 'application/json', headers=headers)
+
+@app.route('/metrics/schema')
+def get_metrics_schema():
+    # Static, clients fetch it once and rebuild display strings of compact payloads from it
+    return jsonify(compact.get_schema())
+
+@app.route('/metrics/openmetrics')
+def get_openmetrics():
+    return Response(get_snapshot().get_openmetrics(), content_type=openmetrics.CONTENT_TYPE)
+
+def stream_events(last_sequence):
     with metrics_lock:
-        response = {
-            'cpu': metrics.get('cpu', {}),
-            'memory': metrics.get('memory', {}),
-            'disk': metrics.get('disk', {}).get(selected_disk, get_disk_info(selected_disk)),
-            'gpu': metrics.get('gpu', {}),
-            'disk_io': metrics.get('disk_io', {}),
-            'network': metrics.get('network', {}),
-            'top_processes': metrics.get('top_processes', []),
-            'docker_containers': metrics.get('docker_containers'),
-        }
-        
-        # Always include last update timestamp and metric collection times
-        if last_update_time:
-            response['last_update'] = last_update_time.isoformat()
-        response['metric_collection_times'] = {k: f"{v:.6f}" for k, v in metric_collection_times.items()}
+        if last_sequence is None:
+            snapshot = {'metrics': dict(metrics), 'timestamps': dict(metric_timestamps), 'versions': dict(metric_versions)}
+            last_sequence = metrics_sequence
+        else:
+            snapshot = None
+    if snapshot is not None:
+        yield f"id: {last_sequence}\nevent: snapshot\ndata: {json.dumps(snapshot)}\n\n"
 
-    return jsonify(response)
+    while True:
+        with metrics_lock:
+            if metrics_sequence == last_sequence:
+                metrics_updated.wait(STREAM_KEEPALIVE)
+            events = [metric_events[metric] for metric, sequence in metric_sequences.items() if sequence > last_sequence]
+            last_sequence = metrics_sequence
+        if events:
+            yield ''.join(events)
+        else:
+            yield ': keep-alive\n\n'
+
+def stream_shared_events(last_sequence):
+    # Worker processes have no condition to wait on, so they poll the shared sequence
+    state = shared_reader.get()[1]
+    if last_sequence is None or last_sequence > state['sequence']:
+        last_sequence = state['sequence']
+        snapshot = {'metrics': state['metrics'], 'timestamps': state['timestamps'], 'versions': state['versions']}
+        yield f"id: {last_sequence}\nevent: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+
+    last_event = time.monotonic()
+    while True:
+        time.sleep(SHARED_POLL_INTERVAL)
+        state = shared_reader.get()[1]
+        if state['sequence'] != last_sequence:
+            events = [format_update_event(sequence, metric, state['versions'][metric], json.dumps(state['metrics'][metric]),
+                                          state['timestamps'].get(metric, 0))
+                      for metric, sequence in state['sequences'].items() if sequence > last_sequence]
+            last_sequence = state['sequence']
+            last_event = time.monotonic()
+            yield ''.join(events)
+        elif time.monotonic() - last_event >= STREAM_KEEPALIVE:
+            last_event = time.monotonic()
+            yield ': keep-alive\n\n'
+
+@app.route('/stream')
+def stream_metrics():
+    # Reconnecting clients resume from the last event they saw instead of getting a new snapshot
+    last_event_id = request.headers.get('Last-Event-ID')
+    last_sequence = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    if shared_reader is not None:
+        events = stream_shared_events(last_sequence)
+    else:
+        if last_sequence is not None and last_sequence > metrics_sequence:
+            last_sequence = None
+        events = stream_events(last_sequence)
+    return Response(events, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/alerts')
+def get_alerts():
+    return jsonify(get_snapshot().response.get('alerts', []))
+
+@app.route('/history')
+def get_history():
+    if shared_reader is not None:
+        return jsonify({'error': "History is kept by the collector process and is not available from workers"}), 503
+    series = request.args.get('series')
+    names = [name for name in series.split(',') if name] if series else None
+    since = request.args.get('since', type=float)
+    resolution = request.args.get('resolution')
+    try:
+        if resolution is None:
+            data = history.query(names, since)
+        elif tsdb is None:
+            return jsonify({'error': "Durable history is disabled, start ez_monitor with --data-dir"}), 400
+        elif resolution not in RESOLUTIONS:
+            return jsonify({'error': f"Unknown resolution: {resolution}"}), 400
+        else:
+            until = request.args.get('until', type=float) or time.time()
+            data = tsdb.query(names, since or 0, until, resolution)
+    except KeyError as e:
+        return jsonify({'error': f"Unknown series: {e.args[0]}"}), 400
+    return jsonify({'series': data, 'max_data_points': history.capacity, 'now': time.time()})
+
+@app.route('/processes')
+def get_processes():
+    if shared_reader is not None:
+        return jsonify({'error': "Process tracking is kept by the collector process and is not available from workers"}), 503
+    return jsonify(process_scanner.get_tracking())
+
+@app.route('/debug/profile')
+def debug_profile():
+    # Samples collector threads at 100 Hz and returns folded stacks for flamegraph tools
+    seconds = min(max(request.args.get('seconds', 10, type=float), 0.1), MAX_PROFILE_SECONDS)
+    prefix = '' if request.args.get('threads') == 'all' else 'collector-'
+    include_idle = request.args.get('idle') == '1'
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({'error': "A profile is already running"}), 409
+    try:
+        folded = sample_stacks(seconds, thread_prefix=prefix, include_idle=include_idle)
+    finally:
+        profile_lock.release()
+    return Response(folded, mimetype='text/plain',
+                    headers={'Content-Disposition': 'attachment; filename=ez_monitor.folded'})
 
 # Command-line argument parsing
-def parse_arguments():
+def parse_speed(value):
+    # Parses "10x", "10" or "0.5x" into a replay speed factor
+    try:
+        speed = float(value[:-1] if value.lower().endswith('x') else value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid speed '{value}', expected e.g. 10x")
+    if speed <= 0:
+        raise argparse.ArgumentTypeError(f"Invalid speed '{value}', it must be positive")
+    return speed
+
+def resolve_replay_start(value, recording):
+    # Unix time, an ISO 8601 date and time, or "+seconds" after the start of the recording
+    if value.startswith('+'):
+        return recording.start + float(value[1:])
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+def parse_metric_values(value):
+    # Parses "cpu=1,memory=5" into {'cpu': 1.0, 'memory': 5.0}
+    result = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        name, _, seconds = item.partition('=')
+        try:
+            result[name.strip()] = float(seconds)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid value '{item}', expected metric=seconds")
+    return result
+
+def add_common_arguments(parser, defaults=True):
+    # Options shared by plain runs and the record and replay commands. The commands take them without
+    # defaults, so an option given before the command is not reset by the command's default.
+    def default(value):
+        return value if defaults else argparse.SUPPRESS
+    parser.add_argument('--host', default=default('0.0.0.0'), help='Host to run the server on')
+    parser.add_argument('-p', '--port', type=int, default=default(5000), help='Port to run the server on')
+    parser.add_argument('-r', '--refresh-rate', type=float, default=default(2), help='Refresh rate in seconds')
+    parser.add_argument('-m', '--max-data-points', type=int, default=default(1800), help='Maximum number of data points to keep')
+    parser.add_argument('--intervals', type=parse_metric_values, default=default({}), help='Per collector intervals in seconds, e.g. cpu=1,memory=5,docker_containers=10')
+    parser.add_argument('--timeouts', type=parse_metric_values, default=default({}), help='Per collector timeouts in seconds, e.g. disk=30')
+    parser.add_argument('--data-dir', default=default(None), help='Directory for durable history with 1 minute and 1 hour rollups')
+    parser.add_argument('--storage-limit-mb', type=int, default=default(256), help='Maximum size of the durable history in MB')
+    parser.add_argument('--cache-dir', default=default(None), help='Directory for the static info cache (default: --data-dir or ~/.cache/ez_monitor, empty to disable)')
+    parser.add_argument('--discovery-timeout', type=float, default=default(DISCOVERY_TIMEOUT), help='Seconds each static info lookup may delay startup')
+    parser.add_argument('--offline', action='store_true', default=default(False), help='Skip lookups that need internet access, e.g. the public IP')
+    parser.add_argument('--docker-limit', type=int, default=default(10), help='Maximum number of Docker containers to monitor')
+    parser.add_argument('--adaptive', action='store_true', default=default(False), help='Sample CPU, memory, GPU, disk I/O and network faster while they change and slower while they are flat')
+    parser.add_argument('--cpu-budget', type=float, default=default(None), help='Percent of one core the collectors may use, enforced by stretching the intervals of the most expensive collectors')
+    parser.add_argument('--alert-rules', default=default(None), help='JSON file of alert rules and notifiers, evaluated on every sample')
+    parser.add_argument('--backend', choices=['auto', 'procfs', 'psutil'], default=default('auto'), help='Read system counters from kept-open /proc files (Linux) or through psutil')
+    parser.add_argument('--container-backend', choices=['docker', 'cgroup'], default=default('docker'), help='Read container stats from the Docker API or directly from cgroup v2 files')
+    parser.add_argument('--disk-timeout', type=float, default=default(STATFS_TIMEOUT), help='Seconds each mount\'s disk usage call may take before the mount is reported as stale')
+    parser.add_argument('--mount-exclude-fstypes', default=default(None), help='Comma separated filesystem types the disk collector skips (default: pseudo filesystems such as proc, sysfs and tmpfs)')
+    parser.add_argument('--mount-exclude-devices', default=default(DEFAULT_EXCLUDE_DEVICES), help='Regular expression of devices the disk collector skips, empty to keep all (default: loop devices)')
+    parser.add_argument('--no-remote-mounts', action='store_true', default=default(False), help='Skip network filesystems such as NFS and CIFS in the disk collector')
+    parser.add_argument('--no-process-io', action='store_true', default=default(False), help='Skip per-process I/O counters, disabling process read/write rates and the top processes by I/O')
+    parser.add_argument('--nvidia-smi', default=default('nvidia-smi'), help='nvidia-smi command for the GPU collector, may include arguments')
+    parser.add_argument('--docker-url', default=default(None), help='Docker API URL (default: from the environment, e.g. DOCKER_HOST)')
+    parser.add_argument('--workers', type=int, default=default(1), help='Number of forked worker processes serving shared snapshots, collection stays in the main process (POSIX only)')
+    parser.add_argument('--collect-only', action='store_true', default=default(False), help='Only collect and publish snapshots to shared memory, for serving with ez_monitor.wsgi under a WSGI server')
+    parser.add_argument('--shm-path', default=default(None), help='Shared memory file for snapshots (default: /dev/shm/ez_monitor-<port>)')
+    parser.add_argument('--shm-size-mb', type=int, default=default(DEFAULT_SIZE // (1024 * 1024)), help='Size of the shared snapshot buffer in MB')
+    parser.add_argument('--hub', metavar='AGENTS_FILE', default=default(None), help='Run as a hub aggregating the agents listed in this file (one host:port or URL per line)')
+    parser.add_argument('--hub-timeout', type=float, default=default(1.5), help='Per agent request timeout in seconds in hub mode')
+    parser.add_argument('--hub-workers', type=int, default=default(32), help='Number of concurrent agent requests in hub mode')
+    parser.add_argument('--debug', action='store_true', default=default(False), help='Run in debug mode')
+
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(description='ez_monitor - System Metrics Dashboard')
-    parser.add_argument('--host', default='0.0.0.0', help='Host to run the server on')
-    parser.add_argument('-p', '--port', type=int, default=5000, help='Port to run the server on')
-    parser.add_argument('-r', '--refresh-rate', type=float, default=2, help='Refresh rate in seconds')
-    parser.add_argument('-m', '--max-data-points', type=int, default=1800, help='Maximum number of data points to keep')
-    parser.add_argument('--debug', action='store_true', help='Run in debug mode')
-    return parser.parse_args()
+    add_common_arguments(parser)
+    commands = parser.add_subparsers(dest='command', metavar='{record,replay}')
+    record = commands.add_parser('record', help='Monitor as usual and append every published sample to a recording')
+    add_common_arguments(record, defaults=False)
+    record.add_argument('path', help='Recording file, continued if it exists, with its index in <path>.idx')
+    replay = commands.add_parser('replay', help='Serve the dashboard and API from a recording instead of this system')
+    add_common_arguments(replay, defaults=False)
+    replay.add_argument('path', help='Recording file written by the record command')
+    replay.add_argument('--speed', type=parse_speed, default=1, help='Replay speed, e.g. 10x (default: 1x)')
+    replay.add_argument('--start', default=None, help='Where to start: Unix time, ISO 8601 date and time, or +seconds into the recording')
+    replay.add_argument('--loop', action='store_true', help='Start over at the end of the recording')
+    return parser.parse_args(argv)
+
+def run_hub(args):
+    from .hub import Hub, create_hub_app, read_agents
+    hub = Hub(read_agents(args.hub), refresh_rate=args.refresh_rate, timeout=args.hub_timeout, workers=args.hub_workers)
+    logging.info(f"Starting hub for {len(hub.agents)} agents")
+    Thread(target=hub.run, daemon=True).start()
+    hub_app = create_hub_app(hub, config['max_data_points'])
+    hub_app.run(debug=args.debug, use_reloader=False, threaded=True, host=args.host, port=args.port)
+
+def exit_with_parent(parent_pid):
+    # Forked workers have no other way to notice that the collector process is gone
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    os._exit(0)
+
+def run_worker(listener, shm_path, parent_pid, args):
+    from werkzeug.serving import make_server
+    global shared_writer
+    shared_writer = None
+    attach_shared_snapshot(shm_path)
+    Thread(target=exit_with_parent, args=(parent_pid,), daemon=True).start()
+    server = make_server(args.host, args.port, app, threaded=True, fd=listener.fileno())
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+def start_workers(args, shm_path):
+    # Forked before any thread starts, every worker accepts on the same listening socket
+    listener = socket.socket(socket.AF_INET6 if ':' in args.host else socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(128)
+    parent_pid = os.getpid()
+    for _ in range(args.workers):
+        if os.fork() == 0:
+            run_worker(listener, shm_path, parent_pid, args)
+    listener.close()
 
 def main():
+    global history, tsdb, discovery, shared_writer, system, alert_engine, recorder
     args = parse_arguments()
     
     # Update logging level based on debug flag
@@ -542,9 +1040,96 @@ def main():
     # Update global configuration
     config['refresh_rate'] = args.refresh_rate
     config['max_data_points'] = args.max_data_points
+    config['intervals'].update(args.intervals)
+    config['timeouts'].update(args.timeouts)
+    config['docker_limit'] = args.docker_limit
+    config['docker_url'] = args.docker_url
+    config['container_backend'] = args.container_backend
+    config['nvidia_smi'] = args.nvidia_smi
+    config['disk_timeout'] = args.disk_timeout
+    if args.mount_exclude_fstypes is not None:
+        config['mount_exclude_fstypes'] = [fstype.strip() for fstype in args.mount_exclude_fstypes.split(',') if fstype.strip()]
+    try:
+        re.compile(args.mount_exclude_devices)
+    except re.error as e:
+        sys.exit(f"Invalid --mount-exclude-devices expression: {e}")
+    config['mount_exclude_devices'] = args.mount_exclude_devices
+    config['remote_mounts'] = not args.no_remote_mounts
+    config['process_io'] = not args.no_process_io
+    process_scanner.io = config['process_io']
+    history = HistoryStore(config['max_data_points'])
+    config['data_dir'] = args.data_dir
+    config['storage_limit_mb'] = args.storage_limit_mb
+    config['offline'] = args.offline
+
+    # Rule errors stop startup before any worker is forked
+    alert_rules = None
+    if args.alert_rules:
+        try:
+            alert_rules = load_rules(args.alert_rules)
+        except (OSError, ValueError) as e:
+            sys.exit(f"Could not load alert rules from {args.alert_rules}: {e}")
+
+    # Recording errors also stop startup before any worker is forked
+    recording = None
+    if args.command == 'replay':
+        try:
+            recording = Recording(args.path)
+            replay_start = resolve_replay_start(args.start, recording) if args.start else None
+        except (OSError, ValueError) as e:
+            sys.exit(f"Could not replay {args.path}: {e}")
+
+    if args.hub:
+        run_hub(args)
+        return
+
+    if args.workers > 1 or args.collect_only:
+        shm_path = args.shm_path or default_shm_path(args.port)
+        shared_writer = SeqlockBuffer(shm_path, args.shm_size_mb * 1024 * 1024, create=True)
+        logging.info(f"Publishing snapshots to {shm_path}")
+        if args.workers > 1 and not args.collect_only:
+            if not hasattr(os, 'fork'):
+                sys.exit("--workers needs a POSIX system, use --collect-only with a WSGI server instead")
+            start_workers(args, shm_path)
+
+    config['backend'] = args.backend
+    config['adaptive'] = args.adaptive
+    config['cpu_budget'] = args.cpu_budget / 100 if args.cpu_budget is not None else None
+    system = create_backend(config['backend'])
+
+    if config['data_dir']:
+        tsdb = TimeSeriesStore(config['data_dir'], config['storage_limit_mb'] * 1024 * 1024)
+
+    if alert_rules is not None:
+        rules, notifiers, repeat_interval = alert_rules
+        alert_engine = AlertEngine(rules, notifiers, repeat_interval, on_change=publish_alerts)
+        alert_engine.start()
+        logging.info(f"Loaded {len(rules)} alert rules and {len(notifiers)} notifiers")
+
+    if args.command == 'record':
+        try:
+            recorder = RecordingWriter(args.path)
+        except (OSError, ValueError) as e:
+            sys.exit(f"Could not record to {args.path}: {e}")
+        logging.info(f"Recording every published sample to {args.path}")
+
+    if recording is not None:
+        # The recorded host's static info is part of the recording, so nothing is discovered here
+        logging.info(f"Replaying {args.path} at {args.speed:g}x")
+        collect = lambda: replay_recording(recording, args.speed, replay_start, args.loop)
+    else:
+        cache_dir = args.cache_dir if args.cache_dir is not None else (config['data_dir'] or default_cache_dir())
+        discovery = create_discovery(cache_dir or None, args.discovery_timeout)
+        discovery.start()
+        collect = update_metrics
+
+    if shared_writer is not None:
+        # Workers or an external WSGI server do the serving, this process only collects
+        collect()
+        return
     
     # Start the background metrics update thread
-    metrics_thread = Thread(target=update_metrics, daemon=True)
+    metrics_thread = Thread(target=collect, daemon=True)
     metrics_thread.start()
     
     # Run the Flask app with auto-reload when in debug mode
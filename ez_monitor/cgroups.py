@@ -0,0 +1,288 @@
+import datetime
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+PROC_ROOT = '/proc'
+
+# Container cgroups as laid out by the systemd and cgroupfs drivers of Docker and Podman
+CONTAINER_DIRS = ['system.slice', 'docker', 'machine.slice', 'libpod_parent']
+CONTAINER_PATTERN = re.compile(r'^(?:docker-|libpod-)?([0-9a-f]{64})(?:\.scope)?$')
+
+# Largest file we expect to read, io.stat grows with the number of block devices
+READ_SIZE = 65536
+
+# Seconds before a failed name lookup is tried again
+LOOKUP_RETRY = 60
+
+
+def is_cgroup_v2(root=CGROUP_ROOT):
+    return os.path.exists(os.path.join(root, 'cgroup.controllers'))
+
+
+def find_container_cgroups(root=CGROUP_ROOT):
+    # Maps container ID to its cgroup directory
+    found = {}
+    for directory in CONTAINER_DIRS:
+        try:
+            entries = os.scandir(os.path.join(root, directory))
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                match = CONTAINER_PATTERN.match(entry.name)
+                if match and entry.is_dir(follow_symlinks=False):
+                    found[match.group(1)] = entry.path
+    return found
+
+
+def parse_created(value):
+    # Docker reports nanoseconds, e.g. 2024-05-01T12:00:00.123456789Z, which fromisoformat does not take
+    try:
+        value = re.sub(r'(\.\d{6})\d+', r'\1', value).replace('Z', '+00:00')
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_keyed(data):
+    # "key value" lines, as in cpu.stat and cgroup.events
+    result = {}
+    for line in data.split(b'\n'):
+        key, _, value = line.partition(b' ')
+        if value:
+            result[key] = int(value)
+    return result
+
+
+def parse_io_stat(data):
+    # "8:0 rbytes=1 wbytes=2 rios=3 wios=4 ..." per device, summed over devices
+    read_bytes = write_bytes = 0
+    for line in data.split(b'\n'):
+        for field in line.split(b' ')[1:]:
+            key, _, value = field.partition(b'=')
+            if key == b'rbytes':
+                read_bytes += int(value)
+            elif key == b'wbytes':
+                write_bytes += int(value)
+    return read_bytes, write_bytes
+
+
+def parse_net_dev(data):
+    # Sums every interface of the container's network namespace except loopback
+    rx_bytes = tx_bytes = 0
+    for line in data.split(b'\n')[2:]:
+        name, _, fields = line.partition(b':')
+        if not fields or name.strip() == b'lo':
+            continue
+        values = fields.split()
+        rx_bytes += int(values[0])
+        tx_bytes += int(values[8])
+    return rx_bytes, tx_bytes
+
+
+class CgroupFiles:
+    """Open file descriptors for one container's cgroup files, re-read with pread."""
+
+    FILES = ['cpu.stat', 'memory.current', 'memory.max', 'io.stat', 'pids.current', 'cgroup.events']
+
+    def __init__(self, path, proc_root=PROC_ROOT):
+        self.path = path
+        self.proc_root = proc_root
+        self.fds = {}
+        for name in self.FILES:
+            try:
+                self.fds[name] = os.open(os.path.join(path, name), os.O_RDONLY)
+            except OSError:
+                # Controllers that are not enabled for this cgroup have no files
+                pass
+        self.pid = None
+        self.net_fd = None
+        self.previous = None
+
+    def read(self, name):
+        fd = self.fds.get(name)
+        if fd is None:
+            return b''
+        return os.pread(fd, READ_SIZE, 0)
+
+    def _net_fd(self):
+        # The network namespace is read through the container's init process
+        if self.net_fd is None:
+            try:
+                with open(os.path.join(self.path, 'cgroup.procs'), 'rb') as f:
+                    self.pid = int(f.readline())
+                self.net_fd = os.open(os.path.join(self.proc_root, str(self.pid), 'net', 'dev'), os.O_RDONLY)
+            except (OSError, ValueError):
+                return None
+        return self.net_fd
+
+    def read_net(self):
+        fd = self._net_fd()
+        if fd is None:
+            return 0, 0
+        try:
+            return parse_net_dev(os.pread(fd, READ_SIZE, 0))
+        except OSError:
+            # The process exited, the next read opens the new init process
+            os.close(fd)
+            self.net_fd = None
+            return 0, 0
+
+    def close(self):
+        for fd in self.fds.values():
+            os.close(fd)
+        if self.net_fd is not None:
+            os.close(self.net_fd)
+        self.fds = {}
+        self.net_fd = None
+
+
+class DockerNames:
+    """Container name, image and creation time from the Docker API, looked up once per container.
+
+    A failed lookup, e.g. while the daemon restarts, falls back to the short ID and is
+    tried again after LOOKUP_RETRY seconds.
+    """
+
+    def __init__(self, base_url=None):
+        self.base_url = base_url
+        self.client = None
+        # Container ID -> ((name, image, created), time to look it up again or None)
+        self.cache = {}
+
+    def _get_client(self):
+        if self.client is None:
+            import docker
+            self.client = docker.DockerClient(base_url=self.base_url) if self.base_url else docker.from_env()
+        return self.client
+
+    def get(self, container_id):
+        cached = self.cache.get(container_id)
+        if cached is not None and (cached[1] is None or time.monotonic() < cached[1]):
+            return cached[0]
+        try:
+            attrs = self._get_client().containers.get(container_id).attrs
+            names = (attrs.get('Name', '').lstrip('/') or container_id[:12], attrs.get('Config', {}).get('Image') or 'N/A',
+                     parse_created(attrs.get('Created')))
+            retry_at = None
+        except Exception as e:
+            logger.debug(f"Could not look up container {container_id[:12]}: {e}")
+            names = (container_id[:12], 'N/A', None)
+            retry_at = time.monotonic() + LOOKUP_RETRY
+        self.cache[container_id] = (names, retry_at)
+        return names
+
+    def prune(self, container_ids):
+        # Drops the containers that are gone
+        for container_id in [cid for cid in self.cache if cid not in container_ids]:
+            del self.cache[container_id]
+
+
+class CgroupContainerCollector:
+    """Container CPU, memory, block and network I/O read straight from cgroup v2 files.
+
+    File descriptors stay open between cycles and rates come from the collector's own
+    previous sample, so one cycle costs a few preads per container. The Docker API is
+    only used once per container, for its name, image and creation time.
+    """
+
+    def __init__(self, limit=10, base_url=None, root=CGROUP_ROOT, proc_root=PROC_ROOT, names=None, host_memory=None):
+        self.limit = limit
+        self.root = root
+        self.proc_root = proc_root
+        self.names = names if names is not None else DockerNames(base_url)
+        self.host_memory = host_memory
+        self.containers = {}
+
+    def _created(self, container_id, path):
+        created = self.names.get(container_id)[2]
+        if created is None:
+            # Without Docker, the cgroup directory is created when the container starts
+            try:
+                created = os.stat(path).st_ctime
+            except OSError:
+                created = 0
+        return created
+
+    def _sync(self):
+        # Newest containers first, the order the Docker API lists them in for the docker backend's limit
+        found = find_container_cgroups(self.root)
+        self.names.prune(found)
+        order = sorted(found, key=lambda cid: (self._created(cid, found[cid]), cid), reverse=True)[:self.limit]
+        # Only containers within the limit keep descriptors open, six or seven each
+        for container_id in [cid for cid in self.containers if cid not in order]:
+            self.containers.pop(container_id).close()
+        self.containers = {cid: self.containers.get(cid) or CgroupFiles(found[cid], self.proc_root) for cid in order}
+
+    def _sample(self, files):
+        cpu_usec = parse_keyed(files.read('cpu.stat')).get(b'usage_usec', 0)
+        memory = files.read('memory.current').strip()
+        limit = files.read('memory.max').strip()
+        read_bytes, write_bytes = parse_io_stat(files.read('io.stat'))
+        pids = files.read('pids.current').strip()
+        events = parse_keyed(files.read('cgroup.events'))
+        rx_bytes, tx_bytes = files.read_net()
+        return {
+            'time': time.monotonic(),
+            'cpu_usec': cpu_usec,
+            'memory': int(memory) if memory else 0,
+            'limit': int(limit) if limit and limit != b'max' else self.host_memory,
+            'read_bytes': read_bytes,
+            'write_bytes': write_bytes,
+            'pids': int(pids) if pids else 0,
+            'frozen': events.get(b'frozen') == 1,
+            'rx_bytes': rx_bytes,
+            'tx_bytes': tx_bytes,
+        }
+
+    def collect(self):
+        self._sync()
+        container_info = []
+        for container_id, files in self.containers.items():
+            try:
+                sample = self._sample(files)
+            except (OSError, ValueError) as e:
+                logger.debug(f"Could not read cgroup of container {container_id[:12]}: {e}")
+                continue
+            previous, files.previous = files.previous, sample
+            rates = {'cpu_percent': 0, 'read_speed': 0, 'write_speed': 0, 'rx_speed': 0, 'tx_speed': 0}
+            if previous is not None and sample['time'] > previous['time']:
+                elapsed = sample['time'] - previous['time']
+                rates['cpu_percent'] = (sample['cpu_usec'] - previous['cpu_usec']) / 1e6 / elapsed * 100
+                for rate, counter in [('read_speed', 'read_bytes'), ('write_speed', 'write_bytes'),
+                                      ('rx_speed', 'rx_bytes'), ('tx_speed', 'tx_bytes')]:
+                    rates[rate] = max(0, sample[counter] - previous[counter]) / elapsed / 1024 / 1024
+
+            name, image, _ = self.names.get(container_id)
+            mem_usage, mem_limit = sample['memory'], sample['limit'] or 0
+            container_info.append({
+                'id': container_id,
+                'short_id': container_id[:12],
+                'name': name,
+                'status': 'paused' if sample['frozen'] else 'running',
+                'image': image,
+                'pid': files.pid or 'N/A',
+                'pids': sample['pids'],
+                'cpu_percent': round(rates['cpu_percent'], 2),
+                'mem_percent': round(mem_usage / mem_limit * 100, 2) if mem_limit else 0,
+                'mem_usage': f"{mem_usage / (1024 * 1024):.2f}MB",
+                'mem_limit': f"{mem_limit / (1024 * 1024):.2f}MB",
+                'net_io': f"{sample['rx_bytes'] / (1024 * 1024):.2f}MB / {sample['tx_bytes'] / (1024 * 1024):.2f}MB",
+                'block_io': f"{sample['read_bytes'] / (1024 * 1024):.2f}MB / {sample['write_bytes'] / (1024 * 1024):.2f}MB",
+                'mem_usage_bytes': mem_usage,
+                'mem_limit_bytes': mem_limit,
+                'net_rx_bytes': sample['rx_bytes'],
+                'net_tx_bytes': sample['tx_bytes'],
+                'block_read_bytes': sample['read_bytes'],
+                'block_write_bytes': sample['write_bytes'],
+                'net_rx_speed': rates['rx_speed'],
+                'net_tx_speed': rates['tx_speed'],
+                'block_read_speed': rates['read_speed'],
+                'block_write_speed': rates['write_speed'],
+            })
+        return container_info
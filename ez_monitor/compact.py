@@ -0,0 +1,239 @@
+import json
+import math
+import struct
+import zlib
+
+CONTENT_TYPE = 'application/vnd.ez-monitor.compact'
+
+MAGIC = b'EZC1'
+# Magic and header length, followed by the JSON header, padding to 8 bytes and the float64 values
+PREFIX = struct.Struct('<4sI')
+
+# Display strings the compact format leaves out, with the format and raw fields the client rebuilds them from.
+# Paths are relative to the /metrics response, '*' matches every item.
+DERIVED_FIELDS = [
+    ('cpu', {
+        'frequency': ['mhz', 'frequency_hz'],
+        'load_average': ['join2', 'load'],
+    }),
+    ('memory', {
+        'total': ['gib', 'total_bytes'],
+        'used': ['gib', 'used_bytes'],
+        'available': ['gib', 'available_bytes'],
+        'swap_total': ['gib', 'swap_total_bytes'],
+        'swap_used': ['gib', 'swap_used_bytes'],
+        'cached': ['gib', 'cached_bytes'],
+        'buffers': ['gib', 'buffers_bytes'],
+    }),
+    ('disk', {
+        'total': ['gib_unit', 'total_bytes'],
+        'used': ['gib_unit', 'used_bytes'],
+        'free': ['gib_unit', 'free_bytes'],
+    }),
+    ('gpu', {
+        'memory_used': ['mib_unit', 'memory_used_bytes'],
+        'memory_total': ['mib_unit', 'memory_total_bytes'],
+    }),
+    ('gpu.gpus.*', {
+        'memory_used': ['mib_unit', 'memory_used_bytes'],
+        'memory_total': ['mib_unit', 'memory_total_bytes'],
+    }),
+    ('docker_containers.*', {
+        'mem_usage': ['mib2', 'mem_usage_bytes'],
+        'mem_limit': ['mib2', 'mem_limit_bytes'],
+        'net_io': ['mib2_pair', 'net_rx_bytes', 'net_tx_bytes'],
+        'block_io': ['mib2_pair', 'block_read_bytes', 'block_write_bytes'],
+    }),
+]
+
+FORMATTERS = {
+    'mhz': lambda hz: f"{hz / 1e6:.0f} MHz",
+    'join2': lambda values: ', '.join(f"{value:.2f}" for value in values),
+    'gib': lambda value: f"{value / (1024 ** 3):.2f}",
+    'gib_unit': lambda value: f"{value / (1024 ** 3):.2f} GB",
+    'mib_unit': lambda value: f"{value / (1024 * 1024):.0f} MB",
+    'mib2': lambda value: f"{value / (1024 * 1024):.2f}MB",
+    'mib2_pair': lambda first, second: f"{first / (1024 * 1024):.2f}MB / {second / (1024 * 1024):.2f}MB",
+}
+
+# Units of raw numeric fields, by exact name first and then by suffix
+UNITS = {
+    'percent': 'percent',
+    'usage': 'percent',
+    'user': 'percent',
+    'system': 'percent',
+    'idle': 'percent',
+    'cores': 'percent',
+    'temperature': 'celsius',
+    'power_draw': 'watts',
+    'power_limit': 'watts',
+    'cpu_time': 'seconds',
+    'cpu_seconds': 'seconds',
+    'memory_mb': 'mebibytes',
+    'since': 'unix_seconds',
+    'updated': 'unix_seconds',
+    'create_time': 'unix_seconds',
+    'memory_growth_mb': 'mebibytes',
+    'mtu': 'bytes',
+    'speed_mbps': 'megabits_per_second',
+}
+UNIT_SUFFIXES = [
+    ('_bytes', 'bytes'),
+    ('_percent', 'percent'),
+    ('_speed', 'mebibytes_per_second'),
+    ('_hz', 'hertz'),
+    ('_count', 'count'),
+    ('_time', 'milliseconds'),
+]
+
+SCHEMA = {'derived': DERIVED_FIELDS, 'formats': sorted(FORMATTERS), 'units': UNITS, 'unit_suffixes': UNIT_SUFFIXES}
+SCHEMA_VERSION = f"{zlib.crc32(json.dumps(SCHEMA, sort_keys=True).encode('utf-8')):08x}"
+
+
+def get_schema():
+    return {'version': SCHEMA_VERSION, **SCHEMA}
+
+
+def matches(value, path):
+    # Dicts the path points at, '*' expands dict values and list items
+    if not path:
+        if isinstance(value, dict):
+            yield value
+        return
+    part, rest = path[0], path[1:]
+    if part == '*':
+        items = value.values() if isinstance(value, dict) else value if isinstance(value, list) else []
+        for item in items:
+            yield from matches(item, rest)
+    elif isinstance(value, dict) and part in value:
+        yield from matches(value[part], rest)
+
+
+def without_derived(value, path, fields):
+    # Copies only the containers along the path, everything else is shared with the response
+    if not path:
+        if not isinstance(value, dict):
+            return value
+        return {key: item for key, item in value.items()
+                if key not in fields or any(value.get(source) is None for source in fields[key][1:])}
+    part, rest = path[0], path[1:]
+    if part == '*':
+        if isinstance(value, dict):
+            return {key: without_derived(item, rest, fields) for key, item in value.items()}
+        if isinstance(value, list):
+            return [without_derived(item, rest, fields) for item in value]
+        return value
+    if isinstance(value, dict) and part in value:
+        return {**value, part: without_derived(value[part], rest, fields)}
+    return value
+
+
+def strip_derived(response):
+    for path, fields in DERIVED_FIELDS:
+        response = without_derived(response, path.split('.'), fields)
+    return response
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class Encoder:
+    """Moves every number of a JSON-like tree into one float64 array.
+
+    In the remaining tree a number is the index of its value. Lists of numbers become
+    {"$a": [offset, length]}, and lists of dicts or dicts of dicts that share their
+    keys become columns, {"$t": {"n": rows, "c": columns}} and {"$m": {"k": keys,
+    "c": columns}}, whose numeric columns are contiguous runs of values, so the
+    client reads them as typed array views. None in a numeric column is NaN.
+    """
+
+    def __init__(self):
+        self.values = []
+
+    def array(self, numbers):
+        offset = len(self.values)
+        self.values.extend(math.nan if number is None else number for number in numbers)
+        return {'$a': [offset, len(numbers)]}
+
+    def columns(self, rows):
+        columns = {}
+        for key in rows[0]:
+            cells = [row[key] for row in rows]
+            if all(cell is None or is_number(cell) for cell in cells) and any(cell is not None for cell in cells):
+                columns[key] = self.array(cells)
+            else:
+                columns[key] = [self.encode(cell) for cell in cells]
+        return columns
+
+    def encode(self, value):
+        if is_number(value):
+            self.values.append(value)
+            return len(self.values) - 1
+        if isinstance(value, dict):
+            children = list(value.values())
+            if len(children) > 1 and all(isinstance(child, dict) for child in children) and same_keys(children):
+                return {'$m': {'k': list(value), 'c': self.columns(children)}}
+            return {key: self.encode(child) for key, child in value.items()}
+        if isinstance(value, (list, tuple)):
+            if value and all(is_number(item) for item in value):
+                return self.array(value)
+            if value and all(isinstance(item, dict) for item in value) and same_keys(value):
+                return {'$t': {'n': len(value), 'c': self.columns(value)}}
+            return [self.encode(item) for item in value]
+        return value
+
+
+def same_keys(dicts):
+    keys = dicts[0].keys()
+    return all(item.keys() == keys for item in dicts)
+
+
+def encode_compact(response):
+    """Encodes a /metrics response in the compact format, without the derived display strings."""
+    encoder = Encoder()
+    tree = encoder.encode(strip_derived(response))
+    header = json.dumps({'schema': SCHEMA_VERSION, 'tree': tree}, separators=(',', ':')).encode('utf-8')
+    padding = -(PREFIX.size + len(header)) % 8
+    values = struct.pack(f'<{len(encoder.values)}d', *encoder.values)
+    return PREFIX.pack(MAGIC, len(header)) + header + b' ' * padding + values
+
+
+def decode_tree(node, values):
+    if is_number(node):
+        value = values[node]
+        return None if math.isnan(value) else value
+    if isinstance(node, list):
+        return [decode_tree(item, values) for item in node]
+    if isinstance(node, dict):
+        if '$a' in node:
+            offset, length = node['$a']
+            return [None if math.isnan(value) else value for value in values[offset:offset + length]]
+        if '$t' in node:
+            table = node['$t']
+            columns = {key: decode_tree(column, values) for key, column in table['c'].items()}
+            return [{key: column[row] for key, column in columns.items()} for row in range(table['n'])]
+        if '$m' in node:
+            table = node['$m']
+            columns = {key: decode_tree(column, values) for key, column in table['c'].items()}
+            return {name: {key: column[row] for key, column in columns.items()} for row, name in enumerate(table['k'])}
+        return {key: decode_tree(child, values) for key, child in node.items()}
+    return node
+
+
+def decode_compact(data):
+    """Decodes a compact payload and rebuilds the derived display strings, as the dashboard does."""
+    magic, header_length = PREFIX.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a compact ez_monitor payload")
+    header = json.loads(data[PREFIX.size:PREFIX.size + header_length])
+    start = PREFIX.size + header_length
+    start += -start % 8
+    values = struct.unpack_from(f'<{(len(data) - start) // 8}d', data, start)
+    response = decode_tree(header['tree'], values)
+    for path, fields in DERIVED_FIELDS:
+        for item in matches(response, path.split('.')):
+            for field, (format_name, *sources) in fields.items():
+                if field not in item and all(item.get(source) is not None for source in sources):
+                    item[field] = FORMATTERS[format_name](*(item[source] for source in sources))
+    return response
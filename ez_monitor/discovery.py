@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import time
+from threading import Thread, Lock
+
+logger = logging.getLogger(__name__)
+
+# Seconds each static lookup may take before startup goes on without it
+DISCOVERY_TIMEOUT = 2
+
+CACHE_FILE = 'static_info.json'
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ez_monitor')
+
+
+class StaticDiscovery:
+    """Resolves slow, rarely changing host information in the background.
+
+    Every name maps to a resolver function and a placeholder value. Values from the
+    previous run are loaded from the cache file, so collectors start with them right
+    away, then each resolver runs on its own daemon thread and on_update is called
+    with the fresh value. A resolver that hangs past the timeout is left behind and
+    its value is applied whenever it completes.
+    """
+
+    def __init__(self, resolvers, placeholders, cache_dir=None, timeout=DISCOVERY_TIMEOUT, on_update=None):
+        self.resolvers = resolvers
+        self.timeout = timeout
+        self.on_update = on_update
+        self.cache_path = os.path.join(cache_dir, CACHE_FILE) if cache_dir else None
+        self.lock = Lock()
+        self.values = dict(placeholders)
+        self.resolved = set()
+        self.finished = False
+        self.values.update(self._load_cache())
+
+    def _load_cache(self):
+        if self.cache_path is None:
+            return {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring static info cache {self.cache_path}: {e}")
+            return {}
+        return {name: value for name, value in cached.get('values', {}).items() if name in self.resolvers}
+
+    def _save_cache(self):
+        if self.cache_path is None:
+            return
+        with self.lock:
+            data = {'timestamp': time.time(), 'values': dict(self.values)}
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            # Write then rename, so a crash never leaves a truncated cache behind
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write static info cache {self.cache_path}: {e}")
+
+    def _resolve(self, name):
+        start_time = time.perf_counter()
+        try:
+            value = self.resolvers[name]()
+        except Exception as e:
+            logger.error(f"Error resolving static {name} info: {e}")
+            return
+        with self.lock:
+            self.values[name] = value
+            self.resolved.add(name)
+        logger.debug(f"Resolved static {name} info in {time.perf_counter() - start_time:.3f}s")
+        if self.on_update is not None:
+            self.on_update(name, value)
+        if self.finished:
+            # A late result after the timeout still belongs in the cache
+            self._save_cache()
+
+    def get(self, name):
+        with self.lock:
+            return self.values[name]
+
+    def start(self):
+        Thread(target=self.run, daemon=True, name='static-discovery').start()
+
+    def run(self):
+        # Cached or placeholder values go out first, before any resolver can replace them
+        if self.on_update is not None:
+            for name in self.resolvers:
+                self.on_update(name, self.get(name))
+        threads = [Thread(target=self._resolve, args=(name,), daemon=True, name=f"discover-{name}")
+                   for name in self.resolvers]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + self.timeout
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        with self.lock:
+            pending = [name for name in self.resolvers if name not in self.resolved]
+        if pending:
+            logger.warning(f"Static discovery timed out after {self.timeout}s for: {', '.join(pending)}")
+        self.finished = True
+        self._save_cache()
@@ -0,0 +1,175 @@
+import logging
+import time
+from threading import Thread, Lock
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before trying to reconnect to an unreachable Docker daemon
+RECONNECT_DELAY = 30
+
+
+def get_container_health(status_text):
+    # Sparse container listings report health inside the status text, e.g. "Up 5 minutes (healthy)"
+    if '(healthy)' in status_text:
+        return 'healthy'
+    if '(unhealthy)' in status_text:
+        return 'unhealthy'
+    if '(health: starting)' in status_text:
+        return 'starting'
+    return None
+
+
+def format_container_stats(stats):
+    # CPU usage calculation with fallback for Windows
+    cpu_percent = 0
+    try:
+        cpu_stats = stats['cpu_stats']
+        precpu_stats = stats['precpu_stats']
+        cpu_delta = cpu_stats['cpu_usage']['total_usage'] - precpu_stats['cpu_usage']['total_usage']
+        system_delta = cpu_stats.get('system_cpu_usage', 0) - precpu_stats.get('system_cpu_usage', 0)
+        online_cpus = cpu_stats.get('online_cpus') or len(cpu_stats['cpu_usage'].get('percpu_usage') or []) or 1
+        if system_delta > 0:
+            cpu_percent = (cpu_delta / system_delta) * online_cpus * 100
+    except KeyError:
+        # Fallback for Windows or if keys are missing
+        cpu_percent = stats.get('cpu_stats', {}).get('cpu_usage', {}).get('total_usage', 0) / 10000000  # Rough estimate
+
+    # Memory usage calculation
+    mem_usage = stats.get('memory_stats', {}).get('usage', 0)
+    mem_limit = stats.get('memory_stats', {}).get('limit', 1)
+    mem_percent = (mem_usage / mem_limit) * 100 if mem_limit > 0 else 0
+
+    # Network I/O calculation, summed over every network the container is attached to
+    networks = (stats.get('networks') or {}).values()
+    net_io = {
+        'rx_bytes': sum(network.get('rx_bytes', 0) for network in networks),
+        'tx_bytes': sum(network.get('tx_bytes', 0) for network in networks),
+    }
+
+    # Block I/O calculation
+    blk_io = stats.get('blkio_stats', {}).get('io_service_bytes_recursive', [])
+    if blk_io is not None:
+        blk_read = sum(item['value'] for item in blk_io if item.get('op') in ('Read', 'read'))
+        blk_write = sum(item['value'] for item in blk_io if item.get('op') in ('Write', 'write'))
+    else:
+        blk_read = blk_write = 0
+
+    return {
+        'cpu_percent': round(cpu_percent, 2),
+        'mem_percent': round(mem_percent, 2),
+        'mem_usage': f"{mem_usage / (1024 * 1024):.2f}MB",
+        'mem_limit': f"{mem_limit / (1024 * 1024):.2f}MB",
+        'net_io': f"{net_io['rx_bytes'] / (1024 * 1024):.2f}MB / {net_io['tx_bytes'] / (1024 * 1024):.2f}MB",
+        'block_io': f"{blk_read / (1024 * 1024):.2f}MB / {blk_write / (1024 * 1024):.2f}MB",
+        'mem_usage_bytes': mem_usage,
+        'mem_limit_bytes': mem_limit,
+        'net_rx_bytes': net_io['rx_bytes'],
+        'net_tx_bytes': net_io['tx_bytes'],
+        'block_read_bytes': blk_read,
+        'block_write_bytes': blk_write,
+    }
+
+
+class DockerStatsCollector:
+    """Keeps one Docker client and a streaming stats reader per running container.
+
+    Readers run concurrently in a bounded pool of daemon threads and only store the
+    latest stats sample, so collect() never blocks on the Docker API stats calls.
+    """
+
+    def __init__(self, limit=10, base_url=None):
+        self.limit = limit
+        self.base_url = base_url
+        self.client = None
+        self.retry_at = 0
+        self.readers = {}
+        self.stats = {}
+        self.details = {}
+        self.lock = Lock()
+
+    def _get_client(self):
+        if self.client is None and time.time() >= self.retry_at:
+            try:
+                # Imported on first use, the Docker SDK is slow to import
+                import docker
+                if self.base_url:
+                    client = docker.DockerClient(base_url=self.base_url)
+                else:
+                    client = docker.from_env()
+                client.ping()
+                self.client = client
+            except Exception as e:
+                logger.info(f"Docker is not available: {e}")
+                self.retry_at = time.time() + RECONNECT_DELAY
+        return self.client
+
+    def _read_stats(self, container_id, token):
+        try:
+            container = self.client.containers.get(container_id)
+            with self.lock:
+                self.details[container_id] = {'pid': container.attrs.get('State', {}).get('Pid', 'N/A')}
+            for stats in container.stats(stream=True, decode=True):
+                with self.lock:
+                    if self.readers.get(container_id) is not token:
+                        break
+                    self.stats[container_id] = stats
+        except Exception as e:
+            logger.debug(f"Stats stream for container {container_id} ended: {e}")
+        finally:
+            with self.lock:
+                if self.readers.get(container_id) is token:
+                    # The stream ends when the container stops, its last sample is no longer current
+                    del self.readers[container_id]
+                    self.stats.pop(container_id, None)
+                    self.details.pop(container_id, None)
+
+    def _start_reader(self, container_id):
+        token = object()
+        self.readers[container_id] = token
+        Thread(target=self._read_stats, args=(container_id, token), daemon=True,
+               name=f"docker-stats-{container_id[:12]}").start()
+
+    def collect(self):
+        if self._get_client() is None:
+            return None
+
+        try:
+            containers = self.client.containers.list(all=True, sparse=True)[:self.limit]
+        except Exception as e:
+            logger.warning(f"Docker is not available: {e}")
+            self.client = None
+            return []
+
+        running = {container.attrs['Id'] for container in containers if container.status == 'running'}
+        with self.lock:
+            # Stop readers of containers that stopped, were removed or fell outside the limit
+            for container_id in [cid for cid in self.readers if cid not in running]:
+                del self.readers[container_id]
+            for container_id in [cid for cid in self.stats.keys() | self.details.keys() if cid not in running]:
+                self.stats.pop(container_id, None)
+                self.details.pop(container_id, None)
+            for container_id in running:
+                if container_id not in self.readers:
+                    self._start_reader(container_id)
+            stats = dict(self.stats)
+            details = dict(self.details)
+
+        container_info = []
+        for container in containers:
+            attrs = container.attrs
+            container_id = attrs['Id']
+            status = container.status
+            if status == 'running':
+                status = get_container_health(attrs.get('Status', '')) or status
+            names = attrs.get('Names') or [container_id[:12]]
+            info = {
+                'id': container_id,  # Full container ID
+                'short_id': container_id[:12],
+                'name': names[0].lstrip('/'),
+                'status': status,
+                'image': attrs.get('Image') or 'N/A',
+                'pid': details.get(container_id, {}).get('pid', 'N/A'),
+            }
+            info.update(format_container_stats(stats.get(container_id, {})))
+            container_info.append(info)
+        return container_info
@@ -0,0 +1,166 @@
+import atexit
+import logging
+import shlex
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# The free-form name columns come last, so a ', ' inside a name does not shift the other fields
+GPU_FIELDS = ['index', 'uuid', 'driver_version', 'utilization.gpu', 'utilization.memory', 'memory.used',
+              'memory.total', 'temperature.gpu', 'power.draw', 'power.limit', 'name']
+PROCESS_FIELDS = ['gpu_uuid', 'pid', 'used_memory', 'process_name']
+
+# Seconds the first collection waits for the first rows of a new nvidia-smi process
+STARTUP_TIMEOUT = 3
+
+
+def parse_number(value):
+    # Unsupported fields read "[N/A]" or "[Not Supported]"
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_row(line, fields):
+    values = line.rstrip('\n').split(', ', len(fields) - 1)
+    if len(values) != len(fields) or values[0] == fields[0]:
+        # Header, blank or diagnostic line such as "No devices were found"
+        return None
+    return dict(zip(fields, values))
+
+
+class QueryStream:
+    """One long-running `nvidia-smi --query-* --format=csv --loop-ms=N` process read on a thread.
+
+    nvidia-smi keeps its NVML handle open and prints a block of rows every interval,
+    so each row is parsed as it arrives instead of spawning a process per sample.
+    """
+
+    def __init__(self, command, query, fields, interval, on_row):
+        self.args = command + [f"--{query}={','.join(fields)}", '--format=csv,noheader,nounits',
+                               f"--loop-ms={int(interval * 1000)}"]
+        self.fields = fields
+        self.on_row = on_row
+        self.process = None
+        self.first_row = threading.Event()
+
+    def start(self):
+        self.first_row.clear()
+        self.process = subprocess.Popen(self.args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        stdin=subprocess.DEVNULL, text=True, bufsize=1)
+        threading.Thread(target=self._read, args=(self.process,), daemon=True, name='nvidia-smi-reader').start()
+
+    def _read(self, process):
+        for line in process.stdout:
+            row = parse_row(line, self.fields)
+            if row is not None:
+                self.on_row(row)
+                self.first_row.set()
+        # Exited, e.g. no NVIDIA driver, so nobody waits for rows that never come
+        self.first_row.set()
+        process.stdout.close()
+        process.wait()
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.alive():
+            self.process.terminate()
+
+
+class NvidiaSmiCollector:
+    """Every GPU's utilization, memory, temperature and power, plus per-process GPU memory.
+
+    Two nvidia-smi processes stream GPU and compute process rows. The latest row of
+    each GPU and process is kept, and rows that have not been repeated for a few
+    intervals are dropped, which is how exited processes and a dead stream age out.
+    A stream that exits is restarted at most every `restart_delay` seconds.
+    """
+
+    def __init__(self, command='nvidia-smi', interval=5, restart_delay=60):
+        command = shlex.split(command) if isinstance(command, str) else list(command)
+        self.interval = interval
+        self.restart_delay = restart_delay
+        self.gpus = {}
+        self.processes = {}
+        self.lock = threading.Lock()
+        self.streams = [
+            QueryStream(command, 'query-gpu', GPU_FIELDS, interval, self._on_gpu),
+            QueryStream(command, 'query-compute-apps', PROCESS_FIELDS, interval, self._on_process),
+        ]
+        self.last_start = None
+        atexit.register(self.stop)
+
+    def _on_gpu(self, row):
+        with self.lock:
+            self.gpus[row['uuid']] = (time.monotonic(), row)
+
+    def _on_process(self, row):
+        with self.lock:
+            self.processes[(row['gpu_uuid'], row['pid'])] = (time.monotonic(), row)
+
+    def _ensure_running(self):
+        now = time.monotonic()
+        if all(stream.alive() for stream in self.streams):
+            return
+        if self.last_start is not None and now - self.last_start < self.restart_delay:
+            return
+        first_start = self.last_start is None
+        self.last_start = now
+        for stream in self.streams:
+            if not stream.alive():
+                try:
+                    stream.start()
+                except OSError as e:
+                    logger.debug(f"Could not start {stream.args[0]}: {e}")
+                    return
+        if first_start:
+            self.streams[0].first_row.wait(STARTUP_TIMEOUT)
+
+    def collect(self):
+        self._ensure_running()
+        expiry = time.monotonic() - self.interval * 3 - 1
+        with self.lock:
+            for rows in (self.gpus, self.processes):
+                for key in [key for key, (seen, _) in rows.items() if seen < expiry]:
+                    del rows[key]
+            gpu_rows = [row for _, row in self.gpus.values()]
+            process_rows = [row for _, row in self.processes.values()]
+
+        processes = {}
+        for row in process_rows:
+            memory = parse_number(row['used_memory'])
+            processes.setdefault(row['gpu_uuid'], []).append({
+                'pid': int(row['pid']),
+                'name': row['process_name'],
+                'memory_bytes': memory * 1024 * 1024 if memory is not None else None,
+            })
+        gpus = []
+        for row in sorted(gpu_rows, key=lambda row: int(row['index'])):
+            memory_used = parse_number(row['memory.used']) or 0
+            memory_total = parse_number(row['memory.total']) or 0
+            gpus.append({
+                'index': int(row['index']),
+                'uuid': row['uuid'],
+                'name': row['name'],
+                'driver': row['driver_version'],
+                'percent': parse_number(row['utilization.gpu']) or 0,
+                'memory_percent': parse_number(row['utilization.memory']),
+                'memory_used': f"{memory_used:.0f} MB",
+                'memory_total': f"{memory_total:.0f} MB",
+                'memory_used_bytes': memory_used * 1024 * 1024,
+                'memory_total_bytes': memory_total * 1024 * 1024,
+                'temperature': parse_number(row['temperature.gpu']),
+                'power_draw': parse_number(row['power.draw']),
+                'power_limit': parse_number(row['power.limit']),
+                'processes': sorted(processes.get(row['uuid'], []), key=lambda p: p['memory_bytes'] or 0, reverse=True),
+            })
+        return gpus
+
+    def stop(self):
+        for stream in self.streams:
+            stream.stop()
@@ -0,0 +1,112 @@
+from array import array
+from threading import Lock
+import math
+
+# Numeric series kept on the server, mapped to their location in the metrics dict
+HISTORY_SERIES = {
+    'cpu.usage': ('cpu', 'usage'),
+    'cpu.user': ('cpu', 'user'),
+    'cpu.system': ('cpu', 'system'),
+    'cpu.idle': ('cpu', 'idle'),
+    'memory.percent': ('memory', 'percent'),
+    'memory.used': ('memory', 'used'),
+    'disk_io.read_speed': ('disk_io', 'read_speed'),
+    'disk_io.write_speed': ('disk_io', 'write_speed'),
+    'network.upload_speed': ('network', 'upload_speed'),
+    'network.download_speed': ('network', 'download_speed'),
+    'gpu.percent': ('gpu', 'percent'),
+}
+
+
+def extract_samples(new_metrics, series=HISTORY_SERIES):
+    # Returns (series name, float value) pairs for the series present in new_metrics
+    samples = []
+    for name, (metric, field) in series.items():
+        value = new_metrics.get(metric)
+        if not isinstance(value, dict) or 'error' in value:
+            continue
+        value = value.get(field)
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if not math.isnan(value):
+            samples.append((name, value))
+    return samples
+
+
+class RingBuffer:
+    """Fixed-size buffer of (timestamp, value) samples backed by preallocated arrays."""
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.timestamps = array('d', [0.0]) * self.capacity
+        self.values = array('d', [0.0]) * self.capacity
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _index(self, position):
+        return (self.start + position) % self.capacity
+
+    def append(self, timestamp, value):
+        if self.count < self.capacity:
+            index = self._index(self.count)
+            self.count += 1
+        else:
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.timestamps[index] = timestamp
+        self.values[index] = value
+
+    def _first_after(self, since):
+        # Samples are appended in time order, so a binary search over the logical order works
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamps[self._index(middle)] <= since:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def since(self, since=None):
+        first = 0 if since is None else self._first_after(since)
+        timestamps = []
+        values = []
+        for position in range(first, self.count):
+            index = self._index(position)
+            timestamps.append(self.timestamps[index])
+            values.append(self.values[index])
+        return timestamps, values
+
+
+class HistoryStore:
+    """Thread-safe collection of ring buffers, one per numeric series."""
+
+    def __init__(self, capacity, series=HISTORY_SERIES):
+        self.capacity = capacity
+        self.series = dict(series)
+        self.buffers = {name: RingBuffer(capacity) for name in self.series}
+        self.lock = Lock()
+
+    def record(self, timestamp, new_metrics):
+        samples = extract_samples(new_metrics, self.series)
+        with self.lock:
+            for name, value in samples:
+                self.buffers[name].append(timestamp, value)
+
+    def query(self, names=None, since=None):
+        names = list(self.buffers) if not names else names
+        unknown = [name for name in names if name not in self.buffers]
+        if unknown:
+            raise KeyError(', '.join(unknown))
+
+        result = {}
+        with self.lock:
+            for name in names:
+                timestamps, values = self.buffers[name].since(since)
+                result[name] = {'timestamps': timestamps, 'values': values}
+        return result
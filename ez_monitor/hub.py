@@ -0,0 +1,253 @@
+import heapq
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+
+import requests
+from flask import Flask, render_template, jsonify, request, Response, abort
+from requests.adapters import HTTPAdapter
+
+from . import compact
+
+logger = logging.getLogger(__name__)
+
+# Longest delay between polls of an agent that keeps failing
+MAX_BACKOFF = 60
+# Seconds a proxied /stream may stay silent, agents send a keep-alive every 15 seconds
+STREAM_READ_TIMEOUT = 60
+
+
+def read_agents(path):
+    # One agent per line, as host:port or a full URL, '#' starts a comment
+    agents = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            if not line.startswith(('http://', 'https://')):
+                line = f"http://{line}"
+            agents.append(line.rstrip('/'))
+    return agents
+
+
+def summarize(data):
+    # Compact per-host view used by the fleet overview
+    cpu = data.get('cpu') or {}
+    memory = data.get('memory') or {}
+    disk = data.get('disk') or {}
+    network = data.get('network') or {}
+    general = (network.get('static_info') or {}).get('general') or {}
+    containers = data.get('docker_containers')
+    return {
+        'hostname': general.get('hostname'),
+        'cpu': cpu.get('usage'),
+        'memory': memory.get('percent'),
+        'disk': disk.get('percent'),
+        'upload_speed': network.get('upload_speed'),
+        'download_speed': network.get('download_speed'),
+        'containers': len(containers) if containers is not None else None,
+        'last_update': data.get('last_update'),
+    }
+
+
+class Agent:
+    __slots__ = ('index', 'url', 'summary', 'body', 'etag', 'last_seen', 'latency', 'error', 'failures', 'next_poll')
+
+    def __init__(self, index, url):
+        self.index = index
+        self.url = url
+        self.summary = None
+        self.body = None
+        self.etag = None
+        self.last_seen = None
+        self.latency = None
+        self.error = None
+        self.failures = 0
+        self.next_poll = 0
+
+    def to_dict(self, refresh_rate):
+        if self.last_seen is None:
+            status = 'down' if self.failures else 'pending'
+        elif time.time() - self.last_seen > refresh_rate * 3:
+            status = 'stale'
+        else:
+            status = 'up'
+        return {
+            'index': self.index,
+            'url': self.url,
+            'status': status,
+            'latency': self.latency,
+            'failures': self.failures,
+            'error': self.error,
+            'last_seen': self.last_seen,
+            'summary': self.summary,
+        }
+
+
+class Hub:
+    """Polls the /metrics endpoint of many agents concurrently over pooled keep-alive connections."""
+
+    def __init__(self, urls, refresh_rate=2, timeout=1.5, workers=32):
+        self.agents = [Agent(index, url) for index, url in enumerate(urls)]
+        self.refresh_rate = refresh_rate
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(1, len(urls)), pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hub-poll')
+        self.lock = Lock()
+        self.in_flight = set()
+        self.stopped = Event()
+
+    def poll(self, agent):
+        headers = {'If-None-Match': agent.etag} if agent.etag else {}
+        start_time = time.perf_counter()
+        try:
+            response = self.session.get(f"{agent.url}/metrics", headers=headers, timeout=self.timeout)
+            if response.status_code == 200:
+                summary = summarize(response.json())
+                with self.lock:
+                    agent.body = response.content
+                    agent.etag = response.headers.get('ETag')
+                    agent.summary = summary
+            elif response.status_code != 304:
+                raise requests.HTTPError(f"HTTP {response.status_code}")
+            with self.lock:
+                agent.latency = time.perf_counter() - start_time
+                agent.last_seen = time.time()
+                agent.error = None
+                agent.failures = 0
+        except Exception as e:
+            with self.lock:
+                agent.error = str(e)
+                agent.failures += 1
+                # Exponential backoff for agents that keep failing
+                agent.next_poll = time.monotonic() + min(self.refresh_rate * 2 ** agent.failures, MAX_BACKOFF)
+        finally:
+            with self.lock:
+                self.in_flight.discard(agent.index)
+
+    def run(self):
+        queue = [(0, agent.index) for agent in self.agents]
+        heapq.heapify(queue)
+        while not self.stopped.is_set():
+            now = time.monotonic()
+            while queue and queue[0][0] <= now:
+                due, index = heapq.heappop(queue)
+                agent = self.agents[index]
+                with self.lock:
+                    if agent.next_poll > due and agent.next_poll > now:
+                        # The last poll moved the deadline, e.g. backoff after a failure
+                        heapq.heappush(queue, (agent.next_poll, index))
+                        continue
+                    if index in self.in_flight:
+                        # Still waiting on the previous poll, check again shortly
+                        heapq.heappush(queue, (now + self.refresh_rate / 4, index))
+                        continue
+                    self.in_flight.add(index)
+                    agent.next_poll = now + self.refresh_rate
+                self.executor.submit(self.poll, agent)
+                heapq.heappush(queue, (agent.next_poll, index))
+            delay = queue[0][0] - time.monotonic() if queue else self.refresh_rate
+            # Waking at most every 10 ms lets polls that are due together go out as a batch
+            self.stopped.wait(min(max(delay, 0.01), self.refresh_rate))
+
+    def stop(self):
+        self.stopped.set()
+        self.executor.shutdown(wait=False)
+
+    def overview(self):
+        with self.lock:
+            return [agent.to_dict(self.refresh_rate) for agent in self.agents]
+
+    def get_agent(self, index):
+        if not 0 <= index < len(self.agents):
+            abort(404)
+        return self.agents[index]
+
+    def get_disks(self, agent):
+        try:
+            response = self.session.get(f"{agent.url}/disks", timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.info(f"Could not read the disks of {agent.url}: {e}")
+            return ['/']
+
+    def proxy(self, agent, path):
+        # Accept selects the compact encoding of /metrics
+        headers = {'Accept': request.headers['Accept']} if 'Accept' in request.headers else {}
+        try:
+            response = self.session.get(f"{agent.url}{path}", params=request.args.to_dict(flat=False), headers=headers,
+                                        timeout=self.timeout)
+        except requests.RequestException as e:
+            return jsonify({'error': str(e)}), 502
+        return Response(response.content, status=response.status_code,
+                        content_type=response.headers.get('Content-Type', 'application/json'))
+
+    def proxy_stream(self, agent):
+        headers = {'Last-Event-ID': request.headers['Last-Event-ID']} if 'Last-Event-ID' in request.headers else {}
+        try:
+            response = self.session.get(f"{agent.url}/stream", headers=headers, stream=True,
+                                        timeout=(self.timeout, STREAM_READ_TIMEOUT))
+        except requests.RequestException as e:
+            return jsonify({'error': str(e)}), 502
+        if response.status_code != 200:
+            response.close()
+            return jsonify({'error': f"HTTP {response.status_code}"}), 502
+
+        def relay():
+            try:
+                yield from response.iter_content(chunk_size=None)
+            except requests.RequestException as e:
+                # The browser reconnects with the last event it saw
+                logger.debug(f"Stream from {agent.url} ended: {e}")
+            finally:
+                response.close()
+
+        return Response(relay(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def create_hub_app(hub, max_data_points):
+    app = Flask(__name__)
+
+    @app.route('/')
+    def fleet():
+        return render_template('hub.html', agents=hub.overview(), refresh_rate=hub.refresh_rate)
+
+    @app.route('/hosts')
+    def hosts():
+        return jsonify(hub.overview())
+
+    @app.route('/hosts/<int:index>/')
+    def host_dashboard(index):
+        agent = hub.get_agent(index)
+        name = (agent.summary or {}).get('hostname') or agent.url
+        return render_template('index.html', disks=hub.get_disks(agent), hostname=name, ip_address=agent.url,
+                               max_data_points=max_data_points, api_base=f"/hosts/{index}")
+
+    @app.route('/hosts/<int:index>/metrics')
+    def host_metrics(index):
+        agent = hub.get_agent(index)
+        # The cached body is the JSON for the default disk, other disks and encodings are fetched from the agent
+        use_compact = request.args.get('format') == 'compact' or compact.CONTENT_TYPE in request.headers.get('Accept', '')
+        if request.args.get('disk', '/') == '/' and not use_compact and agent.body is not None:
+            return Response(agent.body, content_type='application/json')
+        return hub.proxy(agent, '/metrics')
+
+    @app.route('/hosts/<int:index>/metrics/schema')
+    def host_metrics_schema(index):
+        return hub.proxy(hub.get_agent(index), '/metrics/schema')
+
+    @app.route('/hosts/<int:index>/stream')
+    def host_stream(index):
+        return hub.proxy_stream(hub.get_agent(index))
+
+    @app.route('/hosts/<int:index>/history')
+    def host_history(index):
+        return hub.proxy(hub.get_agent(index), '/history')
+
+    return app
@@ -0,0 +1,146 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import psutil
+
+# Bucket upper bounds from 10 µs to about 100 s, four buckets per doubling
+BUCKET_BOUNDS = [1e-5 * 2 ** (i / 4) for i in range(94)]
+
+QUANTILES = {'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+
+# Upper bound on /debug/profile durations
+MAX_PROFILE_SECONDS = 60
+
+
+class LatencyHistogram:
+    """Rolling latency histogram over the last `window` seconds.
+
+    The window is split into slots of bucket counts, and a running total of all slots
+    is kept, so recording is a bisect and an increment, and expiring a slot subtracts
+    its counts once. Percentiles are the upper bound of the bucket they fall in and
+    are cached until the next sample or slot change.
+    """
+
+    def __init__(self, window=300, slots=10):
+        self.slot_seconds = window / slots
+        self.slots = [[0] * (len(BUCKET_BOUNDS) + 1) for _ in range(slots)]
+        self.totals = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.slot_id = int(time.monotonic() // self.slot_seconds)
+        self.max_value = 0
+        self.cached = None
+        self.lock = threading.Lock()
+
+    def _rotate(self, now):
+        slot_id = int(now // self.slot_seconds)
+        expired = min(slot_id - self.slot_id, len(self.slots))
+        for i in range(1, expired + 1):
+            slot = self.slots[(self.slot_id + i) % len(self.slots)]
+            for bucket, count in enumerate(slot):
+                if count:
+                    self.totals[bucket] -= count
+                    self.count -= count
+                    slot[bucket] = 0
+        if expired > 0:
+            self.cached = None
+            if self.count == 0:
+                self.max_value = 0
+        self.slot_id = slot_id
+
+    def record(self, seconds):
+        bucket = bisect.bisect_left(BUCKET_BOUNDS, seconds)
+        with self.lock:
+            self._rotate(time.monotonic())
+            self.slots[self.slot_id % len(self.slots)][bucket] += 1
+            self.totals[bucket] += 1
+            self.count += 1
+            self.max_value = max(self.max_value, seconds)
+            self.cached = None
+
+    def percentiles(self):
+        with self.lock:
+            self._rotate(time.monotonic())
+            if self.cached is None:
+                result = {'count': self.count}
+                for name, quantile in QUANTILES.items():
+                    result[name] = self._quantile(quantile)
+                self.cached = result
+            return dict(self.cached)
+
+    def _quantile(self, quantile):
+        if self.count == 0:
+            return 0
+        target = quantile * self.count
+        seen = 0
+        for bucket, count in enumerate(self.totals):
+            seen += count
+            if count and seen >= target:
+                if bucket == len(BUCKET_BOUNDS):
+                    return self.max_value
+                # The bucket bound never overstates the slowest sample seen
+                return min(BUCKET_BOUNDS[bucket], self.max_value)
+        return self.max_value
+
+
+class ProcessUsage:
+    """CPU time, RSS and thread count of the monitor's own process."""
+
+    def __init__(self):
+        self.process = psutil.Process()
+        self.last_cpu_time = None
+        self.last_time = None
+
+    def collect(self):
+        with self.process.oneshot():
+            cpu_times = self.process.cpu_times()
+            rss = self.process.memory_info().rss
+            threads = self.process.num_threads()
+        now = time.monotonic()
+        cpu_time = cpu_times.user + cpu_times.system
+        cpu_percent = 0
+        if self.last_time is not None and now > self.last_time:
+            cpu_percent = (cpu_time - self.last_cpu_time) / (now - self.last_time) * 100
+        self.last_cpu_time, self.last_time = cpu_time, now
+        return {
+            'cpu_seconds': cpu_time,
+            'cpu_percent': cpu_percent,
+            'rss_bytes': rss,
+            'threads': threads,
+        }
+
+
+def format_frame(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds, interval=0.01, thread_prefix='collector-', include_idle=False):
+    """Samples the stacks of matching threads and returns them in folded stack format.
+
+    Each line is `thread;outer;...;inner count`, which flamegraph.pl, speedscope and
+    similar tools read directly. Threads parked inside threading waits are idle and are
+    left out unless include_idle is set.
+    """
+    counts = Counter()
+    own = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            name = names.get(ident, str(ident))
+            if ident == own or not name.startswith(thread_prefix):
+                continue
+            if not include_idle and frame.f_code.co_filename == threading.__file__:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(format_frame(frame))
+                frame = frame.f_back
+            stack.append(name)
+            counts[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
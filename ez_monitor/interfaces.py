@@ -0,0 +1,255 @@
+import errno
+import logging
+import os
+import socket
+import struct
+import time
+from threading import Thread, Lock
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+SYS_CLASS_NET = '/sys/class/net'
+
+# rtnetlink multicast groups and message types, from linux/rtnetlink.h
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+IFLA_IFNAME = 3
+
+NLMSG_HEADER = struct.Struct('<IHHII')
+# Family, device type, index, flags and change mask of a link message
+IFINFOMSG = struct.Struct('<BxHiII')
+# Family, prefix length, flags, scope and index of an address message
+IFADDRMSG = struct.Struct('<BBBBI')
+RTATTR = struct.Struct('<HH')
+
+IFF_UP = 0x1
+
+# Seconds change notifications are gathered before the table is updated, so bursts of
+# container starts are applied at once
+COALESCE_SECONDS = 0.2
+# Seconds between interface table reads where change notifications are unavailable
+POLL_INTERVAL = 30
+
+DUPLEX = {2: 'full', 1: 'half'}
+STATE_FIELDS = ('state', 'mtu', 'speed_mbps', 'duplex')
+
+
+def align(length):
+    return (length + 3) & ~3
+
+
+def parse_messages(data):
+    """Returns the names and indexes of the interfaces a batch of rtnetlink messages is about.
+
+    Link messages carry the interface name, address messages only its index.
+    """
+    names, indexes = set(), set()
+    offset = 0
+    while offset + NLMSG_HEADER.size <= len(data):
+        length, msg_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+        if length < NLMSG_HEADER.size or offset + length > len(data):
+            break
+        body = offset + NLMSG_HEADER.size
+        if msg_type in (RTM_NEWLINK, RTM_DELLINK) and length >= NLMSG_HEADER.size + IFINFOMSG.size:
+            indexes.add(IFINFOMSG.unpack_from(data, body)[2])
+            position = body + IFINFOMSG.size
+            while position + RTATTR.size <= offset + length:
+                attr_length, attr_type = RTATTR.unpack_from(data, position)
+                if attr_length < RTATTR.size:
+                    break
+                if attr_type == IFLA_IFNAME:
+                    value = data[position + RTATTR.size:position + attr_length]
+                    names.add(value.split(b'\0', 1)[0].decode('utf-8', 'replace'))
+                position += align(attr_length)
+        elif msg_type in (RTM_NEWADDR, RTM_DELADDR) and length >= NLMSG_HEADER.size + IFADDRMSG.size:
+            indexes.add(IFADDRMSG.unpack_from(data, body)[4])
+        offset += align(length)
+    return names, indexes
+
+
+def open_netlink():
+    # Listening to the link and address groups needs no privileges, None where there is no rtnetlink
+    if not hasattr(socket, 'AF_NETLINK'):
+        return None
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+        return sock
+    except OSError as e:
+        logger.warning(f"Interface change notifications are unavailable, polling every {POLL_INTERVAL}s: {e}")
+        return None
+
+
+def read_attribute(path, name, attribute):
+    try:
+        with open(os.path.join(path, name, attribute), 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        # speed and duplex cannot be read from links that are down or virtual
+        return None
+
+
+def read_link_stats(path, name):
+    # State, MTU, speed and duplex of one interface from sysfs, None when it is gone
+    operstate = read_attribute(path, name, 'operstate')
+    if operstate is None:
+        return None
+    flags = read_attribute(path, name, 'flags')
+    mtu = read_attribute(path, name, 'mtu')
+    speed = read_attribute(path, name, 'speed')
+    duplex = read_attribute(path, name, 'duplex')
+    # Loopback and tunnel devices report an unknown operational state while they work
+    is_up = bool(flags and int(flags, 16) & IFF_UP) and operstate in ('up', 'unknown')
+    return {
+        'state': 'up' if is_up else 'down',
+        'mtu': int(mtu) if mtu else None,
+        'speed_mbps': int(speed) if speed and int(speed) > 0 else None,
+        'duplex': duplex if duplex in ('full', 'half') else None,
+    }
+
+
+def format_stats(stats):
+    if stats is None:
+        return {'state': 'down', 'mtu': None, 'speed_mbps': None, 'duplex': None}
+    return {
+        'state': 'up' if stats.isup else 'down',
+        'mtu': stats.mtu or None,
+        'speed_mbps': stats.speed or None,
+        'duplex': DUPLEX.get(int(stats.duplex)),
+    }
+
+
+def format_interface(addrs, stats):
+    addresses = [{'family': 'ipv4' if addr.family == socket.AF_INET else 'ipv6', 'address': addr.address,
+                  'netmask': addr.netmask}
+                 for addr in addrs if addr.family in (socket.AF_INET, socket.AF_INET6)]
+    return {
+        'mac': next((addr.address for addr in addrs if addr.family == psutil.AF_LINK), 'Unknown'),
+        'ipv4': next((addr['address'] for addr in addresses if addr['family'] == 'ipv4'), 'Unknown'),
+        'ipv6': next((addr['address'] for addr in addresses if addr['family'] == 'ipv6'), 'Unknown'),
+        'addresses': addresses,
+        **stats,
+    }
+
+
+class InterfaceTable:
+    """Network interfaces with their state, MTU, speed and addresses, updated as they change.
+
+    On Linux a watcher thread listens to rtnetlink link and address notifications, and
+    the table is only updated when they arrive. Addresses come from one getifaddrs()
+    call, but the state is read from sysfs for the interfaces the notifications name
+    and new ones only, so hosts creating and removing hundreds of veth devices do not
+    re-read every interface. Elsewhere the whole table is read every POLL_INTERVAL seconds.
+    on_change is called with the new table whenever it differs from the previous one.
+    """
+
+    def __init__(self, on_change=None, netlink=True, sys_class_net=SYS_CLASS_NET):
+        self.on_change = on_change
+        self.netlink = netlink
+        # None reads the psutil interface stats even where sysfs exists
+        self.sys_class_net = sys_class_net if sys_class_net and os.path.isdir(sys_class_net) else None
+        self.interfaces = None
+        self.lock = Lock()
+        self.start_lock = Lock()
+
+    def _stats(self, names):
+        if self.sys_class_net is not None:
+            return {name: read_link_stats(self.sys_class_net, name) for name in names}
+        stats = psutil.net_if_stats()
+        return {name: format_stats(stats.get(name)) for name in names}
+
+    def _read(self, names=None):
+        # Addresses come from one listing of every interface, the state is only read again for
+        # the named interfaces and those not seen before, or for all of them when names is None
+        addrs = psutil.net_if_addrs()
+        previous = self.interfaces if names is not None else {}
+        refresh = [name for name in addrs if name not in previous or name in names]
+        stats = self._stats(refresh)
+        table = {}
+        for name, interface_addrs in addrs.items():
+            state = stats[name] if name in stats else {key: previous[name][key] for key in STATE_FIELDS}
+            # Interfaces removed between the two reads are left out
+            if state is not None:
+                table[name] = format_interface(interface_addrs, state)
+        return table
+
+    def _update(self, table):
+        with self.lock:
+            previous, self.interfaces = self.interfaces, table
+            changed = previous is not None and table != previous
+        if changed:
+            added, removed = table.keys() - previous.keys(), previous.keys() - table.keys()
+            if added or removed:
+                logger.info(f"Interfaces changed, added: {', '.join(sorted(added)) or '-'}, removed: {', '.join(sorted(removed)) or '-'}")
+            if self.on_change is not None:
+                self.on_change(table)
+
+    def start(self):
+        sock = open_netlink() if self.netlink else None
+        # Subscribed before the first read, so no change falls in between
+        self._update(self._read())
+        if sock is not None:
+            Thread(target=self._watch, args=(sock,), daemon=True, name='interface-watcher').start()
+        else:
+            Thread(target=self._poll, daemon=True, name='interface-watcher').start()
+
+    def _receive(self, sock, names, indexes):
+        # Returns False when notifications were lost and the whole table must be read again
+        try:
+            batch_names, batch_indexes = parse_messages(sock.recv(65536))
+        except OSError as e:
+            if e.errno == errno.ENOBUFS:
+                logger.warning("Interface change notifications overflowed, reading all interfaces")
+                return False
+            raise
+        names |= batch_names
+        indexes |= batch_indexes
+        return True
+
+    def _watch(self, sock):
+        while True:
+            names, indexes = set(), set()
+            try:
+                sock.settimeout(None)
+                complete = self._receive(sock, names, indexes)
+                deadline = time.monotonic() + COALESCE_SECONDS
+                while complete and time.monotonic() < deadline:
+                    sock.settimeout(max(0.001, deadline - time.monotonic()))
+                    try:
+                        complete = self._receive(sock, names, indexes)
+                    except socket.timeout:
+                        break
+                if complete:
+                    # Address messages only carry the index, removed interfaces drop out of the listing anyway
+                    for index in indexes:
+                        try:
+                            names.add(socket.if_indextoname(index))
+                        except OSError:
+                            pass
+                self._update(self._read(names if complete else None))
+            except Exception as e:
+                logger.error(f"Error updating network interfaces: {e}")
+                time.sleep(POLL_INTERVAL)
+
+    def _poll(self):
+        while True:
+            time.sleep(POLL_INTERVAL)
+            try:
+                self._update(self._read())
+            except Exception as e:
+                logger.error(f"Error reading network interfaces: {e}")
+
+    def get(self):
+        if self.interfaces is None:
+            with self.start_lock:
+                if self.interfaces is None:
+                    self.start()
+        with self.lock:
+            return self.interfaces
@@ -0,0 +1,279 @@
+import logging
+import os
+import re
+import select
+import shutil
+import time
+from threading import Thread, Event, Lock
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+MOUNTINFO = '/proc/self/mountinfo'
+FILESYSTEMS = '/proc/filesystems'
+
+# Filesystems served over the network, whose statfs can hang as long as the server does
+REMOTE_FSTYPES = {
+    'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ceph', 'glusterfs', 'fuse.glusterfs', 'fuse.sshfs',
+    'fuse.s3fs', 'fuse.rclone', '9p', 'afs', 'lustre', 'gpfs', 'beegfs',
+}
+
+# Disk filesystems listed as nodev because their pools, not the mounts, own the devices
+POOLED_FSTYPES = {'zfs'}
+
+# Loop devices are mostly snap and image mounts that are always 100% full
+DEFAULT_EXCLUDE_DEVICES = r'^/dev/loop\d+$'
+
+# Seconds every statfs call of a collection may take, the calls run in parallel
+STATFS_TIMEOUT = 2
+# Consecutive failures or timeouts after which a mount is no longer queried
+FAILURE_THRESHOLD = 3
+# Seconds before an open breaker lets one probe through, doubled after every failed probe
+BREAKER_COOLDOWN = 30
+MAX_BREAKER_COOLDOWN = 600
+
+# Minimum seconds between mount table reloads, so mount storms are read once
+RELOAD_INTERVAL = 1
+# Seconds between mount table reads where mountinfo cannot be polled
+PARTITIONS_REFRESH = 30
+
+
+def unescape(field):
+    # mountinfo escapes space, tab, newline and backslash as octal, e.g. \040
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), field)
+
+
+def parse_mountinfo(text):
+    # 36 35 98:0 /mnt1 /mnt/parent rw,noatime master:1 - ext3 /dev/root rw,errors=continue
+    mounts = []
+    for line in text.splitlines():
+        fields = line.split(' ')
+        try:
+            separator = fields.index('-', 6)
+        except ValueError:
+            continue
+        if len(fields) < separator + 3:
+            continue
+        options = fields[5].split(',')
+        options += [option for option in fields[separator + 3].split(',') if option not in options]
+        mounts.append({
+            'device': unescape(fields[separator + 2]),
+            'mountpoint': unescape(fields[4]),
+            'fstype': fields[separator + 1],
+            'opts': ','.join(options),
+        })
+    return mounts
+
+
+def nodev_filesystems(path=FILESYSTEMS):
+    # Filesystems without a backing device, e.g. proc, sysfs, tmpfs and cgroup2
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return {line.split()[1] for line in f if line.startswith('nodev')}
+    except OSError:
+        return set()
+
+
+def is_remote(fstype, opts):
+    # psutil reports 'remote' in the options on macOS and BSD
+    return fstype in REMOTE_FSTYPES or 'remote' in opts.split(',')
+
+
+class MountFilter:
+    """Which mounts the disk collector reports.
+
+    exclude_fstypes defaults to the pseudo filesystems, the nodev entries of
+    /proc/filesystems other than network and pooled filesystems such as zfs,
+    which psutil also keeps, and exclude_devices is a
+    regular expression matched against the device. '/' is always reported.
+    """
+
+    def __init__(self, exclude_fstypes=None, exclude_devices=DEFAULT_EXCLUDE_DEVICES, include_remote=True):
+        if exclude_fstypes is None:
+            exclude_fstypes = nodev_filesystems() - REMOTE_FSTYPES - POOLED_FSTYPES
+        self.exclude_fstypes = set(exclude_fstypes)
+        self.exclude_devices = re.compile(exclude_devices) if exclude_devices else None
+        self.include_remote = include_remote
+
+    def accepts(self, mount):
+        if mount['mountpoint'] == '/':
+            return True
+        if mount['fstype'] in self.exclude_fstypes:
+            return False
+        if self.exclude_devices is not None and self.exclude_devices.search(mount['device']):
+            return False
+        return self.include_remote or not mount['remote']
+
+
+class MountTable:
+    """Current mounts, reloaded whenever the kernel reports a change.
+
+    On Linux a watcher thread polls /proc/self/mountinfo, which signals POLLPRI on
+    every mount and unmount, so get() never reads the mount table itself. Elsewhere
+    the psutil partitions are read again every PARTITIONS_REFRESH seconds.
+    """
+
+    def __init__(self, mount_filter=None, path=MOUNTINFO):
+        self.filter = mount_filter or MountFilter()
+        # None reads the psutil partitions even where mountinfo exists
+        self.path = path
+        self.mounts = None
+        self.loaded = 0
+        self.watching = False
+        self.lock = Lock()
+        self.start_lock = Lock()
+
+    def _read(self, text=None):
+        if text is not None:
+            mounts = parse_mountinfo(text)
+        else:
+            mounts = [{'device': p.device, 'mountpoint': p.mountpoint, 'fstype': p.fstype, 'opts': p.opts}
+                      for p in psutil.disk_partitions()]
+        table = {}
+        for mount in mounts:
+            mount['remote'] = is_remote(mount['fstype'], mount['opts'])
+            if self.filter.accepts(mount):
+                # Later entries are mounted on top of earlier ones at the same path
+                table[mount['mountpoint']] = mount
+        return table
+
+    def _update(self, table):
+        with self.lock:
+            previous, self.mounts = self.mounts, table
+            self.loaded = time.monotonic()
+        if previous is not None and table.keys() != previous.keys():
+            added, removed = table.keys() - previous.keys(), previous.keys() - table.keys()
+            logger.info(f"Mounts changed, added: {', '.join(sorted(added)) or '-'}, removed: {', '.join(sorted(removed)) or '-'}")
+
+    def start(self):
+        if self.path is None or not hasattr(select, 'poll') or not os.path.exists(self.path):
+            # No mountinfo or no poll(), e.g. macOS or Windows
+            self._update(self._read())
+            return
+        f = open(self.path, 'rb')
+        poller = select.poll()
+        poller.register(f, select.POLLPRI | select.POLLERR)
+        self._update(self._read(f.read().decode('utf-8', 'replace')))
+        self.watching = True
+        Thread(target=self._watch, args=(f, poller), daemon=True, name='mount-watcher').start()
+
+    def _watch(self, f, poller):
+        while True:
+            poller.poll()
+            try:
+                f.seek(0)
+                self._update(self._read(f.read().decode('utf-8', 'replace')))
+            except OSError as e:
+                logger.error(f"Error reading {self.path}: {e}")
+            time.sleep(RELOAD_INTERVAL)
+
+    def get(self):
+        if self.mounts is None:
+            with self.start_lock:
+                if self.mounts is None:
+                    self.start()
+        elif not self.watching and time.monotonic() - self.loaded >= PARTITIONS_REFRESH:
+            self._update(self._read())
+        with self.lock:
+            return self.mounts
+
+
+class StatfsCall:
+    """One disk usage call on its own daemon thread, left behind if it hangs."""
+
+    def __init__(self, path, usage):
+        self.result = None
+        self.error = None
+        self.done = Event()
+        Thread(target=self._run, args=(path, usage), daemon=True, name='statfs').start()
+
+    def _run(self, path, usage):
+        try:
+            self.result = usage(path)
+        except Exception as e:
+            self.error = e
+        self.done.set()
+
+
+class Breaker:
+    # Per mount failure count, backoff and last good usage
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0
+        self.cooldown = BREAKER_COOLDOWN
+        self.pending = None
+        self.usage = None
+        self.updated = None
+        self.error = None
+
+
+class DiskUsageCollector:
+    """Usage of every mount, without letting one hung filesystem block the others.
+
+    Each statfs runs on its own thread and all of them share one deadline. A call
+    still running at the deadline counts as a failure and is waited on again by the
+    next collection instead of being started twice. After FAILURE_THRESHOLD failures
+    in a row the mount's breaker opens and it is not queried until the cooldown has
+    passed. Mounts that failed report their last good usage marked as stale.
+    """
+
+    def __init__(self, mount_table, timeout=STATFS_TIMEOUT, failure_threshold=FAILURE_THRESHOLD,
+                 usage=shutil.disk_usage):
+        self.mount_table = mount_table
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.usage = usage
+        self.breakers = {}
+
+    def _fail(self, mountpoint, breaker, error, now):
+        breaker.failures += 1
+        breaker.error = error
+        if breaker.failures >= self.failure_threshold:
+            if breaker.open_until == 0:
+                logger.warning(f"Skipping disk usage of {mountpoint} for {breaker.cooldown}s after {breaker.failures} failures: {error}")
+            breaker.open_until = now + breaker.cooldown
+            breaker.cooldown = min(breaker.cooldown * 2, MAX_BREAKER_COOLDOWN)
+
+    def collect(self):
+        mounts = self.mount_table.get()
+        for mountpoint in self.breakers.keys() - mounts.keys():
+            del self.breakers[mountpoint]
+
+        started = time.monotonic()
+        calls = {}
+        for mountpoint in mounts:
+            breaker = self.breakers.setdefault(mountpoint, Breaker())
+            if breaker.pending is None and breaker.open_until <= started:
+                breaker.pending = StatfsCall(mountpoint, self.usage)
+            if breaker.pending is not None:
+                calls[mountpoint] = breaker.pending
+        deadline = started + self.timeout
+        for mountpoint, call in calls.items():
+            # A call left hanging behind an open breaker is only picked up once it has finished
+            if self.breakers[mountpoint].open_until <= started:
+                call.done.wait(max(0, deadline - time.monotonic()))
+
+        now = time.monotonic()
+        result = {}
+        for mountpoint, mount in mounts.items():
+            breaker = self.breakers[mountpoint]
+            call = calls.get(mountpoint)
+            if call is not None and call.done.is_set():
+                breaker.pending = None
+                if call.error is None:
+                    if breaker.open_until:
+                        logger.info(f"Disk usage of {mountpoint} is available again")
+                    breaker.failures, breaker.open_until, breaker.cooldown = 0, 0, BREAKER_COOLDOWN
+                    breaker.usage, breaker.updated, breaker.error = call.result, time.time(), None
+                else:
+                    self._fail(mountpoint, breaker, str(call.error), now)
+            elif call is not None and breaker.open_until <= started:
+                self._fail(mountpoint, breaker, f"statfs timed out after {self.timeout}s", now)
+            result[mountpoint] = (mount, breaker.usage, {
+                'stale': breaker.failures > 0,
+                'error': breaker.error,
+                'updated': breaker.updated,
+                'breaker': 'open' if breaker.open_until > now else 'closed',
+            })
+        return result
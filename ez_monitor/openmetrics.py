@@ -0,0 +1,233 @@
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + '}'
+
+
+class MetricFamilies:
+    """Collects samples grouped by metric family, in the order families are first seen."""
+
+    def __init__(self):
+        self.families = {}
+
+    def add(self, name, metric_type, help_text, value, labels=None):
+        if value is None:
+            return
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = (metric_type, help_text, [])
+        sample_name = f"{name}_total" if metric_type == 'counter' else name
+        family[2].append(f"{sample_name}{format_labels(labels)} {value!r}")
+
+    def render(self):
+        lines = []
+        for name, (metric_type, help_text, samples) in self.families.items():
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"# HELP {name} {help_text}")
+            lines.extend(samples)
+        lines.append('# EOF')
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def percent_to_ratio(value):
+    try:
+        return float(value) / 100
+    except (TypeError, ValueError):
+        return None
+
+
+def mb_to_bytes(value):
+    try:
+        return float(value) * 1024 * 1024
+    except (TypeError, ValueError):
+        return None
+
+
+def add_cpu(families, cpu):
+    families.add('ez_cpu_usage_ratio', 'gauge', 'CPU utilization across all cores', percent_to_ratio(cpu.get('usage')))
+    for mode in ('user', 'system', 'idle'):
+        families.add('ez_cpu_mode_ratio', 'gauge', 'Share of CPU time per mode',
+                     percent_to_ratio(cpu.get(mode)), {'mode': mode})
+    families.add('ez_cpu_count', 'gauge', 'Number of CPUs', cpu.get('count'))
+    families.add('ez_cpu_frequency_hertz', 'gauge', 'Current CPU frequency', cpu.get('frequency_hz'))
+    families.add('ez_processes', 'gauge', 'Number of processes', cpu.get('tasks'), {'state': 'all'})
+    families.add('ez_processes', 'gauge', 'Number of processes', cpu.get('running'), {'state': 'running'})
+    for core, usage in enumerate(cpu.get('cores') or []):
+        families.add('ez_cpu_core_usage_ratio', 'gauge', 'CPU utilization per core', percent_to_ratio(usage), {'core': core})
+    for period, load in zip(('1m', '5m', '15m'), cpu.get('load') or []):
+        families.add('ez_load_average', 'gauge', 'System load average', load, {'period': period})
+
+
+def add_memory(families, memory):
+    for field, name, help_text in [
+        ('total_bytes', 'ez_memory_total_bytes', 'Total physical memory'),
+        ('used_bytes', 'ez_memory_used_bytes', 'Used physical memory'),
+        ('available_bytes', 'ez_memory_available_bytes', 'Available physical memory'),
+        ('swap_total_bytes', 'ez_swap_total_bytes', 'Total swap'),
+        ('swap_used_bytes', 'ez_swap_used_bytes', 'Used swap'),
+    ]:
+        families.add(name, 'gauge', help_text, memory.get(field))
+
+
+def add_disks(families, disks):
+    for mountpoint, disk in disks.items():
+        labels = {'mountpoint': mountpoint, 'device': disk.get('device', ''), 'fstype': disk.get('fstype', '')}
+        families.add('ez_filesystem_size_bytes', 'gauge', 'Filesystem size', disk.get('total_bytes'), labels)
+        families.add('ez_filesystem_used_bytes', 'gauge', 'Filesystem used space', disk.get('used_bytes'), labels)
+        families.add('ez_filesystem_free_bytes', 'gauge', 'Filesystem free space', disk.get('free_bytes'), labels)
+        families.add('ez_filesystem_stale', 'gauge', 'Filesystem usage is from an earlier sample because statfs failed or timed out',
+                     int(disk['stale']) if 'stale' in disk else None, labels)
+
+
+def add_disk_io(families, disk_io):
+    families.add('ez_disk_read_bytes', 'counter', 'Bytes read from disks', disk_io.get('read_bytes'))
+    families.add('ez_disk_written_bytes', 'counter', 'Bytes written to disks', disk_io.get('write_bytes'))
+    families.add('ez_disk_reads', 'counter', 'Completed disk reads', disk_io.get('read_count'))
+    families.add('ez_disk_writes', 'counter', 'Completed disk writes', disk_io.get('write_count'))
+    for device, rates in (disk_io.get('devices') or {}).items():
+        labels = {'device': device}
+        families.add('ez_disk_device_read_bytes_per_second', 'gauge', 'Read throughput per disk',
+                     rates.get('read_speed', 0) * 1024 * 1024, labels)
+        families.add('ez_disk_device_written_bytes_per_second', 'gauge', 'Write throughput per disk',
+                     rates.get('write_speed', 0) * 1024 * 1024, labels)
+        families.add('ez_disk_device_reads_per_second', 'gauge', 'Read operations per disk', rates.get('read_iops'), labels)
+        families.add('ez_disk_device_writes_per_second', 'gauge', 'Write operations per disk', rates.get('write_iops'), labels)
+
+
+def add_network(families, network):
+    families.add('ez_network_transmit_bytes', 'counter', 'Bytes sent on all interfaces', network.get('bytes_sent'))
+    families.add('ez_network_receive_bytes', 'counter', 'Bytes received on all interfaces', network.get('bytes_recv'))
+    families.add('ez_network_transmit_packets', 'counter', 'Packets sent on all interfaces', network.get('packets_sent'))
+    families.add('ez_network_receive_packets', 'counter', 'Packets received on all interfaces', network.get('packets_recv'))
+    for interface, rates in (network.get('interfaces') or {}).items():
+        labels = {'interface': interface}
+        families.add('ez_network_interface_transmit_bytes_per_second', 'gauge', 'Transmit throughput per interface',
+                     rates.get('upload_speed', 0) * 1024 * 1024, labels)
+        families.add('ez_network_interface_receive_bytes_per_second', 'gauge', 'Receive throughput per interface',
+                     rates.get('download_speed', 0) * 1024 * 1024, labels)
+
+
+def add_interfaces(families, network_info):
+    for interface, info in network_info.items():
+        if interface == 'general':
+            continue
+        labels = {'interface': interface}
+        families.add('ez_network_interface_info', 'gauge', 'Interface MAC and first IPv4 address, always 1',
+                     1, {**labels, 'mac': info.get('mac', ''), 'ipv4': info.get('ipv4', '')})
+        if 'state' in info:
+            families.add('ez_network_interface_up', 'gauge', 'Whether the interface is up',
+                         1 if info['state'] == 'up' else 0, labels)
+        families.add('ez_network_interface_mtu_bytes', 'gauge', 'Interface MTU', info.get('mtu'), labels)
+        speed = info.get('speed_mbps')
+        families.add('ez_network_interface_speed_bits_per_second', 'gauge', 'Interface link speed',
+                     speed * 1000000 if speed else None, labels)
+
+
+def add_gpu(families, gpu):
+    if 'error' in gpu:
+        return
+    # Agents from before multi-GPU support only report their first GPU, at the top level
+    for device in gpu.get('gpus') or [{**gpu, 'index': 0}]:
+        labels = {'gpu': str(device.get('index', 0)), 'name': device.get('name', '')}
+        families.add('ez_gpu_utilization_ratio', 'gauge', 'GPU utilization', percent_to_ratio(device.get('percent')), labels)
+        families.add('ez_gpu_memory_used_bytes', 'gauge', 'GPU memory used', device.get('memory_used_bytes'), labels)
+        families.add('ez_gpu_memory_total_bytes', 'gauge', 'GPU memory size', device.get('memory_total_bytes'), labels)
+        families.add('ez_gpu_temperature_celsius', 'gauge', 'GPU temperature', device.get('temperature'), labels)
+        families.add('ez_gpu_power_watts', 'gauge', 'GPU power draw', device.get('power_draw'), labels)
+        families.add('ez_gpu_power_limit_watts', 'gauge', 'GPU power limit', device.get('power_limit'), labels)
+        for process in device.get('processes') or []:
+            families.add('ez_gpu_process_memory_bytes', 'gauge', 'GPU memory used by a process',
+                         process.get('memory_bytes'), {**labels, 'pid': str(process.get('pid')), 'process': process.get('name', '')})
+
+
+def add_alerts(families, alerts):
+    for alert in alerts or []:
+        families.add('ez_alert_active', 'gauge', 'Active alert, always 1', 1,
+                     {'rule': alert.get('rule', ''), 'target': alert.get('target', ''), 'severity': alert.get('severity', '')})
+
+
+def add_containers(families, containers):
+    for container in containers or []:
+        labels = {'id': container.get('short_id', ''), 'name': container.get('name', ''), 'image': container.get('image', '')}
+        families.add('ez_container_info', 'gauge', 'Container status, always 1',
+                     1, {**labels, 'status': container.get('status', '')})
+        families.add('ez_container_cpu_ratio', 'gauge', 'Container CPU usage',
+                     percent_to_ratio(container.get('cpu_percent')), labels)
+        families.add('ez_container_memory_usage_bytes', 'gauge', 'Container memory usage', container.get('mem_usage_bytes'), labels)
+        families.add('ez_container_memory_limit_bytes', 'gauge', 'Container memory limit', container.get('mem_limit_bytes'), labels)
+        families.add('ez_container_network_receive_bytes', 'counter', 'Bytes received by the container', container.get('net_rx_bytes'), labels)
+        families.add('ez_container_network_transmit_bytes', 'counter', 'Bytes sent by the container', container.get('net_tx_bytes'), labels)
+        families.add('ez_container_block_read_bytes', 'counter', 'Bytes read by the container', container.get('block_read_bytes'), labels)
+        families.add('ez_container_block_written_bytes', 'counter', 'Bytes written by the container', container.get('block_write_bytes'), labels)
+
+
+def add_processes(families, processes):
+    for process in processes:
+        labels = {'pid': process.get('pid'), 'name': process.get('name') or ''}
+        families.add('ez_process_cpu_ratio', 'gauge', 'Process CPU usage of one core', percent_to_ratio(process.get('cpu_percent')), labels)
+        families.add('ez_process_resident_memory_bytes', 'gauge', 'Process resident memory',
+                     (process.get('memory_mb') or 0) * 1024 * 1024, labels)
+        families.add('ez_process_cpu_seconds', 'counter', 'Process user and system CPU time', process.get('cpu_time'), labels)
+        families.add('ez_process_read_bytes_per_second', 'gauge', 'Process disk read rate',
+                     mb_to_bytes(process.get('read_speed')), labels)
+        families.add('ez_process_written_bytes_per_second', 'gauge', 'Process disk write rate',
+                     mb_to_bytes(process.get('write_speed')), labels)
+
+
+def add_self(families, self_info, scheduler_stats):
+    families.add('ez_self_cpu_seconds', 'counter', 'CPU time used by ez_monitor', self_info.get('cpu_seconds'))
+    families.add('ez_self_resident_memory_bytes', 'gauge', 'Resident memory of ez_monitor', self_info.get('rss_bytes'))
+    families.add('ez_self_threads', 'gauge', 'Threads of ez_monitor', self_info.get('threads'))
+    for route, latency in (self_info.get('routes') or {}).items():
+        for quantile in ('p50', 'p95', 'p99'):
+            families.add('ez_http_request_duration_seconds', 'gauge', 'Rolling HTTP request latency quantiles',
+                         latency.get(quantile), {'route': route, 'quantile': f"0.{quantile[1:]}"})
+    collector_cpu = self_info.get('collector_cpu') or {}
+    families.add('ez_collector_cpu_ratio', 'gauge', 'Share of one core used by the collectors', collector_cpu.get('cpu_usage'))
+    families.add('ez_collector_cpu_budget_ratio', 'gauge', 'Collector CPU budget as a share of one core', collector_cpu.get('cpu_budget'))
+    for collector, stats in scheduler_stats.items():
+        families.add('ez_collector_interval_seconds', 'gauge', 'Current collection interval', stats.get('interval'),
+                     {'collector': collector})
+        latency = stats.get('latency') or {}
+        for quantile in ('p50', 'p95', 'p99'):
+            families.add('ez_collector_duration_quantile_seconds', 'gauge', 'Rolling collection duration quantiles',
+                         latency.get(quantile), {'collector': collector, 'quantile': f"0.{quantile[1:]}"})
+
+
+def render_metrics(metrics, collection_times, scheduler_stats=None):
+    """Renders the published metrics as OpenMetrics text with raw values in base units."""
+    families = MetricFamilies()
+    add_cpu(families, metrics.get('cpu') or {})
+    add_memory(families, metrics.get('memory') or {})
+    add_disks(families, metrics.get('disk') or {})
+    add_disk_io(families, metrics.get('disk_io') or {})
+    add_network(families, metrics.get('network') or {})
+    add_interfaces(families, metrics.get('network_info') or {})
+    add_gpu(families, metrics.get('gpu') or {})
+    add_containers(families, metrics.get('docker_containers'))
+    add_alerts(families, metrics.get('alerts'))
+    add_self(families, metrics.get('self') or {}, scheduler_stats or {})
+
+    # A process in several selections is exported once
+    processes = {}
+    for key in ('top_processes', 'top_processes_by_memory', 'top_processes_by_cpu_time', 'top_processes_by_io'):
+        for process in metrics.get(key) or []:
+            processes.setdefault(process.get('pid'), process)
+    add_processes(families, processes.values())
+
+    for collector, duration in collection_times.items():
+        if collector.endswith('_per_1k'):
+            continue
+        families.add('ez_collector_duration_seconds', 'gauge', 'Duration of the last collection', duration, {'collector': collector})
+    return families.render()
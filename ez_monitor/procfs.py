@@ -0,0 +1,202 @@
+import glob
+import os
+import time
+from collections import namedtuple
+
+import psutil
+
+# Same field names as psutil, so collectors work with either backend
+scputimes = namedtuple('scputimes', 'user nice system idle iowait irq softirq steal guest guest_nice')
+scputimes_percent = namedtuple('scputimes_percent', 'user nice system idle iowait irq softirq steal guest guest_nice')
+scpufreq = namedtuple('scpufreq', 'current min max')
+svmem = namedtuple('svmem', 'total available percent used free active inactive buffers cached shared slab')
+sswap = namedtuple('sswap', 'total used free percent sin sout')
+sdiskio = namedtuple('sdiskio', 'read_count write_count read_bytes write_bytes read_time write_time read_merged_count write_merged_count busy_time')
+snetio = namedtuple('snetio', 'bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout')
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+SECTOR_SIZE = 512
+# Seconds a parse of /proc/stat is shared between the CPU calls of one collection cycle,
+# well under the shortest collector interval
+STAT_MAX_AGE = 0.1
+
+
+class ProcFile:
+    """A /proc file kept open and re-read from offset 0 into a reused buffer."""
+
+    def __init__(self, path, size=4096):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        self.buffer = bytearray(size)
+
+    def read(self):
+        # Reads until EOF, a single read of a /proc file may stop short at a line boundary
+        length = 0
+        while True:
+            if length == len(self.buffer):
+                # The file outgrew the buffer, e.g. a new disk or interface appeared
+                buffer = bytearray(len(self.buffer) * 2)
+                buffer[:length] = self.buffer
+                self.buffer = buffer
+            read = os.preadv(self.fd, [memoryview(self.buffer)[length:]], length)
+            if read == 0:
+                return bytes(memoryview(self.buffer)[:length])
+            length += read
+
+    def close(self):
+        os.close(self.fd)
+
+
+def cpu_total(times):
+    # Guest time is already counted in user and nice time
+    return sum(times) - times.guest - times.guest_nice
+
+
+class ProcfsBackend:
+    """Linux backend reading /proc directly, with the psutil call signatures the collectors use.
+
+    /proc/stat, /proc/meminfo, /proc/vmstat, /proc/diskstats and /proc/net/dev stay
+    open and only the fields the collectors need are parsed. /proc/stat is parsed once
+    for the cpu_percent, cpu_times_percent and cpu_times calls of a collection cycle.
+    Anything else falls through to psutil.
+    """
+
+    def __init__(self, root='/proc', sys_root='/sys'):
+        self.files = {name: ProcFile(os.path.join(root, name)) for name in
+                      ('stat', 'meminfo', 'vmstat', 'diskstats', 'net/dev')}
+        self.freq_files = [ProcFile(path, 64) for path in
+                           sorted(glob.glob(os.path.join(sys_root, 'devices/system/cpu/cpu[0-9]*/cpufreq/scaling_cur_freq')))]
+        self.last_percent_times = None
+        self.last_times_percent_times = None
+        self.stat_rows = None
+        self.stat_time = None
+
+    def __getattr__(self, name):
+        return getattr(psutil, name)
+
+    # CPU
+    def _read_cpu_times(self):
+        now = time.monotonic()
+        if self.stat_time is not None and now - self.stat_time < STAT_MAX_AGE:
+            return self.stat_rows
+        # Lines are "cpu user nice system idle iowait irq softirq steal guest guest_nice"
+        rows = []
+        for line in self.files['stat'].read().split(b'\n'):
+            if not line.startswith(b'cpu'):
+                break
+            values = [int(value) / CLOCK_TICKS for value in line.split()[1:11]]
+            values += [0.0] * (10 - len(values))
+            rows.append(scputimes(*values))
+        self.stat_rows, self.stat_time = rows, now
+        return rows
+
+    def cpu_times(self, percpu=False):
+        rows = self._read_cpu_times()
+        return rows[1:] if percpu else rows[0]
+
+    def cpu_percent(self, interval=None):
+        times = self._read_cpu_times()[0]
+        last, self.last_percent_times = self.last_percent_times, times
+        if last is None:
+            return 0.0
+        total = cpu_total(times) - cpu_total(last)
+        idle = (times.idle + times.iowait) - (last.idle + last.iowait)
+        return round(max(0.0, min(100.0, (total - idle) / total * 100)), 1) if total > 0 else 0.0
+
+    def cpu_times_percent(self, interval=None):
+        times = self._read_cpu_times()[0]
+        last, self.last_times_percent_times = self.last_times_percent_times, times
+        if last is None:
+            return scputimes_percent(*[0.0] * 10)
+        total = cpu_total(times) - cpu_total(last)
+        if total <= 0:
+            return scputimes_percent(*[0.0] * 10)
+        return scputimes_percent(*[round(max(0.0, (new - old) / total * 100), 1) for new, old in zip(times, last)])
+
+    def cpu_freq(self, percpu=False):
+        if not self.freq_files:
+            return psutil.cpu_freq(percpu)
+        # scaling_cur_freq is in kHz
+        current = sum(int(f.read()) for f in self.freq_files) / len(self.freq_files) / 1000
+        return scpufreq(current, 0.0, 0.0)
+
+    def getloadavg(self):
+        # A single system call, cheaper than reading and parsing /proc/loadavg
+        return os.getloadavg()
+
+    # Memory
+    def _read_meminfo(self, fields):
+        result = {}
+        for line in self.files['meminfo'].read().split(b'\n'):
+            key, _, value = line.partition(b':')
+            if key in fields:
+                # Values are in kB
+                result[key] = int(value.split()[0]) * 1024
+        return result
+
+    def virtual_memory(self):
+        info = self._read_meminfo({b'MemTotal', b'MemFree', b'MemAvailable', b'Buffers', b'Cached', b'SReclaimable',
+                                   b'Shmem', b'Active', b'Inactive', b'Slab'})
+        total, free = info.get(b'MemTotal', 0), info.get(b'MemFree', 0)
+        buffers = info.get(b'Buffers', 0)
+        cached = info.get(b'Cached', 0) + info.get(b'SReclaimable', 0)
+        available = info.get(b'MemAvailable', free + buffers + cached)
+        used = total - free - buffers - cached
+        if used < 0:
+            used = total - free
+        percent = round((total - available) / total * 100, 1) if total else 0.0
+        return svmem(total, available, percent, used, free, info.get(b'Active', 0), info.get(b'Inactive', 0),
+                     buffers, cached, info.get(b'Shmem', 0), info.get(b'Slab', 0))
+
+    def swap_memory(self):
+        info = self._read_meminfo({b'SwapTotal', b'SwapFree'})
+        total, free = info.get(b'SwapTotal', 0), info.get(b'SwapFree', 0)
+        used = total - free
+        sin = sout = 0
+        for line in self.files['vmstat'].read().split(b'\n'):
+            if line.startswith(b'pswpin '):
+                sin = int(line.split()[1]) * PAGE_SIZE
+            elif line.startswith(b'pswpout '):
+                sout = int(line.split()[1]) * PAGE_SIZE
+                break
+        return sswap(total, used, free, round(used / total * 100, 1) if total else 0.0, sin, sout)
+
+    # Disks
+    def disk_io_counters(self, perdisk=False):
+        # "major minor name reads merged sectors ms writes merged sectors ms in_flight io_ms ..."
+        rows = {}
+        for line in self.files['diskstats'].read().split(b'\n'):
+            fields = line.split()
+            if len(fields) < 14:
+                continue
+            rows[fields[2].decode()] = sdiskio(
+                int(fields[3]), int(fields[7]), int(fields[5]) * SECTOR_SIZE, int(fields[9]) * SECTOR_SIZE,
+                int(fields[6]), int(fields[10]), int(fields[4]), int(fields[8]), int(fields[12]),
+            )
+        if perdisk:
+            return rows
+        return sdiskio(*map(sum, zip(*rows.values()))) if rows else None
+
+    # Network
+    def net_io_counters(self, pernic=False):
+        rows = {}
+        for line in self.files['net/dev'].read().split(b'\n')[2:]:
+            name, _, fields = line.partition(b':')
+            if not fields:
+                continue
+            values = fields.split()
+            rows[name.strip().decode()] = snetio(
+                int(values[8]), int(values[0]), int(values[9]), int(values[1]),
+                int(values[2]), int(values[10]), int(values[3]), int(values[11]),
+            )
+        if pernic:
+            return rows
+        return snetio(*map(sum, zip(*rows.values()))) if rows else None
+
+
+def create_backend(name):
+    # 'auto' uses /proc where it is available and psutil everywhere else
+    if name == 'psutil' or (name == 'auto' and not os.path.exists('/proc/stat')):
+        return psutil
+    return ProcfsBackend()
@@ -0,0 +1,293 @@
+import heapq
+import logging
+import time
+from collections import deque
+from threading import Lock
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Samples kept per process while it ranks in a top selection, and scans it keeps them after dropping out
+HISTORY_POINTS = 60
+# Recent process start and exit events
+EVENT_LIMIT = 500
+
+# username() not looked up yet, None is a valid answer
+UNKNOWN = object()
+
+
+def read_start(proc):
+    # Start of the process now holding proc's PID, from data oneshot() caches for the sample. create_time()
+    # is cached for the life of the Process object, so it still reports the process first seen on the PID.
+    platform = getattr(proc, '_proc', None)
+    if hasattr(platform, '_parse_stat_file'):
+        # Linux: the starttime field of the /proc/<pid>/stat read behind cpu_times()
+        return platform._parse_stat_file()['create_time']
+    if hasattr(platform, '_get_kinfo_proc') or hasattr(platform, 'oneshot'):
+        # macOS and BSD: the kinfo_proc record behind status()
+        return platform.create_time(monotonic=True)
+    return None
+
+
+class ProcessRecord:
+    """State of one process between scans, identified by (pid, create_time)."""
+
+    __slots__ = ('pid', 'create_time', 'started', 'proc', 'name', 'username', 'status', 'cpu_time', 'rss', 'start_rss',
+                 'read_bytes', 'write_bytes', 'io_denied', 'cpu_percent', 'memory_growth_speed',
+                 'read_speed', 'write_speed', 'history', 'last_top')
+
+    def __init__(self, pid, proc):
+        self.pid = pid
+        self.proc = proc
+        try:
+            self.create_time = proc.create_time()
+        except psutil.AccessDenied:
+            self.create_time = None
+        # What read_start() returned for the first sample
+        self.started = None
+        try:
+            self.name = proc.name()
+        except (psutil.AccessDenied, psutil.ZombieProcess):
+            self.name = None
+        self.username = UNKNOWN
+        self.status = None
+        self.cpu_time = None
+        self.rss = 0
+        self.start_rss = None
+        self.read_bytes = None
+        self.write_bytes = None
+        self.io_denied = False
+        self.cpu_percent = 0.0
+        self.memory_growth_speed = 0.0
+        self.read_speed = 0.0
+        self.write_speed = 0.0
+        self.history = None
+        self.last_top = 0
+
+    @property
+    def key(self):
+        return self.pid, self.create_time
+
+
+class ProcessScanner:
+    """Walks the process table once per cycle and tracks every process across cycles.
+
+    Each process has a ProcessRecord for its PID, and a PID seen again with another
+    start time is the exit of the recorded process and the start of a new one. CPU usage, RSS growth and read/write rates come from the deltas
+    between scans, and the records of processes that are gone are dropped as their exit
+    is recorded, so memory follows the live process table. Every scan produces the
+    task/running counts used by the CPU collector, bounded top-N selections by CPU, RSS,
+    CPU time and I/O, and short histories for the processes in those selections.
+    """
+
+    def __init__(self, limit=10, io=True):
+        self.limit = limit
+        self.io = io
+        self.records = {}
+        self.events = deque(maxlen=EVENT_LIMIT)
+        self.tracked = {}
+        self.total_memory = None
+        self.cpu_count = None
+        self.last_scan = None
+        self.scans = 0
+        self.result = None
+        self.lock = Lock()
+
+    def _start(self, pid, timestamp):
+        record = ProcessRecord(pid, psutil.Process(pid))
+        self.records[pid] = record
+        # Processes found by the first scan were already running, they did not start
+        if self.last_scan is not None:
+            self.events.append({'event': 'start', 'pid': pid, 'name': record.name,
+                                'create_time': record.create_time, 'time': timestamp})
+        return record
+
+    def _exit(self, record, timestamp):
+        del self.records[record.pid]
+        self.tracked.pop(record.key, None)
+        self.events.append({
+            'event': 'exit',
+            'pid': record.pid,
+            'name': record.name,
+            'create_time': record.create_time,
+            'time': timestamp,
+            'cpu_time': record.cpu_time,
+            'memory_mb': record.rss / (1024 * 1024),
+        })
+
+    def _sample(self, record):
+        proc = record.proc
+        with proc.oneshot():
+            status = proc.status()
+            cpu_times = proc.cpu_times()
+            started = read_start(proc)
+            rss = proc.memory_info().rss
+            io_counters = None
+            if self.io and not record.io_denied:
+                try:
+                    io_counters = proc.io_counters()
+                except (psutil.AccessDenied, AttributeError):
+                    # Other users' processes stay unreadable and macOS has no I/O counters, so they are not asked again
+                    record.io_denied = True
+        return started, status, cpu_times.user + cpu_times.system, rss, io_counters
+
+    def _reused(self, record, sample):
+        started, _, cpu_time, _, _ = sample
+        if started is not None and record.started is not None:
+            return started != record.started
+        # Without a start time to compare, a CPU time going backwards is the sign of a reused PID
+        return cpu_time < record.cpu_time
+
+    def _update(self, record, sample, elapsed, wall_time):
+        started, status, cpu_time, rss, io_counters = sample
+        if record.cpu_time is None:
+            # New since the last scan, its rates cover its lifetime so far
+            window = None
+            if elapsed is not None:
+                window = max(wall_time - record.create_time, 1e-3) if record.create_time else elapsed
+            previous_cpu, previous_rss, previous_read, previous_write = 0, rss, 0, 0
+            record.start_rss = rss
+        else:
+            window, previous_cpu, previous_rss = elapsed, record.cpu_time, record.rss
+            previous_read, previous_write = record.read_bytes, record.write_bytes
+        record.started = started
+        record.status = status
+        record.cpu_time = cpu_time
+        record.rss = rss
+        if io_counters is not None:
+            record.read_bytes, record.write_bytes = io_counters.read_bytes, io_counters.write_bytes
+        if window:
+            # Clamped for processes whose start time is coarser than their CPU time
+            record.cpu_percent = min(max(0.0, cpu_time - previous_cpu) / window * 100, self.cpu_count * 100)
+            record.memory_growth_speed = (rss - previous_rss) / window / 1024 / 1024
+            if io_counters is not None and previous_read is not None:
+                record.read_speed = max(0, record.read_bytes - previous_read) / window / 1024 / 1024
+                record.write_speed = max(0, record.write_bytes - previous_write) / window / 1024 / 1024
+
+    def _describe(self, record):
+        if record.username is UNKNOWN:
+            # Looked up once per process, it cannot change
+            try:
+                record.username = record.proc.username()
+            except (psutil.NoSuchProcess, psutil.AccessDenied, KeyError):
+                record.username = None
+        return {
+            'pid': record.pid,
+            'name': record.name,
+            'status': record.status,
+            'username': record.username,
+            'cpu_percent': record.cpu_percent,
+            'cpu_total_percent': record.cpu_percent / self.cpu_count,
+            'memory_percent': record.rss / self.total_memory * 100 if self.total_memory else 0,
+            'memory_mb': record.rss / (1024 * 1024),
+            'memory_growth_mb': (record.rss - record.start_rss) / (1024 * 1024),
+            'memory_growth_speed': record.memory_growth_speed,
+            # None where the I/O counters cannot be read
+            'read_speed': record.read_speed if record.read_bytes is not None else None,
+            'write_speed': record.write_speed if record.read_bytes is not None else None,
+            'cpu_time': record.cpu_time,
+            'create_time': record.create_time,
+        }
+
+    def scan(self):
+        # Collectors on different threads may trigger a scan at the same time
+        with self.lock:
+            return self._scan()
+
+    def _scan(self):
+        start_time = time.perf_counter()
+        if self.total_memory is None:
+            self.total_memory = psutil.virtual_memory().total
+            self.cpu_count = psutil.cpu_count() or 1
+        now = time.monotonic()
+        wall_time = time.time()
+        elapsed = now - self.last_scan if self.last_scan is not None else None
+
+        pids = psutil.pids()
+        alive = set(pids)
+        for record in [record for pid, record in self.records.items() if pid not in alive]:
+            self._exit(record, wall_time)
+
+        records = []
+        running = 0
+        for pid in pids:
+            record = self.records.get(pid)
+            try:
+                if record is None:
+                    record = self._start(pid, wall_time)
+                sample = self._sample(record)
+                # A PID seen again may have been reused by a new process, which the sample reads in place of the old one
+                if record.cpu_time is not None and self._reused(record, sample):
+                    self._exit(record, wall_time)
+                    record = self._start(pid, wall_time)
+                    sample = self._sample(record)
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                # Zombies are a NoSuchProcess too, but stay in the table until they are reaped
+                continue
+            except psutil.NoSuchProcess:
+                if pid in self.records:
+                    self._exit(self.records[pid], wall_time)
+                continue
+            self._update(record, sample, elapsed, wall_time)
+            if record.status == psutil.STATUS_RUNNING:
+                running += 1
+            records.append(record)
+        self.last_scan = now
+        self.scans += 1
+
+        top_cpu = heapq.nlargest(self.limit, records, key=lambda r: r.cpu_percent)
+        top_memory = heapq.nlargest(self.limit, records, key=lambda r: r.rss)
+        top_cpu_time = heapq.nlargest(self.limit, records, key=lambda r: r.cpu_time)
+        top_io = heapq.nlargest(self.limit, records, key=lambda r: r.read_speed + r.write_speed) if self.io else []
+
+        described = {}
+        for record in top_cpu + top_memory + top_cpu_time + top_io:
+            if record.pid not in described:
+                described[record.pid] = self._describe(record)
+                self._track(record, wall_time)
+        # Histories of processes that stayed out of every selection for a whole history length are dropped
+        for key in [key for key, record in self.tracked.items() if self.scans - record.last_top > HISTORY_POINTS]:
+            self.tracked.pop(key).history = None
+
+        duration = time.perf_counter() - start_time
+        self.result = {
+            'tasks': len(pids),
+            'running': running,
+            'top_cpu': [described[r.pid] for r in top_cpu],
+            'top_memory': [described[r.pid] for r in top_memory],
+            'top_cpu_time': [described[r.pid] for r in top_cpu_time],
+            'top_io': [described[r.pid] for r in top_io],
+            'duration': duration,
+            'duration_per_1k': duration / max(1, len(records)) * 1000,
+            'timestamp': wall_time,
+        }
+        return self.result
+
+    def _track(self, record, timestamp):
+        if record.history is None:
+            record.history = deque(maxlen=HISTORY_POINTS)
+            self.tracked[record.key] = record
+        record.last_top = self.scans
+        record.history.append((timestamp, record.cpu_percent, record.rss, record.read_speed, record.write_speed))
+
+    def latest(self):
+        return self.result if self.result is not None else self.scan()
+
+    def get_tracking(self):
+        # Recent start/exit events and the histories of the processes recently in a top selection
+        with self.lock:
+            processes = []
+            for record in self.tracked.values():
+                timestamps, cpu, rss, read, write = zip(*record.history)
+                processes.append({
+                    'pid': record.pid,
+                    'name': record.name,
+                    'create_time': record.create_time,
+                    'timestamps': list(timestamps),
+                    'cpu_percent': list(cpu),
+                    'memory_mb': [value / (1024 * 1024) for value in rss],
+                    'read_speed': list(read),
+                    'write_speed': list(write),
+                })
+            return {'processes': processes, 'events': list(self.events)}
@@ -0,0 +1,106 @@
+from array import array
+from functools import lru_cache
+import os
+import re
+
+# Largest delta accepted as a 32-bit counter wrap, bigger jumps are treated as resets
+WRAP_32 = 2 ** 32
+WRAP_64 = 2 ** 64
+
+# Block devices that never represent physical disk traffic
+VIRTUAL_DISK_PREFIXES = ('loop', 'ram', 'zram')
+
+PARTITION_PATTERN = re.compile(r'^(sd[a-z]+|hd[a-z]+|vd[a-z]+|xvd[a-z]+)\d+$|^(nvme\d+n\d+|mmcblk\d+)p\d+$')
+
+
+def counter_delta(previous, current):
+    delta = current - previous
+    if delta >= 0:
+        return delta
+    wrapped = delta + WRAP_32
+    if previous < WRAP_32 and 0 <= wrapped < WRAP_32 // 2:
+        return wrapped
+    # A 64-bit counter only wraps from above 2**63, which a reset never starts from
+    wrapped = delta + WRAP_64
+    if 0 <= wrapped < WRAP_64 // 2:
+        return wrapped
+    # Counter was reset, e.g. the device was re-created
+    return current
+
+
+def time_delta(previous, current):
+    # Times in seconds do not wrap, but per-CPU idle and iowait can step back a little
+    return max(current - previous, 0.0)
+
+
+@lru_cache(maxsize=1024)
+def is_whole_disk(name):
+    # Partitions are not listed at the top level of /sys/block
+    if name.startswith(VIRTUAL_DISK_PREFIXES):
+        return False
+    if os.path.isdir('/sys/block'):
+        return os.path.exists(os.path.join('/sys/block', name))
+    return not PARTITION_PATTERN.match(name)
+
+
+@lru_cache(maxsize=1024)
+def is_physical_disk(name):
+    # dm, md and other stacked devices have no backing 'device' and duplicate their members' I/O
+    if not is_whole_disk(name):
+        return False
+    if os.path.isdir('/sys/block'):
+        return os.path.exists(os.path.join('/sys/block', name, 'device'))
+    return not name.startswith(('dm-', 'md'))
+
+
+class CounterRates:
+    """Per-second rates for many devices, computed column-wise over all devices at once.
+
+    fields maps each counter field to the (rate name, scale) it produces. Counters are
+    kept as one array per field. Devices that appear get a rate of 0 on their first
+    sample, devices that disappear are dropped, and counters that go backwards are
+    handled as 32 or 64-bit wraps or resets. Pass delta=time_delta for float times,
+    which count a step back as no change instead.
+    """
+
+    def __init__(self, fields, delta=counter_delta):
+        self.fields = fields
+        self.delta = delta
+        self.names = []
+        self.positions = {}
+        self.columns = {field: array('d') for field in fields}
+        self.last_time = None
+
+    def update(self, counters, timestamp):
+        names = list(counters)
+        rows = [counters[name] for name in names]
+        current = {}
+        for field in self.fields:
+            if rows and isinstance(rows[0], dict):
+                current[field] = array('d', [row[field] for row in rows])
+            else:
+                current[field] = array('d', [getattr(row, field) for row in rows])
+
+        elapsed = timestamp - self.last_time if self.last_time is not None else 0
+        if names == self.names:
+            previous = self.columns
+            known = None
+        else:
+            # Align the previous columns with the current device order
+            known = [self.positions.get(name) for name in names]
+            previous = {field: array('d', [column[p] if p is not None else 0.0 for p in known])
+                        for field, column in self.columns.items()}
+
+        rates = {}
+        for field, (rate_name, scale) in self.fields.items():
+            factor = scale / elapsed if elapsed > 0 else 0
+            deltas = list(map(self.delta, previous[field], current[field]))
+            if known is not None:
+                deltas = [delta if p is not None else 0 for delta, p in zip(deltas, known)]
+            rates[rate_name] = [delta * factor for delta in deltas]
+
+        self.names = names
+        self.positions = {name: index for index, name in enumerate(names)}
+        self.columns = current
+        self.last_time = timestamp
+        return {name: {rate_name: column[index] for rate_name, column in rates.items()} for index, name in enumerate(names)}
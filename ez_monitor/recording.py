@@ -0,0 +1,236 @@
+import atexit
+import bisect
+import json
+import logging
+import os
+import queue
+import struct
+import zlib
+from threading import Thread
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'EZREC1\n\0'
+# Block magic, first and last timestamp, record count and compressed length, followed by the zlib data
+BLOCK_HEADER = struct.Struct('<4sddII')
+BLOCK_MAGIC = b'EZRB'
+# First and last timestamp and file offset of every block, in the .idx file next to the recording
+INDEX_RECORD = struct.Struct('<ddQ')
+
+# A block is closed after this many seconds or uncompressed bytes, whichever comes first
+BLOCK_SECONDS = 10
+BLOCK_BYTES = 1024 * 1024
+# Compression level of the blocks, favouring speed over size
+COMPRESSION_LEVEL = 3
+
+# Value of a sample that repeated the previous value
+UNCHANGED = object()
+
+# Updates waiting for the writer thread, further updates are dropped and counted
+QUEUE_SIZE = 10000
+
+
+def index_path(path):
+    return f"{path}.idx"
+
+
+def read_header(f, offset, size):
+    # Returns the first and last timestamp and end offset of a complete block, None for a torn or missing one
+    if offset + BLOCK_HEADER.size > size:
+        return None
+    f.seek(offset)
+    magic, first, last, _, length = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+    end = offset + BLOCK_HEADER.size + length
+    if magic != BLOCK_MAGIC or end > size:
+        return None
+    return first, last, end
+
+
+def load_index(path):
+    """Returns the index entries of the complete blocks and the offset where they end.
+
+    Entries come from the .idx file. Blocks written after its last entry, e.g. when
+    the recorder was killed between the two writes, are found by walking their headers,
+    so the block data is never read.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an ez_monitor recording")
+        size = os.fstat(f.fileno()).st_size
+        entries = []
+        try:
+            with open(index_path(path), 'rb') as index_file:
+                data = index_file.read()
+            entries = [INDEX_RECORD.unpack_from(data, position)
+                       for position in range(0, len(data) - INDEX_RECORD.size + 1, INDEX_RECORD.size)]
+        except FileNotFoundError:
+            pass
+        # Indexed blocks must follow each other, an entry that does not is dropped with the rest
+        end = len(MAGIC)
+        for position, (_, _, offset) in enumerate(entries):
+            header = read_header(f, offset, size) if offset == end else None
+            if header is None:
+                entries = entries[:position]
+                break
+            end = header[2]
+        while True:
+            header = read_header(f, end, size)
+            if header is None:
+                break
+            entries.append((header[0], header[1], end))
+            end = header[2]
+    return entries, end
+
+
+class RecordingWriter:
+    """Appends every published metric update to a recording, off the collector threads.
+
+    record() only queues the update with its already serialized JSON. A writer thread
+    collects updates into blocks, each starting with a keyframe of every metric so a
+    reader seeking to a time decompresses a single block, and compresses each block on
+    its own. Blocks are only ever appended, and each gets an entry in the .idx file.
+    An existing recording is continued after its last complete block.
+    """
+
+    def __init__(self, path, block_seconds=BLOCK_SECONDS):
+        self.path = path
+        self.block_seconds = block_seconds
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            entries, end = load_index(path)
+            self.file = open(path, 'r+b')
+            # A block cut short by a crash is dropped
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            entries = []
+            self.file = open(path, 'wb')
+            self.file.write(MAGIC)
+        self.index_file = open(index_path(path), 'wb')
+        self.index_file.write(b''.join(INDEX_RECORD.pack(*entry) for entry in entries))
+        self.index_file.flush()
+        self.payloads = {}
+        self.timestamps = {}
+        self.durations = {}
+        self.lines = []
+        self.size = 0
+        self.first = None
+        self.last = None
+        self.dropped = 0
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.writer = Thread(target=self._write_forever, daemon=True, name='recorder')
+        self.writer.start()
+        atexit.register(self.close)
+
+    def record(self, timestamp, metric, payload, duration):
+        # payload is the value's JSON, or None when the value did not change
+        try:
+            self.queue.put_nowait((timestamp, metric, payload, duration))
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_forever(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.block_seconds)
+            except queue.Empty:
+                item = ()
+            try:
+                if item is None:
+                    self._flush()
+                    return
+                if item:
+                    self._add(*item)
+                if self.lines and (self.size >= BLOCK_BYTES or self.last - self.first >= self.block_seconds or not item):
+                    self._flush()
+            except Exception as e:
+                logger.error(f"Error writing recording {self.path}: {e}")
+
+    def _add(self, timestamp, metric, payload, duration):
+        if not self.lines:
+            self.first = timestamp
+            self._add_line(self._keyframe(timestamp))
+        self.last = timestamp
+        if payload is None:
+            self._add_line(f"[{json.dumps(timestamp)},{json.dumps(metric)},{json.dumps(duration)}]")
+        else:
+            self.payloads[metric] = payload
+            self._add_line(f"[{json.dumps(timestamp)},{json.dumps(metric)},{json.dumps(duration)},{payload}]")
+        self.timestamps[metric] = timestamp
+        self.durations[metric] = duration
+
+    def _add_line(self, line):
+        self.lines.append(line)
+        self.size += len(line) + 1
+
+    def _keyframe(self, timestamp):
+        # Every metric as of the start of the block, assembled from the payloads as they were recorded
+        values = ','.join(f"{json.dumps(metric)}:{payload}" for metric, payload in self.payloads.items())
+        return (f'{{"t":{json.dumps(timestamp)},"metrics":{{{values}}},'
+                f'"timestamps":{json.dumps(self.timestamps)},"collection_times":{json.dumps(self.durations)}}}')
+
+    def _flush(self):
+        if not self.lines:
+            return
+        data = zlib.compress('\n'.join(self.lines).encode('utf-8'), COMPRESSION_LEVEL)
+        offset = self.file.tell()
+        self.file.write(BLOCK_HEADER.pack(BLOCK_MAGIC, self.first, self.last, len(self.lines) - 1, len(data)) + data)
+        self.file.flush()
+        # The index entry goes after its block, a crash in between is repaired by load_index
+        self.index_file.write(INDEX_RECORD.pack(self.first, self.last, offset))
+        self.index_file.flush()
+        self.lines = []
+        self.size = 0
+
+    def close(self):
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+            self.file.close()
+            self.index_file.close()
+
+
+class Recording:
+    """Read side of a recording, seeking by timestamp through its index."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries, _ = load_index(path)
+        if not self.entries:
+            raise ValueError(f"{path} has no complete blocks")
+        self.firsts = [first for first, _, _ in self.entries]
+
+    @property
+    def start(self):
+        return self.entries[0][0]
+
+    @property
+    def end(self):
+        return self.entries[-1][1]
+
+    def read_block(self, position):
+        # Returns the keyframe and the [timestamp, metric, duration(, value)] records of one block
+        offset = self.entries[position][2]
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            _, _, _, _, length = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+            lines = zlib.decompress(f.read(length)).decode('utf-8').split('\n')
+        return json.loads(lines[0]), [json.loads(line) for line in lines[1:]]
+
+    def read(self, since=None):
+        """Yields (timestamp, metric, duration, value) from the block holding `since` on.
+
+        The first block's keyframe comes first, one item per metric, so the state is
+        complete from the first item. value is UNCHANGED for a sample that repeated
+        the previous value, and records before `since` are included so callers can fast-forward.
+        """
+        position = max(0, bisect.bisect_right(self.firsts, since) - 1) if since is not None else 0
+        keyframe, records = self.read_block(position)
+        for metric, value in keyframe['metrics'].items():
+            yield keyframe['timestamps'].get(metric, keyframe['t']), metric, keyframe['collection_times'].get(metric, 0), value
+        while True:
+            for record in records:
+                yield record[0], record[1], record[2], record[3] if len(record) > 3 else UNCHANGED
+            position += 1
+            if position >= len(self.entries):
+                return
+            _, records = self.read_block(position)
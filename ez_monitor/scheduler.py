@@ -0,0 +1,254 @@
+import heapq
+import logging
+import time
+from threading import Thread, Event, Lock
+
+from .instrumentation import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Adaptive intervals halve when the collector's signal moves and grow by a quarter when it is flat
+SPEEDUP = 0.5
+BACKOFF = 1.25
+# A change smaller than this fraction of the previous value counts as flat
+RELATIVE_TOLERANCE = 0.1
+
+# The CPU budget may stretch an interval up to this many times its base interval
+MAX_BUDGET_STRETCH = 10
+# Seconds between CPU budget rebalances
+BUDGET_PERIOD = 5
+# Weight of the latest run in the per-run CPU time average
+CPU_SMOOTHING = 0.2
+
+
+class Collector:
+    """A metric collector with its own interval, deadline, timeout and worker thread.
+
+    With a signal, a (function of the result, tolerance) pair, the interval adapts
+    between min_interval and max_interval: it shortens while the signal moves by more
+    than the tolerance and lengthens while it is flat. The scheduler's CPU budget can
+    stretch it further through budget_interval.
+    """
+
+    def __init__(self, name, func, interval, timeout=None, on_result=None, signal=None, min_interval=None, max_interval=None):
+        self.name = name
+        self.func = func
+        self.base_interval = interval
+        self.min_interval = min(min_interval or interval, interval)
+        self.max_interval = max(max_interval or interval, interval)
+        self.adaptive_interval = interval
+        self.budget_interval = 0
+        self.interval = interval
+        self.signal = signal
+        self.last_signal = None
+        # Average CPU seconds per run, measured on the worker thread
+        self.cpu_per_run = None
+        self.timeout = timeout if timeout is not None else interval * 3
+        self.on_result = on_result
+        self.trigger = Event()
+        self.deadline = None
+        self.busy = False
+        self.run_started = None
+        self.timed_out = False
+        self.lock = Lock()
+        # Rolling run durations, for tail latency next to the last duration
+        self.latency = LatencyHistogram()
+        self.stats = {
+            'interval': interval,
+            'base_interval': interval,
+            'budget_interval': 0,
+            'cpu_per_run': 0,
+            'timeout': self.timeout,
+            'runs': 0,
+            'errors': 0,
+            'overruns': 0,
+            'skipped': 0,
+            'timeouts': 0,
+            'last_duration': 0,
+            'last_run': None,
+            'last_jitter': 0,
+            'max_jitter': 0,
+            'mean_jitter': 0,
+        }
+
+    def _record_jitter(self, jitter):
+        stats = self.stats
+        stats['last_jitter'] = jitter
+        stats['max_jitter'] = max(stats['max_jitter'], jitter)
+        stats['mean_jitter'] += (jitter - stats['mean_jitter']) / max(1, stats['runs'])
+
+    def _adapt(self, result):
+        # Must be called with the lock held
+        if self.signal is None or self.min_interval == self.max_interval:
+            return
+        extract, tolerance = self.signal
+        try:
+            value = float(extract(result))
+        except (KeyError, TypeError, ValueError):
+            return
+        last, self.last_signal = self.last_signal, value
+        if last is None:
+            return
+        if abs(value - last) > max(tolerance, abs(last) * RELATIVE_TOLERANCE):
+            self.adaptive_interval = max(self.min_interval, self.adaptive_interval * SPEEDUP)
+        else:
+            self.adaptive_interval = min(self.max_interval, self.adaptive_interval * BACKOFF)
+        self._update_interval()
+
+    def _update_interval(self):
+        # Must be called with the lock held
+        self.interval = max(self.adaptive_interval, self.budget_interval)
+        self.stats['interval'] = self.interval
+
+    def set_budget_interval(self, interval):
+        with self.lock:
+            self.budget_interval = min(interval, self.base_interval * MAX_BUDGET_STRETCH)
+            self.stats['budget_interval'] = self.budget_interval
+            self._update_interval()
+
+    def run_forever(self):
+        while True:
+            self.trigger.wait()
+            self.trigger.clear()
+            started = time.monotonic()
+            cpu_started = time.thread_time()
+            timestamp = time.time()
+            with self.lock:
+                self.stats['runs'] += 1
+                self._record_jitter(max(0, started - self.deadline))
+            try:
+                result = self.func()
+                error = None
+            except Exception as e:
+                result = None
+                error = e
+                logger.error(f"Error collecting {self.name}: {e}")
+            duration = time.monotonic() - started
+            self.latency.record(duration)
+            with self.lock:
+                self.busy = False
+                self.timed_out = False
+                self.stats['last_duration'] = duration
+                self.stats['last_run'] = timestamp
+                if error is not None:
+                    self.stats['errors'] += 1
+                if duration > self.interval:
+                    self.stats['overruns'] += 1
+            if error is None:
+                with self.lock:
+                    self._adapt(result)
+            if error is None and self.on_result is not None:
+                try:
+                    self.on_result(self.name, result, timestamp, duration)
+                except Exception as e:
+                    logger.error(f"Error publishing {self.name}: {e}")
+            # Publishing is part of the collector's cost, so it counts against the budget too
+            cpu_time = time.thread_time() - cpu_started
+            with self.lock:
+                if self.cpu_per_run is None:
+                    self.cpu_per_run = cpu_time
+                else:
+                    self.cpu_per_run += (cpu_time - self.cpu_per_run) * CPU_SMOOTHING
+                self.stats['cpu_per_run'] = self.cpu_per_run
+
+    def dispatch(self, deadline, now):
+        with self.lock:
+            if self.busy:
+                # Previous run is still going, this tick is skipped
+                self.stats['skipped'] += 1
+                if not self.timed_out and now - self.run_started > self.timeout:
+                    self.timed_out = True
+                    self.stats['timeouts'] += 1
+                    logger.warning(f"Collector {self.name} exceeded its {self.timeout}s timeout")
+                return
+            self.busy = True
+            self.run_started = now
+            self.deadline = deadline
+        self.trigger.set()
+
+    def get_stats(self):
+        with self.lock:
+            stats = {**self.stats, 'timed_out': self.timed_out}
+        stats['latency'] = self.latency.percentiles()
+        return stats
+
+
+class Scheduler:
+    """Dispatches every collector on its own schedule from a single timer thread.
+
+    With a cpu_budget, a fraction of one core, the measured CPU time of the collectors
+    is kept under the budget by stretching the intervals of the collectors that cost
+    the most per run first.
+    """
+
+    def __init__(self, cpu_budget=None):
+        self.collectors = {}
+        self.stopped = Event()
+        self.cpu_budget = cpu_budget
+        self.budget_stats = {'cpu_budget': cpu_budget, 'cpu_demand': 0, 'cpu_usage': 0}
+        self.over_budget = False
+
+    def add(self, name, func, interval, timeout=None, on_result=None, signal=None, min_interval=None, max_interval=None):
+        self.collectors[name] = Collector(name, func, interval, timeout, on_result, signal, min_interval, max_interval)
+        return self.collectors[name]
+
+    def get_stats(self):
+        return {name: collector.get_stats() for name, collector in self.collectors.items()}
+
+    def get_budget_stats(self):
+        return dict(self.budget_stats)
+
+    def rebalance(self):
+        # Demand is the CPU share at the adaptive intervals, before the budget stretches any of them
+        costs = [(collector.cpu_per_run, collector) for collector in self.collectors.values() if collector.cpu_per_run]
+        demand = sum(cost / collector.adaptive_interval for cost, collector in costs)
+        excess = demand - self.cpu_budget if self.cpu_budget is not None else 0
+        budget_intervals = {}
+        for cost, collector in sorted(costs, key=lambda item: item[0], reverse=True):
+            if excess <= 0:
+                break
+            share = cost / collector.adaptive_interval
+            lowest = cost / (collector.base_interval * MAX_BUDGET_STRETCH)
+            cut = min(excess, share - lowest)
+            if cut > 0:
+                budget_intervals[collector.name] = cost / (share - cut)
+                excess -= cut
+        for collector in self.collectors.values():
+            collector.set_budget_interval(budget_intervals.get(collector.name, 0))
+        usage = sum(cost / collector.interval for cost, collector in costs)
+        if excess > 0 and not self.over_budget:
+            logger.warning(f"Collectors need {usage * 100:.2f}% of a core even at their longest intervals, "
+                           f"over the {self.cpu_budget * 100:.2f}% budget")
+        self.over_budget = excess > 0
+        self.budget_stats = {'cpu_budget': self.cpu_budget, 'cpu_demand': demand, 'cpu_usage': usage}
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        queue = []
+        now = time.monotonic()
+        for index, collector in enumerate(self.collectors.values()):
+            Thread(target=collector.run_forever, daemon=True, name=f"collector-{collector.name}").start()
+            heapq.heappush(queue, (now, index, collector))
+
+        next_rebalance = now + BUDGET_PERIOD
+        while queue and not self.stopped.is_set():
+            deadline, index, collector = heapq.heappop(queue)
+            delay = deadline - time.monotonic()
+            if delay > 0 and self.stopped.wait(delay):
+                break
+            now = time.monotonic()
+            collector.dispatch(deadline, now)
+            if now >= next_rebalance:
+                self.rebalance()
+                next_rebalance = now + BUDGET_PERIOD
+
+            # Keep deadlines on the interval grid, dropping ticks that are already in the past
+            next_deadline = deadline + collector.interval
+            if next_deadline <= now:
+                missed = int((now - next_deadline) // collector.interval) + 1
+                with collector.lock:
+                    collector.stats['skipped'] += missed
+                next_deadline += missed * collector.interval
+            heapq.heappush(queue, (next_deadline, index, collector))
@@ -0,0 +1,101 @@
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+# Sequence number and payload length, followed by the payload
+HEADER = struct.Struct('<QQ')
+
+DEFAULT_SIZE = 16 * 1024 * 1024
+
+
+def default_shm_path(port):
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, f"ez_monitor-{port}")
+
+
+class SeqlockBuffer:
+    """Single-writer, many-reader buffer in a shared memory mapped file.
+
+    The writer makes the sequence odd, writes the payload, then makes it even again.
+    Readers copy the payload and retry when the sequence was odd or changed while they
+    were copying, so they never block the writer and never see a torn payload.
+    """
+
+    def __init__(self, path, size=DEFAULT_SIZE, create=False):
+        self.path = path
+        flags = os.O_RDWR | os.O_CREAT if create else os.O_RDONLY
+        fd = os.open(path, flags, 0o644)
+        try:
+            if create:
+                os.ftruncate(fd, size)
+                access = mmap.ACCESS_WRITE
+            else:
+                size = os.fstat(fd).st_size
+                access = mmap.ACCESS_READ
+            self.map = mmap.mmap(fd, size, access=access)
+        finally:
+            os.close(fd)
+        self.size = size
+        sequence = self.sequence()
+        if create and sequence % 2:
+            # A previous writer died mid-write, readers only need an even sequence again
+            HEADER.pack_into(self.map, 0, sequence + 1, 0)
+
+    def sequence(self):
+        return HEADER.unpack_from(self.map, 0)[0]
+
+    def write(self, data):
+        if HEADER.size + len(data) > self.size:
+            raise ValueError(f"Payload of {len(data)} bytes does not fit in {self.path}")
+        sequence = self.sequence()
+        HEADER.pack_into(self.map, 0, sequence + 1, 0)
+        self.map[HEADER.size:HEADER.size + len(data)] = data
+        HEADER.pack_into(self.map, 0, sequence + 2, len(data))
+
+    def read(self):
+        while True:
+            sequence, length = HEADER.unpack_from(self.map, 0)
+            if sequence % 2:
+                # Write in progress, it only takes a memcpy to finish
+                time.sleep(0)
+                continue
+            data = self.map[HEADER.size:HEADER.size + length]
+            if self.sequence() == sequence:
+                return sequence, data
+
+
+class SharedSnapshotReader:
+    """Serves the latest payload from a SeqlockBuffer, decoded once per published sequence.
+
+    The buffer is opened on first use, so workers may start before the collector.
+    """
+
+    def __init__(self, path, decode, empty):
+        self.path = path
+        self.decode = decode
+        self.buffer = None
+        self.sequence = None
+        self.value = empty
+        self.lock = Lock()
+
+    def get(self):
+        if self.buffer is None:
+            try:
+                self.buffer = SeqlockBuffer(self.path)
+            except (OSError, ValueError):
+                return self.value
+        # Unchanged sequence is the common case and needs no lock
+        if self.buffer.sequence() == self.sequence:
+            return self.value
+        with self.lock:
+            sequence, data = self.buffer.read()
+            if sequence != self.sequence and data:
+                self.value = self.decode(data)
+                self.sequence = sequence
+            return self.value
@@ -0,0 +1,58 @@
+import json
+import os
+import zlib
+
+from .compact import encode_compact
+from .openmetrics import render_metrics
+
+# Compression level for the gzip variant, favouring speed over size
+GZIP_LEVEL = 5
+# Part of every ETag, snapshot ids restart at 0 with the process and must not match a tag from an earlier run
+RUN_ID = os.urandom(4).hex()
+
+
+def gzip_bytes(data):
+    # wbits=31 produces a gzip container with a fixed header, so equal bodies compress identically
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+class MetricsSnapshot:
+    """Immutable view of the published metrics with its /metrics bodies encoded once.
+
+    The body depends on the selected disk and encoding, so each variant is encoded the
+    first time it is requested and then reused by every request until the next snapshot.
+    """
+
+    def __init__(self, snapshot_id, response, disks, metrics=None, collection_times=None, run_id=RUN_ID):
+        self.snapshot_id = snapshot_id
+        self.run_id = run_id
+        self.response = response
+        self.disks = disks
+        self.metrics = metrics or {}
+        self.collection_times = collection_times or {}
+        self.bodies = {}
+        self.openmetrics = None
+
+    def has_disk(self, disk):
+        # Before the first disk collection there is nothing to validate against
+        return not self.disks or disk in self.disks
+
+    def get_body(self, disk, compact=False):
+        body = self.bodies.get((disk, compact))
+        if body is None:
+            response = {**self.response, 'disk': self.disks.get(disk, {})}
+            if compact:
+                data = encode_compact(response)
+            else:
+                data = json.dumps(response, separators=(',', ':')).encode('utf-8')
+            etag = f'"{self.run_id}-{self.snapshot_id}-{zlib.crc32(disk.encode("utf-8")):08x}{"-c" if compact else ""}"'
+            body = (etag, data, gzip_bytes(data))
+            self.bodies[(disk, compact)] = body
+        return body
+
+    def get_openmetrics(self):
+        # Rendered at most once per snapshot, scrapes in between reuse the bytes
+        if self.openmetrics is None:
+            self.openmetrics = render_metrics(self.metrics, self.collection_times, self.response.get('scheduler') or {})
+        return self.openmetrics
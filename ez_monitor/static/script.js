@@ -5,10 +5,17 @@ let gpuMax = 0;
 let diskIOMax = 0;
 let networkMax = 0;
 const diskSelector = document.getElementById('diskSelector');
+const diskIOSelector = document.getElementById('diskIOSelector');
+const networkSelector = document.getElementById('networkSelector');
+const gpuSelector = document.getElementById('gpuSelector');
 
 let cpuChart, memoryChart, diskChart, gpuChart, diskIOChart, networkChart;
-const maxDataPoints = 1800; // Show last 60 minutes of data (60 * 60 / 2 = 1800)
+const maxDataPoints = parseInt(document.body.dataset.maxDataPoints, 10) || 1800; // Server-side history size
+const apiBase = document.body.dataset.apiBase || ''; // Set when viewing an agent through a hub
 const updateInterval = 2000; // Update every 2000 milliseconds (2 seconds)
+// ?format=compact polls the binary /metrics encoding instead of streaming JSON
+const compactFormat = new URLSearchParams(window.location.search).get('format') === 'compact';
+let compactSchema = null;
 
 let cursorTimeout;
 let settingsButtonTimeout;
@@ -21,7 +28,6 @@ function createChart(ctx, label, isPercentage = true, fixedMax = null) {
     return new Chart(ctx, {
         type: 'line',
         data: {
-            labels: [],
             datasets: [{
                 label: label,
                 data: [],
@@ -46,7 +52,9 @@ function createChart(ctx, label, isPercentage = true, fixedMax = null) {
             responsive: true,
             maintainAspectRatio: false,
             scales: {
+                // Samples are plotted at the time they were taken, intervals vary with adaptive sampling
                 x: { 
+                    type: 'linear',
                     display: true,
                     grid: {
                         color: 'rgba(255, 255, 255, 0.1)'
@@ -58,8 +66,8 @@ function createChart(ctx, label, isPercentage = true, fixedMax = null) {
                         font: {
                             size: 10
                         },
-                        callback: function(value, index, values) {
-                            const date = new Date(this.getLabelForValue(value));
+                        callback: function(value) {
+                            const date = new Date(value);
                             const hours = date.getHours().toString().padStart(2, '0');
                             const minutes = date.getMinutes().toString().padStart(2, '0');
                             return `${hours}:${minutes}`;
@@ -92,19 +100,58 @@ function createChart(ctx, label, isPercentage = true, fixedMax = null) {
     });
 }
 
-function updateChart(chart, value) {
-    const now = new Date();
-    chart.data.labels.push(now);
-    chart.data.datasets[0].data.push(value);
+// Time in milliseconds the latest sample of a metric was taken, or now when the agent does not say
+function sampleTime(metric) {
+    return sampleTimes[metric] ? sampleTimes[metric] * 1000 : Date.now();
+}
+
+function updateChart(chart, value, time = Date.now()) {
+    const data = chart.data.datasets[0].data;
+    // Rendering the same sample again, e.g. after a selector change, replaces its point
+    if (data.length > 0 && data[data.length - 1].x >= time) {
+        data[data.length - 1].y = value;
+    } else {
+        data.push({x: time, y: value});
+    }
 
-    if (chart.data.labels.length > maxDataPoints) {
-        chart.data.labels.shift();
-        chart.data.datasets[0].data.shift();
+    if (data.length > maxDataPoints) {
+        data.shift();
     }
 
     chart.update('none');
 }
 
+function fillChart(chart, timestamps, values) {
+    chart.data.datasets[0].data = timestamps.map((ts, i) => ({x: ts * 1000, y: values[i]}));
+    chart.update('none');
+}
+
+function sumSeries(a, b) {
+    if (a.values.length !== b.values.length) {
+        return a.values;
+    }
+    return a.values.map((value, i) => value + b.values[i]);
+}
+
+// Fill the charts with the server-side history in a single request
+function loadHistory() {
+    return fetch(`${apiBase}/history`)
+        .then(response => response.json())
+        .then(data => {
+            const s = data.series;
+            fillChart(cpuChart, s['cpu.usage'].timestamps, s['cpu.usage'].values);
+            fillChart(memoryChart, s['memory.used'].timestamps, s['memory.used'].values);
+            fillChart(gpuChart, s['gpu.percent'].timestamps, s['gpu.percent'].values);
+            fillChart(diskIOChart, s['disk_io.read_speed'].timestamps,
+                sumSeries(s['disk_io.read_speed'], s['disk_io.write_speed']));
+            fillChart(networkChart, s['network.upload_speed'].timestamps,
+                sumSeries(s['network.upload_speed'], s['network.download_speed']).map(v => v * 1024));
+        })
+        .catch(error => {
+            console.error('Error fetching history:', error);
+        });
+}
+
 function initCharts() {
     cpuChart = createChart(document.getElementById('cpuChart').getContext('2d'), 'CPU Usage', true, 100);
     memoryChart = createChart(document.getElementById('memoryChart').getContext('2d'), 'Memory Usage (GB)', false);
@@ -138,6 +185,9 @@ function updateCPUMetric(cpu) {
         <div class="value-box">System: ${cpu.system.toFixed(1)}%</div>
         <div class="value-box">Idle: ${cpu.idle.toFixed(1)}%</div>
     `;
+    if (cpu.cores && cpu.cores.length) {
+        dynamicInfoElement.innerHTML += `<div class="value-box">Busiest core: ${Math.max(...cpu.cores).toFixed(1)}%</div>`;
+    }
     
     updateProgressColor(progress, cpu.usage);
 
@@ -147,7 +197,7 @@ function updateCPUMetric(cpu) {
         maxLine.style.display = 'block';
     }
     
-    updateChart(cpuChart, cpu.usage);
+    updateChart(cpuChart, cpu.usage, sampleTime('cpu'));
 }
 
 function updateMemoryMetric(memory) {
@@ -200,7 +250,7 @@ function updateMemoryMetric(memory) {
         memoryChart.options.scales.y.max = totalGB;
     }
     
-    updateChart(memoryChart, usedGB);
+    updateChart(memoryChart, usedGB, sampleTime('memory'));
 }
 
 function updateDiskMetric(disk) {
@@ -222,7 +272,7 @@ function updateDiskMetric(disk) {
     staticInfoElement.innerHTML = `
         Device: ${disk.device}<br>
         Remote: ${disk.remote}<br>
-        &nbsp;
+        ${disk.stale ? `Stale: ${disk.error}` : '&nbsp;'}
     `;
     
     updateProgressColor(progress, disk.percent);
@@ -240,7 +290,7 @@ function updateDiskMetric(disk) {
         diskChart.options.scales.y.max = totalGB;
     }
     
-    updateChart(diskChart, usedGB);
+    updateChart(diskChart, usedGB, sampleTime('disk'));
 }
 
 function updateGPUMetric(gpu) {
@@ -257,11 +307,18 @@ function updateGPUMetric(gpu) {
             <div class="value-box">Mem Used: ${gpu.memory_used}</div>
             <div class="value-box">Mem Total: ${gpu.memory_total}</div>
             <div class="value-box">Temp: ${gpu.temperature}°C</div>
+            ${gpu.power_draw != null ? `<div class="value-box">Power: ${gpu.power_draw.toFixed(0)} W</div>` : ''}
         `;
+        // Per-GPU data lists the processes using it, the aggregate counts the GPUs
+        const processes = gpu.processes
+            ? gpu.processes.map(p => `${p.name.split('/').pop()} (${p.pid}): ${p.memory_bytes != null ? (p.memory_bytes / (1024 * 1024)).toFixed(0) + ' MB' : 'N/A'}`).join('<br>')
+            : '';
         infoElement.innerHTML = `
             Name: ${gpu.name}<br>
             VRAM: ${gpu.memory_total}<br>
             Driver: ${gpu.driver}
+            ${gpu.count ? `<br>GPUs: ${gpu.count}` : ''}
+            ${processes ? `<br>Processes:<br>${processes}` : ''}
         `;
         
         updateProgressColor(progress, gpu.percent);
@@ -272,7 +329,7 @@ function updateGPUMetric(gpu) {
             maxLine.style.display = 'block';
         }
         
-        updateChart(gpuChart, gpu.percent);
+        updateChart(gpuChart, gpu.percent, sampleTime('gpu'));
     } else {
         console.error('Invalid or missing GPU data:', gpu);
         infoElement.innerHTML = gpu.error || 'No GPU data available';
@@ -311,7 +368,7 @@ function updateDiskIOMetric(diskIO) {
         maxLine.style.display = 'block';
     }
     
-    updateChart(diskIOChart, totalSpeed);
+    updateChart(diskIOChart, totalSpeed, sampleTime('disk_io'));
 }
 
 function updateNetworkMetric(network) {
@@ -347,7 +404,7 @@ function updateNetworkMetric(network) {
     );
     
     for (const [interface, info] of relevantInterfaces.slice(0, 2)) {  // Show only up to 2 interfaces
-        staticInfoHTML += `${interface}: ${info.ipv4}<br>`;
+        staticInfoHTML += `${interface}: ${info.ipv4}${info.state === 'down' ? ' (down)' : ''}<br>`;
     }
     infoElement.innerHTML = staticInfoHTML;
     
@@ -359,21 +416,24 @@ function updateNetworkMetric(network) {
         maxLine.style.display = 'block';
     }
     
-    updateChart(networkChart, totalSpeed * 1024);  // Convert to KB/s for the chart
+    updateChart(networkChart, totalSpeed * 1024, sampleTime('network'));  // Convert to KB/s for the chart
 }
 
 // Update the updateTopProcesses function
 function updateTopProcesses(processes) {
     const topProcessesElement = document.getElementById('topProcesses');
-    let html = '<table><tr><th>PID</th><th>Name</th><th>CPU %</th><th>MEM %</th><th>MEM (MB)</th><th>CPU Time</th><th>Status</th></tr>';
+    let html = '<table><tr><th>PID</th><th>Name</th><th>CPU %</th><th>MEM %</th><th>MEM (MB)</th><th>I/O (MB/s)</th><th>CPU Time</th><th>Status</th></tr>';
     processes.forEach(proc => {
         const statusClass = getProcessStatusClass(proc.status);
+        // null when the process's I/O counters are not readable
+        const io = proc.read_speed == null ? '-' : (proc.read_speed + proc.write_speed).toFixed(2);
         html += `<tr>
             <td title="${proc.pid}">${proc.pid}</td>
             <td title="${proc.name}">${proc.name}</td>
             <td title="${proc.cpu_percent.toFixed(1)}%">${proc.cpu_percent.toFixed(1)}%</td>
             <td title="${proc.memory_percent.toFixed(1)}%">${proc.memory_percent.toFixed(1)}%</td>
             <td title="${proc.memory_mb.toFixed(1)}">${proc.memory_mb.toFixed(1)}</td>
+            <td title="${io}">${io}</td>
             <td title="${proc.cpu_time.toFixed(2)}s">${proc.cpu_time.toFixed(2)}s</td>
             <td title="${proc.status}"><span class="status-dot ${statusClass}"></span>${proc.status}</td>
         </tr>`;
@@ -408,6 +468,20 @@ function getProcessStatusClass(status) {
 }
 
 // Update the updateDockerContainers function
+function updateAlerts(alerts) {
+    const alertsElement = document.getElementById('alerts');
+    if (!alerts || alerts.length === 0) {
+        alertsElement.innerHTML = '';
+        return;
+    }
+    alertsElement.innerHTML = alerts.map(alert => {
+        const since = new Date(alert.since * 1000).toLocaleTimeString();
+        return `<div class="alert alert-${alert.severity}" title="Since ${since}">
+            <strong>${alert.rule}</strong>${alert.target ? ` (${alert.target})` : ''}: ${alert.summary}
+        </div>`;
+    }).join('');
+}
+
 function updateDockerContainers(containers) {
     const dockerContainersElement = document.getElementById('dockerContainers');
     let html = '<table><tr><th>ID</th><th>Name</th><th>CPU %</th><th>MEM %</th><th>MEM Usage</th><th>Status</th></tr>';
@@ -457,19 +531,129 @@ function getStatusClass(status) {
     }
 }
 
+// Display strings the compact format leaves out, rebuilt like compact.FORMATTERS on the server
+const compactFormatters = {
+    mhz: hz => `${(hz / 1e6).toFixed(0)} MHz`,
+    join2: values => values.map(value => value.toFixed(2)).join(', '),
+    gib: value => (value / (1024 ** 3)).toFixed(2),
+    gib_unit: value => `${(value / (1024 ** 3)).toFixed(2)} GB`,
+    mib_unit: value => `${(value / (1024 * 1024)).toFixed(0)} MB`,
+    mib2: value => `${(value / (1024 * 1024)).toFixed(2)}MB`,
+    mib2_pair: (first, second) => `${(first / (1024 * 1024)).toFixed(2)}MB / ${(second / (1024 * 1024)).toFixed(2)}MB`,
+};
+
+function compactValue(value) {
+    return Number.isNaN(value) ? null : value;
+}
+
+function decodeCompactTree(node, values) {
+    if (typeof node === 'number') {
+        return compactValue(values[node]);
+    }
+    if (Array.isArray(node)) {
+        return node.map(item => decodeCompactTree(item, values));
+    }
+    if (node === null || typeof node !== 'object') {
+        return node;
+    }
+    if ('$a' in node) {
+        const [offset, length] = node.$a;
+        return Array.from(values.subarray(offset, offset + length), compactValue);
+    }
+    if ('$t' in node || '$m' in node) {
+        const table = node.$t || node.$m;
+        const columns = {};
+        Object.keys(table.c).forEach(key => columns[key] = decodeCompactTree(table.c[key], values));
+        const row = index => {
+            const item = {};
+            Object.keys(columns).forEach(key => item[key] = columns[key][index]);
+            return item;
+        };
+        if ('$t' in node) {
+            return Array.from({length: table.n}, (_, index) => row(index));
+        }
+        const items = {};
+        table.k.forEach((name, index) => items[name] = row(index));
+        return items;
+    }
+    const item = {};
+    Object.keys(node).forEach(key => item[key] = decodeCompactTree(node[key], values));
+    return item;
+}
+
+// Dicts a derived field path points at, '*' expands dict values and list items
+function compactMatches(value, path) {
+    if (value === null || typeof value !== 'object') {
+        return [];
+    }
+    if (path.length === 0) {
+        return Array.isArray(value) ? [] : [value];
+    }
+    const [part, ...rest] = path;
+    if (part === '*') {
+        return Object.values(value).flatMap(item => compactMatches(item, rest));
+    }
+    return part in value ? compactMatches(value[part], rest) : [];
+}
+
+// Magic "EZC1", u32 header length, JSON header, padding to 8 bytes, float64 values
+function decodeCompact(buffer, schema) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== 'EZC1') {
+        throw new Error('Not a compact ez_monitor payload');
+    }
+    const headerLength = view.getUint32(4, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+    if (header.schema !== schema.version) {
+        compactSchema = null; // The server was upgraded, fetch its schema again on the next poll
+        throw new Error(`Compact schema ${header.schema} does not match ${schema.version}`);
+    }
+    const start = Math.ceil((8 + headerLength) / 8) * 8;
+    const values = new Float64Array(buffer, start, (buffer.byteLength - start) / 8);
+    const data = decodeCompactTree(header.tree, values);
+    schema.derived.forEach(([path, fields]) => {
+        compactMatches(data, path.split('.')).forEach(item => {
+            Object.entries(fields).forEach(([field, [format, ...sources]]) => {
+                if (!(field in item) && sources.every(source => item[source] !== null && item[source] !== undefined)) {
+                    item[field] = compactFormatters[format](...sources.map(source => item[source]));
+                }
+            });
+        });
+    });
+    return data;
+}
+
+function fetchMetrics(selectedDisk) {
+    const url = `${apiBase}/metrics?disk=${encodeURIComponent(selectedDisk)}`;
+    if (!compactFormat) {
+        return fetch(url).then(response => response.json());
+    }
+    const schema = compactSchema || fetch(`${apiBase}/metrics/schema`)
+        .then(response => response.json())
+        .then(schema => compactSchema = schema);
+    return Promise.all([schema, fetch(`${url}&format=compact`).then(response => response.arrayBuffer())])
+        .then(([schema, buffer]) => decodeCompact(buffer, schema));
+}
+
 function updateMetrics() {
     const selectedDisk = diskSelector.value;
-    fetch(`/metrics?disk=${encodeURIComponent(selectedDisk)}`)
-        .then(response => response.json())
+    fetchMetrics(selectedDisk)
         .then(data => {
             console.log("Received data:", data);  // Keep this line
+            sampleTimes = data.timestamps || {};
             updateCPUMetric(data.cpu);
             updateMemoryMetric(data.memory);
             updateDiskMetric(data.disk);
-            updateGPUMetric(data.gpu);
-            updateDiskIOMetric(data.disk_io);
-            updateNetworkMetric(data.network);
+            latestMetrics.gpu = data.gpu;
+            latestMetrics.disk_io = data.disk_io;
+            latestMetrics.network = data.network;
+            networkStaticInfo = data.network.static_info || {};
+            renderSelectedGPU();
+            renderSelectedDiskIO();
+            renderSelectedNetwork();
             updateTopProcesses(data.top_processes);
+            updateAlerts(data.alerts);
             if ('docker_containers' in data) {
                 updateDockerContainers(data.docker_containers);
             } else {
@@ -488,11 +672,186 @@ function updateProgressColor(progressElement, value) {
     progressElement.style.backgroundColor = `hsl(${hue}, 100%, 50%)`;
 }
 
+// Latest metrics received from the stream, rendered one metric at a time
+let latestMetrics = {};
+let sampleTimes = {};
+let networkStaticInfo = {};
+let pollTimer = null;
+
+function isEmptyMetric(value) {
+    return value === undefined || (value !== null && typeof value === 'object' && !Array.isArray(value) && Object.keys(value).length === 0);
+}
+
+function renderSelectedDisk() {
+    const disks = latestMetrics.disk || {};
+    // Mounts come and go, the selection is kept while its mount exists
+    const names = Object.keys(disks);
+    const current = Array.from(diskSelector.options).map(option => option.value);
+    if (names.length && current.join('\n') !== names.join('\n')) {
+        const selected = diskSelector.value;
+        diskSelector.length = 0;
+        names.forEach(name => diskSelector.add(new Option(name, name)));
+        diskSelector.value = names.includes(selected) ? selected : names[0];
+    }
+    const disk = disks[diskSelector.value];
+    if (disk) {
+        updateDiskMetric(disk);
+    }
+}
+
+// Keep the device options in sync with the devices the agent reports
+function updateSelectorOptions(selector, names) {
+    const current = Array.from(selector.options).slice(1).map(option => option.value);
+    if (current.join('\n') === names.join('\n')) {
+        return;
+    }
+    const selected = selector.value;
+    selector.length = 1;
+    names.forEach(name => selector.add(new Option(name, name)));
+    selector.value = names.includes(selected) ? selected : '';
+}
+
+function renderSelectedGPU() {
+    const gpu = latestMetrics.gpu;
+    if (isEmptyMetric(gpu)) {
+        return;
+    }
+    const gpus = {};
+    (gpu.gpus || []).forEach(device => { gpus[`GPU ${device.index}`] = device; });
+    updateSelectorOptions(gpuSelector, Object.keys(gpus));
+    updateGPUMetric(gpus[gpuSelector.value] || gpu);
+}
+
+function renderSelectedDiskIO() {
+    const diskIO = latestMetrics.disk_io;
+    if (isEmptyMetric(diskIO)) {
+        return;
+    }
+    const devices = diskIO.devices || {};
+    updateSelectorOptions(diskIOSelector, Object.keys(devices).sort());
+    const device = devices[diskIOSelector.value];
+    updateDiskIOMetric(device ? {...device, filesystem: diskIOSelector.value} : diskIO);
+}
+
+function renderSelectedNetwork() {
+    const network = latestMetrics.network;
+    if (isEmptyMetric(network)) {
+        return;
+    }
+    const interfaces = network.interfaces || {};
+    updateSelectorOptions(networkSelector, Object.keys(interfaces).sort());
+    const nic = interfaces[networkSelector.value];
+    updateNetworkMetric({...(nic || network), static_info: networkStaticInfo});
+}
+
+function clearChart(chart) {
+    chart.data.datasets[0].data = [];
+    chart.update('none');
+}
+
+function renderMetric(metric) {
+    const value = latestMetrics[metric];
+    if (metric === 'network_info') {
+        networkStaticInfo = value || {};
+        return;
+    }
+    if (isEmptyMetric(value)) {
+        return;
+    }
+    switch (metric) {
+        case 'cpu':
+            updateCPUMetric(value);
+            break;
+        case 'memory':
+            updateMemoryMetric(value);
+            break;
+        case 'disk':
+            renderSelectedDisk();
+            break;
+        case 'gpu':
+            renderSelectedGPU();
+            break;
+        case 'disk_io':
+            renderSelectedDiskIO();
+            break;
+        case 'network':
+            renderSelectedNetwork();
+            break;
+        case 'top_processes':
+            updateTopProcesses(value);
+            break;
+        case 'docker_containers':
+            updateDockerContainers(value);
+            break;
+        case 'alerts':
+            updateAlerts(value);
+            break;
+    }
+}
+
+// Poll /metrics when streaming is not available
+function startPolling() {
+    if (pollTimer === null) {
+        updateMetrics();
+        pollTimer = setInterval(updateMetrics, updateInterval);
+    }
+}
+
+// Receive the full snapshot once, then only the metrics that changed
+function startStream() {
+    if (!window.EventSource || compactFormat) {
+        startPolling();
+        return;
+    }
+    const source = new EventSource(`${apiBase}/stream`);
+    source.addEventListener('snapshot', event => {
+        const snapshot = JSON.parse(event.data);
+        latestMetrics = snapshot.metrics;
+        sampleTimes = snapshot.timestamps || {};
+        networkStaticInfo = latestMetrics.network_info || {};
+        Object.keys(latestMetrics).forEach(renderMetric);
+    });
+    source.addEventListener('update', event => {
+        const update = JSON.parse(event.data);
+        latestMetrics[update.metric] = update.value;
+        sampleTimes[update.metric] = update.timestamp;
+        renderMetric(update.metric);
+    });
+    source.onerror = () => {
+        // The browser reconnects by itself unless the stream is unavailable
+        if (source.readyState === EventSource.CLOSED) {
+            startPolling();
+        }
+    };
+}
+
 // Update metrics when disk selection changes
-diskSelector.addEventListener('change', updateMetrics);
+diskSelector.addEventListener('change', () => {
+    if (pollTimer !== null) {
+        updateMetrics();
+    } else {
+        renderSelectedDisk();
+    }
+});
+
+// The charts only hold history for the previously selected device
+diskIOSelector.addEventListener('change', () => {
+    clearChart(diskIOChart);
+    diskIOMax = 0;
+    renderSelectedDiskIO();
+});
 
-// Update metrics every 2 seconds
-setInterval(updateMetrics, updateInterval);
+gpuSelector.addEventListener('change', () => {
+    clearChart(gpuChart);
+    gpuMax = 0;
+    renderSelectedGPU();
+});
+
+networkSelector.addEventListener('change', () => {
+    clearChart(networkChart);
+    networkMax = 0;
+    renderSelectedNetwork();
+});
 
 // Move all the settings-related code inside a function
 function initializeSettings() {
@@ -851,7 +1210,7 @@ document.addEventListener('mousemove', handleCursorVisibility);
 // Modify the existing DOMContentLoaded event listener
 document.addEventListener('DOMContentLoaded', function() {
     initCharts();
-    updateMetrics();
+    loadHistory().then(startStream);
     initializeSettings();  // Add this line to initialize settings
     handleCursorVisibility(); // Add this line to initialize cursor visibility
 });
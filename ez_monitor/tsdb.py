@@ -0,0 +1,265 @@
+import bisect
+import logging
+import mmap
+import os
+import queue
+import struct
+from threading import Thread, Lock
+
+from .history import HISTORY_SERIES, extract_samples
+
+logger = logging.getLogger(__name__)
+
+# Records per segment file, segments are preallocated and memory-mapped
+SEGMENT_RECORDS = 4096
+
+# Raw samples are (timestamp, value), rollups are (bucket start, min, avg, max)
+RAW_RECORD = struct.Struct('<dd')
+ROLLUP_RECORD = struct.Struct('<dddd')
+
+# Sample batches waiting for the writer thread, further batches are dropped and counted
+QUEUE_SIZE = 10000
+
+# Resolution name -> (bucket seconds, record format, retention seconds, share of the storage limit)
+RESOLUTIONS = {
+    'raw': (0, RAW_RECORD, 24 * 3600, 0.5),
+    '1m': (60, ROLLUP_RECORD, 30 * 24 * 3600, 0.3),
+    '1h': (3600, ROLLUP_RECORD, 365 * 24 * 3600, 0.2),
+}
+
+
+class Segment:
+    """A preallocated, memory-mapped file of fixed-width records sorted by timestamp."""
+
+    def __init__(self, path, record, writable=False):
+        self.path = path
+        self.record = record
+        self.size = record.size * SEGMENT_RECORDS
+        if writable and not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.truncate(self.size)
+        with open(path, 'r+b' if writable else 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        self.count = self._find_count()
+
+    def _timestamp(self, index):
+        return struct.unpack_from('<d', self.map, index * self.record.size)[0]
+
+    def _find_count(self):
+        # Unwritten records are zero-filled, so the count is the first zero timestamp
+        low, high = 0, SEGMENT_RECORDS
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp(middle) > 0:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def is_full(self):
+        return self.count >= SEGMENT_RECORDS
+
+    def last_timestamp(self):
+        return self._timestamp(self.count - 1) if self.count else 0
+
+    def append(self, *values):
+        self.record.pack_into(self.map, self.count * self.record.size, *values)
+        self.count += 1
+
+    def _first_at_or_after(self, since):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp(middle) < since:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def read(self, since, until):
+        records = []
+        for index in range(self._first_at_or_after(since), self.count):
+            values = self.record.unpack_from(self.map, index * self.record.size)
+            if values[0] > until:
+                break
+            records.append(values)
+        return records
+
+    def close(self):
+        self.map.close()
+
+
+class SeriesFiles:
+    """The segment files of one series at one resolution, only the newest kept open."""
+
+    def __init__(self, directory, record):
+        self.directory = directory
+        self.record = record
+        os.makedirs(directory, exist_ok=True)
+        self.starts = sorted(int(name[:-4]) for name in os.listdir(directory) if name.endswith('.seg'))
+        self.current = None
+        if self.starts:
+            self.current = Segment(self._path(self.starts[-1]), record, writable=True)
+
+    def _path(self, start):
+        return os.path.join(self.directory, f"{start}.seg")
+
+    def append(self, timestamp, *values):
+        if self.current is not None and timestamp <= self.current.last_timestamp():
+            return  # Clock went backwards, keep segments sorted
+        if self.current is None or self.current.is_full():
+            if self.current is not None:
+                self.current.close()
+            start = int(timestamp)
+            if self.starts and start <= self.starts[-1]:
+                start = self.starts[-1] + 1
+            self.starts.append(start)
+            self.current = Segment(self._path(start), self.record, writable=True)
+        self.current.append(timestamp, *values)
+
+    def query(self, since, until):
+        # Only segments that can overlap [since, until] are opened
+        first = max(0, bisect.bisect_right(self.starts, since) - 1)
+        last = bisect.bisect_right(self.starts, until)
+        records = []
+        for start in self.starts[first:last]:
+            if self.current is not None and start == self.starts[-1]:
+                records.extend(self.current.read(since, until))
+                continue
+            segment = Segment(self._path(start), self.record)
+            try:
+                records.extend(segment.read(since, until))
+            finally:
+                segment.close()
+        return records
+
+    def oldest(self):
+        # Start of the oldest closed segment, the current one is never evicted
+        return self.starts[0] if len(self.starts) > 1 else None
+
+    def evict_oldest(self):
+        start = self.starts.pop(0)
+        try:
+            os.remove(self._path(start))
+        except OSError as e:
+            logger.warning(f"Error removing segment {self._path(start)}: {e}")
+        return self.record.size * SEGMENT_RECORDS
+
+
+class Rollup:
+    """Running min/avg/max for the current bucket of one series."""
+
+    __slots__ = ('bucket', 'minimum', 'maximum', 'total', 'count')
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.minimum = float('inf')
+        self.maximum = float('-inf')
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, value):
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.total += value
+        self.count += 1
+
+    def record(self):
+        return self.bucket, self.minimum, self.total / self.count, self.maximum
+
+
+class TimeSeriesStore:
+    """Append-only on-disk history with raw samples and 1 minute / 1 hour rollups.
+
+    Writes are queued and applied by a background thread so recording never blocks the
+    collectors. The queue is bounded, so a writer that falls behind, e.g. on a slow or
+    network filesystem, drops samples instead of growing memory. Each resolution keeps segments within its retention window and its share
+    of the storage limit, evicting the oldest segments first.
+    """
+
+    def __init__(self, directory, storage_limit=256 * 1024 * 1024, series=HISTORY_SERIES):
+        self.directory = directory
+        self.storage_limit = storage_limit
+        self.series = dict(series)
+        self.files = {
+            resolution: {name: SeriesFiles(os.path.join(directory, resolution, name), record)
+                         for name in self.series}
+            for resolution, (_, record, _, _) in RESOLUTIONS.items()
+        }
+        self.rollups = {resolution: {} for resolution, (bucket, _, _, _) in RESOLUTIONS.items() if bucket}
+        self.lock = Lock()
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.dropped = 0
+        self.writer = Thread(target=self._write_forever, daemon=True, name='tsdb-writer')
+        self.writer.start()
+
+    def record(self, timestamp, new_metrics):
+        samples = extract_samples(new_metrics, self.series)
+        if samples:
+            try:
+                self.queue.put_nowait((timestamp, samples))
+            except queue.Full:
+                self.dropped += 1
+
+    def _write_forever(self):
+        while True:
+            timestamp, samples = self.queue.get()
+            try:
+                with self.lock:
+                    self._write(timestamp, samples)
+                    self._evict(timestamp)
+            except Exception as e:
+                logger.error(f"Error writing time series samples: {e}")
+
+    def _write(self, timestamp, samples):
+        for name, value in samples:
+            self.files['raw'][name].append(timestamp, value)
+            for resolution, rollups in self.rollups.items():
+                bucket_size = RESOLUTIONS[resolution][0]
+                bucket = timestamp - timestamp % bucket_size
+                rollup = rollups.get(name)
+                if rollup is not None and rollup.bucket != bucket:
+                    self.files[resolution][name].append(*rollup.record())
+                    rollup = None
+                if rollup is None:
+                    rollup = rollups[name] = Rollup(bucket)
+                rollup.add(value)
+
+    def _evict(self, now):
+        for resolution, (_, record, retention, share) in RESOLUTIONS.items():
+            files = self.files[resolution].values()
+            budget = self.storage_limit * share
+            used = sum(len(f.starts) for f in files) * record.size * SEGMENT_RECORDS
+            while True:
+                candidates = [f for f in files if f.oldest() is not None]
+                if not candidates:
+                    break
+                oldest = min(candidates, key=lambda f: f.oldest())
+                # A closed segment ends where the next one starts
+                expired = oldest.starts[1] < now - retention
+                if not expired and used <= budget:
+                    break
+                used -= oldest.evict_oldest()
+
+    def query(self, names, since, until, resolution='raw'):
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        names = list(self.series) if not names else names
+        unknown = [name for name in names if name not in self.series]
+        if unknown:
+            raise KeyError(', '.join(unknown))
+
+        result = {}
+        with self.lock:
+            for name in names:
+                records = self.files[resolution][name].query(since, until)
+                if resolution == 'raw':
+                    result[name] = {'timestamps': [r[0] for r in records], 'values': [r[1] for r in records]}
+                else:
+                    result[name] = {
+                        'timestamps': [r[0] for r in records],
+                        'min': [r[1] for r in records],
+                        'avg': [r[2] for r in records],
+                        'max': [r[3] for r in records],
+                    }
+        return result
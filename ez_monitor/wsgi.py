@@ -0,0 +1,15 @@
+"""WSGI entry point for serving ez_monitor from a multi-worker WSGI server.
+
+Collection runs in one `ez_monitor --collect-only` process, which publishes snapshots
+to shared memory. Every worker importing this module only serves those snapshots, so
+adding workers never duplicates collection.
+
+    ez_monitor --collect-only -p 5000 &
+    EZ_MONITOR_SHM=/dev/shm/ez_monitor-5000 gunicorn -w 8 --threads 4 -b 0.0.0.0:5000 ez_monitor.wsgi:app
+"""
+import os
+
+from .app import app, attach_shared_snapshot
+from .shm import default_shm_path
+
+attach_shared_snapshot(os.environ.get('EZ_MONITOR_SHM') or default_shm_path(5000))
@@ -12,7 +12,7 @@ setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/pedro-cf/ez_monitor",
-    packages=find_packages(),
+    packages=find_packages(exclude=["tests", "tests.*"]),
     include_package_data=True,
     package_data={'ez_monitor': ['static/*', 'templates/*']},
     install_requires=[
@@ -25,7 +25,6 @@ setup(
         "psutil==5.9.0",
         "flask-cors==5.0.0",
         "py-cpuinfo==9.0.0",
-        "GPUtil==1.4.0",
         "requests==2.26.0",
         "pywin32==301; platform_system=='Windows'",
         "docker==7.1.0",
@@ -0,0 +1,159 @@
+"""Minimal Docker Engine API served over a UNIX socket, for driving the Docker SDK in tests.
+
+Serves the version negotiation, ping, container listing and inspect endpoints, and
+streams stats samples as chunked JSON until the container stops or is removed.
+"""
+import json
+import os
+import socketserver
+import tempfile
+from http.server import BaseHTTPRequestHandler
+from threading import Thread, Event, Lock
+from urllib.parse import urlparse
+
+API_VERSION = '1.41'
+
+
+def stats_sample(total_usage, system_usage, memory=64 * 1024 * 1024):
+    return {
+        'cpu_stats': {'cpu_usage': {'total_usage': total_usage}, 'system_cpu_usage': system_usage, 'online_cpus': 2},
+        'precpu_stats': {'cpu_usage': {'total_usage': 0}, 'system_cpu_usage': 0},
+        'memory_stats': {'usage': memory, 'limit': 1024 * 1024 * 1024},
+        'networks': {'eth0': {'rx_bytes': 1000, 'tx_bytes': 2000}},
+        'blkio_stats': {'io_service_bytes_recursive': [{'op': 'read', 'value': 4096}, {'op': 'write', 'value': 8192}]},
+    }
+
+
+class FakeContainer:
+    def __init__(self, index, status='running', health=''):
+        self.id = f"{index:064x}"
+        self.name = f"container{index}"
+        self.status = status
+        self.health = health
+        self.samples = 0
+        # Set when the container stops or is removed, which ends its stats stream
+        self.ended = Event()
+
+    def listing(self):
+        status = 'Up 5 minutes' + (f" ({self.health})" if self.health else '') if self.status == 'running' else 'Exited (0) 1 hour ago'
+        return {'Id': self.id, 'Names': [f"/{self.name}"], 'Image': 'image:latest', 'State': self.status, 'Status': status}
+
+    def inspect(self):
+        return {'Id': self.id, 'Name': f"/{self.name}", 'State': {'Status': self.status, 'Pid': 1000 + int(self.id, 16)}}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        return 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, value, status=200):
+        body = json.dumps(value).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def do_GET(self):
+        api = self.server.api
+        path = urlparse(self.path).path
+        if path == '/version':
+            return self._send_json({'ApiVersion': API_VERSION, 'Version': '24.0.0', 'MinAPIVersion': '1.12'})
+        # Strip the /v1.41 prefix the client adds after negotiating
+        if path.startswith('/v'):
+            path = path[path.index('/', 1):]
+        if path == '/_ping':
+            body = b'OK'
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if path == '/containers/json':
+            return self._send_json([container.listing() for container in api.list_containers()])
+        parts = path.strip('/').split('/')
+        if len(parts) == 3 and parts[0] == 'containers':
+            container = api.find(parts[1])
+            if container is None:
+                return self._send_json({'message': f"No such container: {parts[1]}"}, 404)
+            if parts[2] == 'json':
+                return self._send_json(container.inspect())
+            if parts[2] == 'stats':
+                return self._stream_stats(container)
+        self._send_json({'message': 'page not found'}, 404)
+
+    def _stream_stats(self, container):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            while not container.ended.is_set():
+                container.samples += 1
+                sample = stats_sample(container.samples * 10 ** 8, container.samples * 10 ** 9)
+                self._send_chunk(json.dumps(sample).encode('utf-8') + b'\n')
+                container.ended.wait(self.server.api.stats_interval)
+            # The daemon ends the stream when the container stops or goes away
+            self.wfile.write(b'0\r\n\r\n')
+            self.wfile.flush()
+        except OSError:
+            pass
+        self.close_connection = True
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class FakeDockerAPI:
+    """Serves the containers in self.containers on a temporary UNIX socket."""
+
+    def __init__(self, containers, stats_interval=0.05):
+        self.containers = list(containers)
+        self.stats_interval = stats_interval
+        self.lock = Lock()
+        self.directory = tempfile.mkdtemp(prefix='fake-docker-')
+        self.path = os.path.join(self.directory, 'docker.sock')
+        self.server = Server(self.path, Handler)
+        self.server.api = self
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        return f"unix://{self.path}"
+
+    def list_containers(self):
+        with self.lock:
+            return list(self.containers)
+
+    def find(self, container_id):
+        with self.lock:
+            return next((c for c in self.containers if c.id.startswith(container_id)), None)
+
+    def stop(self, container):
+        container.status = 'exited'
+        container.ended.set()
+
+    def remove(self, container):
+        with self.lock:
+            self.containers.remove(container)
+        container.ended.set()
+
+    def close(self):
+        for container in self.list_containers():
+            container.ended.set()
+        self.server.shutdown()
+        self.server.server_close()
+        os.unlink(self.path)
+        os.rmdir(self.directory)
+
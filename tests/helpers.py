@@ -0,0 +1,12 @@
+import time
+
+
+def wait_for(condition, timeout=5):
+    # Polls condition until it returns something truthy, returning its last value
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = condition()
+        if value:
+            return value
+        time.sleep(0.02)
+    return condition()
@@ -0,0 +1,166 @@
+import json
+import random
+import sys
+
+import pytest
+
+from ez_monitor import alerts
+from ez_monitor.alerts import AlertEngine, CommandNotifier, Rule, Window, load_rules
+
+
+def drain(engine):
+    events = []
+    while not engine.notifications.empty():
+        events.append(engine.notifications.get_nowait())
+    return events
+
+
+@pytest.mark.parametrize('aggregate', ['mean', 'min', 'max', 'rate'])
+def test_window_matches_a_full_recomputation(aggregate):
+    rng = random.Random(aggregate)
+    window = Window(aggregate, 10)
+    samples = []
+    timestamp = 0.0
+    for _ in range(2000):
+        timestamp += rng.uniform(0.1, 2)
+        value = rng.uniform(-50, 50)
+        window.add(timestamp, value)
+        samples.append((timestamp, value))
+        kept = [(t, v) for t, v in samples if t >= timestamp - 10]
+        values = [v for _, v in kept]
+        expected = {
+            'mean': lambda: sum(values) / len(values),
+            'min': lambda: min(values),
+            'max': lambda: max(values),
+            'rate': lambda: (kept[-1][1] - kept[0][1]) / (kept[-1][0] - kept[0][0]) if len(kept) > 1 else 0.0,
+        }[aggregate]()
+        assert window.value() == pytest.approx(expected)
+
+
+def test_window_is_full_after_its_span():
+    window = Window('mean', 60)
+    window.add(100, 1)
+    assert not window.full(159)
+    assert window.full(160)
+
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValueError, match='unknown operator'):
+        Rule('a', 'cpu.usage', '=>', 90)
+    with pytest.raises(ValueError, match='needs a window'):
+        Rule('a', 'cpu.usage', '>', 90, aggregate='mean')
+    with pytest.raises(ValueError, match='numeric threshold'):
+        Rule('a', 'cpu.usage', '>', 'high', aggregate='max', window=60)
+
+
+def test_fires_and_resolves_with_hysteresis():
+    changes = []
+    engine = AlertEngine([Rule('cpu_high', 'cpu.usage', '>', 90, clear=80, severity='critical')],
+                         on_change=lambda active, timestamp: changes.append((active, timestamp)))
+    engine.evaluate('cpu', {'usage': 50}, 1)
+    assert engine.get_active() == [] and changes == []
+
+    engine.evaluate('cpu', {'usage': 95}, 2)
+    [alert] = engine.get_active()
+    assert (alert['rule'], alert['severity'], alert['value'], alert['since']) == ('cpu_high', 'critical', 95, 2)
+    assert alert['summary'] == 'cpu.usage > 90 (value 95.0)'
+    assert 'notified' not in alert
+    assert [status for status, _ in drain(engine)] == ['firing']
+    assert len(changes) == 1
+
+    # Still above clear, so it stays active and only its value changes
+    engine.evaluate('cpu', {'usage': 85}, 3)
+    assert engine.get_active()[0]['value'] == 85
+    assert drain(engine) == [] and len(changes) == 1
+
+    engine.evaluate('cpu', {'usage': 70}, 4)
+    assert engine.get_active() == []
+    [(status, resolved)] = drain(engine)
+    assert status == 'resolved' and resolved['resolved'] == 4 and resolved['value'] == 70
+    assert changes[-1] == ([], 4)
+
+
+def test_windowed_rule_waits_for_a_full_window():
+    engine = AlertEngine([Rule('sustained', 'cpu.usage', '>', 90, aggregate='min', window=60)])
+    for timestamp in range(0, 60, 10):
+        engine.evaluate('cpu', {'usage': 99}, timestamp)
+    assert engine.get_active() == []
+    engine.evaluate('cpu', {'usage': 95}, 60)
+    [alert] = engine.get_active()
+    assert alert['value'] == 95 and alert['summary'].startswith('min(cpu.usage, 60s)')
+    # One dip inside the window resolves it
+    engine.evaluate('cpu', {'usage': 10}, 70)
+    assert engine.get_active() == []
+
+
+def test_wildcards_alert_per_target_and_resolve_when_targets_go_away():
+    rules = [Rule('disk_full', 'disk.*.percent', '>=', 90),
+             Rule('unhealthy', 'docker_containers.*.status', '==', 'unhealthy')]
+    engine = AlertEngine(rules)
+    engine.evaluate('disk', {'/': {'percent': 95}, '/data': {'percent': 40}, '/boot': {'percent': 'N/A'}}, 1)
+    engine.evaluate('docker_containers', [{'name': 'web', 'status': 'unhealthy'}, {'name': 'db', 'status': 'running'}], 1)
+    assert [(a['rule'], a['target']) for a in engine.get_active()] == [('disk_full', '/'), ('unhealthy', 'web')]
+
+    engine.evaluate('disk', {'/data': {'percent': 40}}, 2)
+    assert [(a['rule'], a['target']) for a in engine.get_active()] == [('unhealthy', 'web')]
+    resolved = [alert for status, alert in drain(engine) if status == 'resolved']
+    assert [alert['target'] for alert in resolved] == ['/'] and 'value' in resolved[0]
+
+
+def test_rules_on_one_path_share_a_window():
+    rules = [Rule('warn', 'cpu.usage', '>', 50, aggregate='mean', window=10),
+             Rule('crit', 'cpu.usage', '>', 90, aggregate='mean', window=10)]
+    engine = AlertEngine(rules)
+    for timestamp, value in [(0, 100), (5, 100), (10, 40)]:
+        engine.evaluate('cpu', {'usage': value}, timestamp)
+    assert len(engine.windows) == 1
+    # Each rule sees the mean of the three samples, not of the samples added twice
+    assert [(a['rule'], a['value']) for a in engine.get_active()] == [('warn', 80)]
+
+
+def test_active_alerts_are_repeated_every_repeat_interval():
+    engine = AlertEngine([Rule('cpu_high', 'cpu.usage', '>', 90)], repeat_interval=60)
+    engine.evaluate('cpu', {'usage': 95}, 0)
+    engine.evaluate('cpu', {'usage': 95}, 30)
+    assert len(drain(engine)) == 1
+    engine.evaluate('cpu', {'usage': 95}, 60)
+    assert [status for status, _ in drain(engine)] == ['firing']
+
+
+def test_submit_ignores_unwatched_metrics_and_counts_drops(monkeypatch):
+    monkeypatch.setattr(alerts, 'QUEUE_SIZE', 2)
+    engine = AlertEngine([Rule('cpu_high', 'cpu.usage', '>', 90)])
+    engine.submit('memory', {'percent': 99}, 0)
+    for timestamp in range(4):
+        engine.submit('cpu', {'usage': 95}, timestamp)
+    assert engine.samples.qsize() == 2 and engine.dropped == 2
+
+
+def test_load_rules(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({
+        'rules': [{'name': 'cpu_high', 'metric': 'cpu.usage', 'op': '>', 'threshold': 90, 'aggregate': 'mean', 'window': 300}],
+        'notifiers': [{'type': 'webhook', 'url': 'http://127.0.0.1:9/alerts'}, {'type': 'command', 'command': 'true'}],
+        'repeat_interval': 3600,
+    }))
+    rules, notifiers, repeat_interval = load_rules(path)
+    assert [(rule.name, rule.window) for rule in rules] == [('cpu_high', 300)]
+    assert [type(notifier).__name__ for notifier in notifiers] == ['WebhookNotifier', 'CommandNotifier']
+    assert repeat_interval == 3600
+
+    path.write_text(json.dumps({'rules': [{'name': 'a', 'metric': 'cpu.usage', 'op': '>', 'threshold': 1}] * 2}))
+    with pytest.raises(ValueError, match='unique'):
+        load_rules(path)
+    path.write_text(json.dumps({'rules': [{'name': 'a', 'metric': 'cpu.usage', 'op': '>', 'limit': 1}]}))
+    with pytest.raises(ValueError, match='Invalid rule a'):
+        load_rules(path)
+    path.write_text(json.dumps({'notifiers': [{'type': 'pager'}]}))
+    with pytest.raises(ValueError, match='Unknown notifier type pager'):
+        load_rules(path)
+
+
+def test_command_notifier_gets_the_event_on_stdin(tmp_path):
+    output = tmp_path / 'event.json'
+    notifier = CommandNotifier([sys.executable, '-c', f"import sys; open({str(output)!r}, 'w').write(sys.stdin.read())"])
+    notifier.send({'status': 'firing', 'alert': {'rule': 'cpu_high'}})
+    assert json.loads(output.read_text()) == {'status': 'firing', 'alert': {'rule': 'cpu_high'}}
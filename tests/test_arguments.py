@@ -0,0 +1,55 @@
+import argparse
+import types
+
+import pytest
+
+from ez_monitor.app import parse_arguments, parse_metric_values, parse_speed, resolve_replay_start
+
+
+def test_plain_run_defaults():
+    args = parse_arguments([])
+    assert args.command is None
+    assert (args.port, args.offline, args.refresh_rate, args.intervals) == (5000, False, 2, {})
+
+
+@pytest.mark.parametrize('argv', [
+    ['-p', '8000', '--offline', 'record', 'out.bin'],
+    ['record', 'out.bin', '-p', '8000', '--offline'],
+    ['-p', '8000', 'record', 'out.bin', '--offline'],
+])
+def test_options_before_and_after_the_command_are_kept(argv):
+    args = parse_arguments(argv)
+    assert (args.command, args.path) == ('record', 'out.bin')
+    assert (args.port, args.offline) == (8000, True)
+    # Options given nowhere keep their defaults
+    assert (args.host, args.refresh_rate, args.workers) == ('0.0.0.0', 2, 1)
+
+
+def test_replay_options():
+    args = parse_arguments(['--offline', '-r', '0.5', 'replay', 'out.bin', '--speed', '10x', '--loop', '--start', '+60'])
+    assert (args.command, args.path, args.speed, args.loop, args.start) == ('replay', 'out.bin', 10, True, '+60')
+    assert args.offline and args.refresh_rate == 0.5 and args.port == 5000
+
+
+def test_option_after_the_command_wins():
+    assert parse_arguments(['-p', '8000', 'replay', 'out.bin', '-p', '9000']).port == 9000
+
+
+def test_parse_speed():
+    assert parse_speed('10x') == 10 and parse_speed('0.5X') == 0.5 and parse_speed('3') == 3
+    for value in ('fast', '0x', '-1'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_speed(value)
+
+
+def test_parse_metric_values():
+    assert parse_metric_values('cpu=1, memory=5,') == {'cpu': 1.0, 'memory': 5.0}
+    with pytest.raises(argparse.ArgumentTypeError, match="'cpu'"):
+        parse_metric_values('cpu')
+
+
+def test_resolve_replay_start():
+    recording = types.SimpleNamespace(start=1700000000.0)
+    assert resolve_replay_start('+90', recording) == 1700000090.0
+    assert resolve_replay_start('1700000500', recording) == 1700000500.0
+    assert resolve_replay_start('2023-11-14T22:13:20+00:00', recording) == 1700000000.0
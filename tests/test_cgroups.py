@@ -0,0 +1,184 @@
+import os
+import shutil
+import types
+
+import pytest
+
+from ez_monitor import cgroups
+from ez_monitor.cgroups import (CgroupContainerCollector, DockerNames, LOOKUP_RETRY, find_container_cgroups,
+                                is_cgroup_v2, parse_created, parse_io_stat, parse_keyed, parse_net_dev)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'cgroup')
+A, B, C = 'a' * 64, 'b' * 64, 'c' * 64
+MB = 1024 * 1024
+
+
+class StubNames:
+    def __init__(self, created):
+        self.created = created
+        self.lookups = []
+        self.pruned = None
+
+    def get(self, container_id):
+        self.lookups.append(container_id)
+        return f"name-{container_id[:1]}", 'image:latest', self.created.get(container_id)
+
+    def prune(self, container_ids):
+        self.pruned = set(container_ids)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    shutil.copytree(FIXTURES, tmp_path, dirs_exist_ok=True)
+    return tmp_path
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cgroups, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def container_dir(tree, container_id):
+    return find_container_cgroups(str(tree / 'sys/fs/cgroup'))[container_id]
+
+
+def write(path, text):
+    # Rewritten in place, so the collector's open descriptors see the new contents
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def make_collector(tree, created=None, limit=10):
+    names = StubNames(created or {A: 300, B: 100, C: 200})
+    collector = CgroupContainerCollector(limit=limit, root=str(tree / 'sys/fs/cgroup'), proc_root=str(tree / 'proc'),
+                                         names=names, host_memory=8 * 1024 * MB)
+    return collector, names
+
+
+def test_parsers_read_the_captured_files():
+    root = os.path.join(FIXTURES, 'sys/fs/cgroup')
+    with open(os.path.join(root, f"system.slice/docker-{A}.scope/io.stat"), 'rb') as f:
+        assert parse_io_stat(f.read()) == (2 * MB, 2 * MB)
+    with open(os.path.join(root, f"system.slice/docker-{A}.scope/cpu.stat"), 'rb') as f:
+        assert parse_keyed(f.read())[b'usage_usec'] == 5000000
+    with open(os.path.join(FIXTURES, 'proc/4100/net/dev'), 'rb') as f:
+        # Loopback is left out
+        assert parse_net_dev(f.read()) == (3 * MB, 1.5 * MB)
+    assert parse_keyed(b'populated 1\nfrozen 0\n') == {b'populated': 1, b'frozen': 0}
+
+
+def test_finds_containers_of_every_driver():
+    root = os.path.join(FIXTURES, 'sys/fs/cgroup')
+    assert is_cgroup_v2(root)
+    found = find_container_cgroups(root)
+    assert found == {
+        A: os.path.join(root, 'system.slice', f"docker-{A}.scope"),
+        B: os.path.join(root, 'docker', B),
+        C: os.path.join(root, 'machine.slice', f"libpod-{C}.scope"),
+    }
+
+
+def test_collect_reads_every_container(tree, clock):
+    collector, _ = make_collector(tree)
+    containers = {c['id']: c for c in collector.collect()}
+    assert set(containers) == {A, B, C}
+
+    a = containers[A]
+    assert (a['name'], a['image'], a['short_id']) == ('name-a', 'image:latest', A[:12])
+    assert a['status'] == 'running' and a['pid'] == 4100 and a['pids'] == 12
+    assert a['mem_usage_bytes'] == 100 * MB
+    # memory.max is 'max', so the limit is the host's memory
+    assert a['mem_limit_bytes'] == 8 * 1024 * MB
+    assert a['block_read_bytes'] == 2 * MB and a['block_write_bytes'] == 2 * MB
+    assert a['net_rx_bytes'] == 3 * MB and a['net_tx_bytes'] == 1.5 * MB
+    # Rates need a previous sample
+    assert a['cpu_percent'] == 0
+
+    b = containers[B]
+    assert b['status'] == 'paused'
+    assert b['mem_limit_bytes'] == 512 * MB and b['mem_percent'] == 9.77
+
+    # No io.stat without the io controller, and no network namespace to read
+    c = containers[C]
+    assert c['block_read_bytes'] == 0 and c['net_rx_bytes'] == 0 and c['pid'] == 4300
+
+
+def test_rates_come_from_the_previous_sample(tree, clock):
+    collector, _ = make_collector(tree)
+    collector.collect()
+    path = container_dir(tree, A)
+    write(os.path.join(path, 'cpu.stat'), 'usage_usec 6500000\n')
+    write(os.path.join(path, 'io.stat'), '8:0 rbytes=3145728 wbytes=2097152\n259:0 rbytes=1048576 wbytes=2097152\n')
+    clock[0] += 2
+    a = next(c for c in collector.collect() if c['id'] == A)
+    # 1.5 s of CPU time over 2 s
+    assert a['cpu_percent'] == 75.0
+    assert a['block_read_speed'] == pytest.approx(1.0)
+    assert a['block_write_speed'] == pytest.approx(1.0)
+    assert a['net_rx_speed'] == 0
+
+
+def test_limit_keeps_the_newest_containers_like_the_docker_api(tree, clock):
+    collector, _ = make_collector(tree, limit=2)
+    assert [c['id'] for c in collector.collect()] == [A, C]
+    assert set(collector.containers) == {A, C}
+
+    collector.limit = 3
+    assert [c['id'] for c in collector.collect()] == [A, C, B]
+
+    collector.limit = 1
+    assert [c['id'] for c in collector.collect()] == [A]
+    assert set(collector.containers) == {A}
+
+
+def test_removed_containers_are_closed_and_forgotten(tree, clock):
+    collector, names = make_collector(tree)
+    collector.collect()
+    files = collector.containers[B]
+    shutil.rmtree(container_dir(tree, B))
+    assert [c['id'] for c in collector.collect()] == [A, C]
+    assert files.fds == {}
+    assert names.pruned == {A, C}
+
+
+class FlakyContainers:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def get(self, container_id):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError('daemon restarting')
+        return types.SimpleNamespace(attrs={'Name': '/web', 'Config': {'Image': 'nginx:1.25'},
+                                            'Created': '2024-05-01T12:00:00.123456789Z'})
+
+
+def test_failed_name_lookups_are_retried(clock):
+    names = DockerNames()
+    names.client = types.SimpleNamespace(containers=FlakyContainers(failures=1))
+    assert names.get(A) == (A[:12], 'N/A', None)
+    # The fallback is kept until the retry delay has passed
+    assert names.get(A) == (A[:12], 'N/A', None)
+    assert names.client.containers.calls == 1
+
+    clock[0] += LOOKUP_RETRY
+    name, image, created = names.get(A)
+    assert (name, image) == ('web', 'nginx:1.25')
+    assert created == pytest.approx(1714564800.123456)
+    # Successful lookups are not repeated
+    clock[0] += LOOKUP_RETRY * 10
+    names.get(A)
+    assert names.client.containers.calls == 2
+
+    names.prune({B})
+    assert names.cache == {}
+
+
+def test_parse_created():
+    assert parse_created('2024-05-01T12:00:00Z') == 1714564800
+    assert parse_created('2024-05-01T12:00:00.5Z') == 1714564800.5
+    assert parse_created(None) is None
+    assert parse_created('yesterday') is None
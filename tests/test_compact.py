@@ -0,0 +1,69 @@
+import copy
+import json
+import os
+
+import pytest
+
+from ez_monitor.compact import MAGIC, PREFIX, decode_compact, encode_compact, get_schema
+
+# /metrics body of a synthetic system, captured with benchmarks/fake_system.py
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'metrics.json')
+
+
+@pytest.fixture
+def response():
+    with open(FIXTURE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def header(data):
+    _, length = PREFIX.unpack_from(data, 0)
+    return json.loads(data[PREFIX.size:PREFIX.size + length])
+
+
+def test_captured_snapshot_round_trips(response):
+    data = encode_compact(response)
+    assert data.startswith(MAGIC)
+    assert decode_compact(data) == response
+    # Numbers are float64 values, so the payload is smaller than the JSON body
+    assert len(data) < len(json.dumps(response, separators=(',', ':')))
+
+
+def test_derived_strings_are_left_out_and_rebuilt(response):
+    data = encode_compact(response)
+    tree = header(data)['tree']
+    assert header(data)['schema'] == get_schema()['version']
+    assert 'frequency' not in tree['cpu'] and 'load_average' not in tree['cpu']
+    assert 'total' not in tree['memory'] and 'mem_usage' not in tree['docker_containers']['$t']['c']
+
+    decoded = decode_compact(data)
+    assert decoded['cpu']['frequency'] == response['cpu']['frequency']
+    assert decoded['docker_containers'][1]['net_io'] == response['docker_containers'][1]['net_io']
+    assert decoded['gpu']['gpus'][0]['memory_used'] == response['gpu']['gpus'][0]['memory_used']
+
+
+def test_repeated_rows_become_columns(response):
+    tree = header(encode_compact(response))['tree']
+    # Lists of same-keyed dicts are tables, dicts of same-keyed dicts are keyed tables
+    assert tree['top_processes']['$t']['n'] == len(response['top_processes'])
+    assert '$a' in tree['top_processes']['$t']['c']['memory_mb']
+    assert tree['network']['interfaces']['$m']['k'] == list(response['network']['interfaces'])
+    assert '$a' in tree['cpu']['cores']
+
+
+def test_strings_without_their_raw_values_are_kept():
+    # A derived field whose source is missing or None cannot be rebuilt, so it is sent
+    response = {'cpu': {'frequency': 'N/A', 'frequency_hz': None},
+                'docker_containers': [{'name': 'web', 'mem_usage': '1.00MB', 'mem_usage_bytes': None, 'cpu_percent': None}]}
+    assert decode_compact(encode_compact(response)) == response
+
+
+def test_round_trip_does_not_modify_the_response(response):
+    original = copy.deepcopy(response)
+    encode_compact(response)
+    assert response == original
+
+
+def test_rejects_other_payloads():
+    with pytest.raises(ValueError, match='Not a compact'):
+        decode_compact(PREFIX.pack(b'JSON', 0))
@@ -0,0 +1,99 @@
+import pytest
+
+from ez_monitor.docker_stats import DockerStatsCollector
+from tests.fake_docker import FakeContainer, FakeDockerAPI
+from tests.helpers import wait_for
+
+
+@pytest.fixture
+def api():
+    api = FakeDockerAPI([FakeContainer(1, health='healthy'), FakeContainer(2), FakeContainer(3, status='exited')])
+    yield api
+    api.close()
+
+
+def collect_when(collector, condition):
+    return wait_for(lambda: (lambda result: result if condition(result) else None)(collector.collect()))
+
+
+def test_lists_containers_with_names_images_and_health(api):
+    collector = DockerStatsCollector(base_url=api.base_url)
+    containers = collector.collect()
+    assert [c['name'] for c in containers] == ['container1', 'container2', 'container3']
+    assert [c['status'] for c in containers] == ['healthy', 'running', 'exited']
+    assert containers[0]['id'] == api.containers[0].id
+    assert containers[0]['short_id'] == api.containers[0].id[:12]
+    assert containers[0]['image'] == 'image:latest'
+
+
+def test_collect_reads_cached_stats_from_the_streams(api):
+    collector = DockerStatsCollector(base_url=api.base_url)
+    collector.collect()
+    containers = collect_when(collector, lambda result: all(c['mem_usage_bytes'] for c in result[:2]))
+    assert containers is not None
+    running = containers[0]
+    assert running['pid'] == 1001
+    # 1e8 of 1e9 system nanoseconds on 2 CPUs, per sample
+    assert running['cpu_percent'] == pytest.approx(20.0)
+    assert running['mem_usage_bytes'] == 64 * 1024 * 1024
+    assert running['net_rx_bytes'] == 1000 and running['net_tx_bytes'] == 2000
+    assert running['block_read_bytes'] == 4096 and running['block_write_bytes'] == 8192
+    # Exited containers have no stream and report empty stats
+    assert containers[2]['mem_usage_bytes'] == 0
+    assert set(collector.readers) == {api.containers[0].id, api.containers[1].id}
+
+    # Later samples replace the cached one without another collection blocking on the API
+    samples = api.containers[0].samples
+    assert wait_for(lambda: api.containers[0].samples > samples + 2)
+
+
+def test_container_removed_mid_stream_is_dropped(api):
+    collector = DockerStatsCollector(base_url=api.base_url)
+    collector.collect()
+    removed = api.containers[1]
+    assert wait_for(lambda: removed.id in collector.stats)
+
+    api.remove(removed)
+    # The stream ends and its reader goes away on its own
+    assert wait_for(lambda: removed.id not in collector.readers)
+    containers = collector.collect()
+    assert [c['name'] for c in containers] == ['container1', 'container3']
+    assert removed.id not in collector.stats and removed.id not in collector.details
+
+
+def test_container_that_stops_loses_its_stats(api):
+    collector = DockerStatsCollector(base_url=api.base_url)
+    collector.collect()
+    stopped = api.containers[1]
+    assert wait_for(lambda: stopped.id in collector.stats)
+
+    api.stop(stopped)
+    # Still listed, but as exited, so its last running sample is not reported
+    container = collector.collect()[1]
+    assert container['status'] == 'exited'
+    assert (container['cpu_percent'], container['mem_usage_bytes'], container['pid']) == (0, 0, 'N/A')
+    assert wait_for(lambda: stopped.id not in collector.readers)
+    assert stopped.id not in collector.stats and stopped.id not in collector.details
+    assert collector.collect()[1]['mem_usage_bytes'] == 0
+
+
+def test_limit_bounds_listed_containers_and_readers(api):
+    collector = DockerStatsCollector(limit=1, base_url=api.base_url)
+    assert [c['name'] for c in collector.collect()] == ['container1']
+    assert list(collector.readers) == [api.containers[0].id]
+
+    # Raising the limit, as get_docker_containers does for --docker-limit, starts the other readers
+    collector.limit = 3
+    assert len(collector.collect()) == 3
+    assert set(collector.readers) == {api.containers[0].id, api.containers[1].id}
+
+    collector.limit = 1
+    collector.collect()
+    assert list(collector.readers) == [api.containers[0].id]
+    assert set(collector.stats) <= {api.containers[0].id}
+
+
+def test_unreachable_daemon_returns_none_and_backs_off(tmp_path):
+    collector = DockerStatsCollector(base_url=f"unix://{tmp_path / 'missing.sock'}")
+    assert collector.collect() is None
+    assert collector.retry_at > 0
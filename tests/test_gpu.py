@@ -0,0 +1,105 @@
+import os
+import sys
+
+import pytest
+
+from ez_monitor.gpu import GPU_FIELDS, NvidiaSmiCollector, parse_number, parse_row
+from tests.helpers import wait_for
+
+FAKE_NVIDIA_SMI = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'fake_nvidia_smi.py')
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def make_collector():
+    collectors = []
+
+    def make(command, **kwargs):
+        collector = NvidiaSmiCollector(command, interval=0.05, **kwargs)
+        collectors.append(collector)
+        return collector
+
+    yield make
+    for collector in collectors:
+        collector.stop()
+
+
+def fake_nvidia_smi(gpus=2, processes=2):
+    return [sys.executable, FAKE_NVIDIA_SMI, '--gpus', str(gpus), '--processes', str(processes)]
+
+
+def test_parse_row_keeps_commas_in_the_name():
+    row = parse_row('0, GPU-1, 550.00, 40, 10, 1024, 81920, 55, 250.50, 700.00, Tesla, rev 2\n', GPU_FIELDS)
+    assert row['index'] == '0' and row['memory.used'] == '1024'
+    assert row['name'] == 'Tesla, rev 2'
+    # Header and diagnostic lines are skipped
+    assert parse_row(', '.join(GPU_FIELDS), GPU_FIELDS) is None
+    assert parse_row('No devices were found', GPU_FIELDS) is None
+    assert parse_number('[N/A]') is None and parse_number('[Not Supported]') is None
+    assert parse_number('250.50') == 250.5
+
+
+def test_reports_every_gpu(make_collector):
+    collector = make_collector(fake_nvidia_smi(gpus=3))
+    gpus = wait_for(lambda: (lambda gpus: gpus if len(gpus) == 3 else None)(collector.collect()))
+    assert gpus is not None
+    assert [gpu['index'] for gpu in gpus] == [0, 1, 2]
+    gpu = gpus[1]
+    assert gpu['uuid'] == 'GPU-00000001-0000-0000-0000-000000000000'
+    assert (gpu['name'], gpu['driver']) == ('Synthetic GPU', '550.00')
+    assert 0 <= gpu['percent'] <= 100 and 0 <= gpu['memory_percent'] <= 100
+    assert gpu['memory_total'] == '81920 MB' and gpu['memory_total_bytes'] == 81920 * MB
+    assert 0 <= gpu['memory_used_bytes'] <= gpu['memory_total_bytes']
+    assert 30 <= gpu['temperature'] <= 85
+    assert 60 <= gpu['power_draw'] <= 700 and gpu['power_limit'] == 700.0
+
+
+def test_processes_are_attributed_to_their_gpu(make_collector):
+    collector = make_collector(fake_nvidia_smi(gpus=2, processes=3))
+    gpus = wait_for(lambda: (lambda gpus: gpus if len(gpus) == 2 and all(len(gpu['processes']) == 3 for gpu in gpus)
+                             else None)(collector.collect()))
+    assert gpus is not None
+    for gpu in gpus:
+        index = gpu['index']
+        assert {p['pid'] for p in gpu['processes']} == {10000 + index * 3 + i for i in range(3)}
+        assert all(p['name'] == f"/usr/bin/python3 train.py --rank {index}" for p in gpu['processes'])
+        memory = [p['memory_bytes'] for p in gpu['processes']]
+        assert all(256 * MB <= m <= 40960 * MB for m in memory)
+        # Largest first
+        assert memory == sorted(memory, reverse=True)
+
+
+def test_dead_query_process_is_restarted(make_collector):
+    collector = make_collector(fake_nvidia_smi(gpus=1), restart_delay=0)
+    assert wait_for(collector.collect)
+    stream = collector.streams[0]
+    dead = stream.process
+    dead.kill()
+    dead.wait()
+    assert not stream.alive()
+
+    collector.collect()
+    assert stream.process is not dead and stream.alive()
+    # The restarted stream keeps the GPU fresh
+    seen = collector.gpus['GPU-00000000-0000-0000-0000-000000000000'][0]
+    assert wait_for(lambda: collector.gpus['GPU-00000000-0000-0000-0000-000000000000'][0] > seen)
+
+
+def test_restarts_wait_for_the_restart_delay(make_collector):
+    collector = make_collector(fake_nvidia_smi(gpus=1), restart_delay=60)
+    assert wait_for(collector.collect)
+    dead = collector.streams[0].process
+    dead.kill()
+    dead.wait()
+    collector.collect()
+    assert collector.streams[0].process is dead
+
+
+def test_missing_nvidia_smi_reports_no_gpus(make_collector, tmp_path):
+    collector = make_collector(str(tmp_path / 'nvidia-smi'))
+    assert collector.collect() == []
+    assert not any(stream.alive() for stream in collector.streams)
+    # Retried after the restart delay, not on every collection
+    start = collector.last_start
+    assert collector.collect() == []
+    assert collector.last_start == start
@@ -0,0 +1,119 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from ez_monitor import compact
+from ez_monitor.hub import Hub, create_hub_app
+
+
+class StubAgent(BaseHTTPRequestHandler):
+    """Answers like an agent, recording each request's path, query and headers."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, content_type='application/json'):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.server.requests.append((url.path, query, dict(self.headers)))
+        if url.path == '/metrics':
+            if query.get('format') == ['compact'] or compact.CONTENT_TYPE in self.headers.get('Accept', ''):
+                return self._send(b'compact body', compact.CONTENT_TYPE)
+            disk = query.get('disk', ['/'])[0]
+            return self._send(json.dumps({
+                'cpu': {'usage': 12.5},
+                'network': {'static_info': {'general': {'hostname': 'stub'}}},
+                'disk': {'mountpoint': disk},
+            }).encode('utf-8'))
+        if url.path == '/metrics/schema':
+            return self._send(json.dumps({'version': 1}).encode('utf-8'))
+        if url.path == '/disks':
+            return self._send(json.dumps(['/', '/data']).encode('utf-8'))
+        if url.path == '/stream':
+            # One event, then the agent closes the stream
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(f"id: {self.headers.get('Last-Event-ID', '1')}\nevent: snapshot\ndata: {{}}\n\n".encode('utf-8'))
+            self.close_connection = True
+            return
+        self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+@pytest.fixture
+def agent():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubAgent)
+    server.daemon_threads = True
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def hub(agent):
+    # The second agent has nothing listening
+    hub = Hub([f"http://127.0.0.1:{agent.server_address[1]}", 'http://127.0.0.1:9'], timeout=1)
+    for polled in hub.agents:
+        hub.poll(polled)
+    agent.requests.clear()
+    yield hub
+    hub.stop()
+
+
+@pytest.fixture
+def client(hub):
+    return create_hub_app(hub, max_data_points=60).test_client()
+
+
+def test_dashboard_offers_the_agents_disks(client):
+    page = client.get('/hosts/0/').get_data(as_text=True)
+    assert '<option value="/data">' in page and 'stub' in page
+    assert 'data-api-base="/hosts/0"' in page
+    # An agent that cannot be reached still gets a page, with only the root disk
+    page = client.get('/hosts/1/').get_data(as_text=True)
+    assert '<option value="/">' in page and '<option value="/data">' not in page
+    assert client.get('/hosts/2/').status_code == 404
+
+
+def test_default_metrics_come_from_the_cache(client, agent):
+    response = client.get('/hosts/0/metrics')
+    assert response.json['disk'] == {'mountpoint': '/'}
+    assert agent.requests == []
+
+    response = client.get('/hosts/0/metrics?disk=/data')
+    assert response.json['disk'] == {'mountpoint': '/data'}
+    assert [(path, query) for path, query, _ in agent.requests] == [('/metrics', {'disk': ['/data']})]
+
+
+def test_compact_metrics_and_schema_are_fetched_from_the_agent(client, agent):
+    response = client.get('/hosts/0/metrics?format=compact')
+    assert (response.content_type, response.data) == (compact.CONTENT_TYPE, b'compact body')
+    response = client.get('/hosts/0/metrics', headers={'Accept': compact.CONTENT_TYPE})
+    assert (response.content_type, response.data) == (compact.CONTENT_TYPE, b'compact body')
+    assert agent.requests[1][2]['Accept'] == compact.CONTENT_TYPE
+    assert client.get('/hosts/0/metrics/schema').json == {'version': 1}
+
+
+def test_stream_is_relayed_from_the_agent(client, agent):
+    response = client.get('/hosts/0/stream', headers={'Last-Event-ID': '42'})
+    assert response.content_type.startswith('text/event-stream')
+    assert response.get_data(as_text=True) == 'id: 42\nevent: snapshot\ndata: {}\n\n'
+    assert agent.requests[0][2]['Last-Event-ID'] == '42'
+    assert client.get('/hosts/1/stream').status_code == 502
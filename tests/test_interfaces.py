@@ -0,0 +1,130 @@
+import socket
+import struct
+import types
+
+import pytest
+
+from ez_monitor import interfaces
+from ez_monitor.interfaces import (IFADDRMSG, IFINFOMSG, IFLA_IFNAME, NLMSG_HEADER, RTATTR, RTM_DELLINK, RTM_NEWADDR,
+                                   RTM_NEWLINK, InterfaceTable, align, parse_messages, read_link_stats)
+
+IFLA_MTU = 4
+NLMSG_DONE = 3
+
+
+def attribute(kind, value):
+    data = RTATTR.pack(RTATTR.size + len(value), kind) + value
+    return data + b'\0' * (align(len(data)) - len(data))
+
+
+def message(msg_type, body):
+    return NLMSG_HEADER.pack(NLMSG_HEADER.size + len(body), msg_type, 0, 1, 0) + body
+
+
+def link_message(index, name=None, msg_type=RTM_NEWLINK):
+    # The MTU attribute comes first so the parser has to skip it
+    attributes = attribute(IFLA_MTU, struct.pack('<I', 1500))
+    if name is not None:
+        attributes += attribute(IFLA_IFNAME, name.encode() + b'\0')
+    return message(msg_type, IFINFOMSG.pack(socket.AF_UNSPEC, 1, index, 0x1, 0) + attributes)
+
+
+def address_message(index):
+    return message(RTM_NEWADDR, IFADDRMSG.pack(socket.AF_INET, 24, 0, 0, index) + attribute(1, bytes([10, 0, 0, 1])))
+
+
+def test_parses_link_and_address_messages_in_one_batch():
+    data = link_message(7, 'veth1a2b3c') + link_message(8, 'eth0', RTM_DELLINK) + address_message(2)
+    assert parse_messages(data) == ({'veth1a2b3c', 'eth0'}, {7, 8, 2})
+
+
+def test_names_are_padded_to_four_bytes():
+    # An 8 byte name with its terminator leaves padding before the next message
+    data = link_message(3, 'docker01') + link_message(4, 'a')
+    assert parse_messages(data) == ({'docker01', 'a'}, {3, 4})
+
+
+def test_other_and_malformed_messages_are_skipped():
+    done = message(NLMSG_DONE, b'\0' * 4)
+    short_link = message(RTM_NEWLINK, b'\0' * 4)
+    assert parse_messages(done + short_link + link_message(5, 'eth1')) == ({'eth1'}, {5})
+    # A message claiming more bytes than were received ends the batch
+    truncated = link_message(6, 'eth2')
+    assert parse_messages(link_message(5, 'eth1') + truncated[:-4]) == ({'eth1'}, {5})
+    assert parse_messages(b'') == (set(), set())
+    # A zero length would loop forever
+    assert parse_messages(NLMSG_HEADER.pack(0, RTM_NEWLINK, 0, 0, 0) + b'\0' * 32) == (set(), set())
+
+
+def test_link_message_without_a_name_reports_its_index():
+    assert parse_messages(link_message(9)) == (set(), {9})
+
+
+def make_interface(path, name, operstate='up', flags='0x1003', mtu='1500', speed='1000', duplex='full'):
+    directory = path / name
+    directory.mkdir()
+    for attr, value in [('operstate', operstate), ('flags', flags), ('mtu', mtu), ('speed', speed), ('duplex', duplex)]:
+        if value is not None:
+            (directory / attr).write_text(value + '\n')
+
+
+def test_read_link_stats(tmp_path):
+    make_interface(tmp_path, 'eth0')
+    make_interface(tmp_path, 'lo', operstate='unknown', flags='0x9', mtu='65536', speed=None, duplex=None)
+    make_interface(tmp_path, 'veth0', operstate='down', speed='-1', duplex='unknown')
+    assert read_link_stats(str(tmp_path), 'eth0') == {'state': 'up', 'mtu': 1500, 'speed_mbps': 1000, 'duplex': 'full'}
+    assert read_link_stats(str(tmp_path), 'lo') == {'state': 'up', 'mtu': 65536, 'speed_mbps': None, 'duplex': None}
+    assert read_link_stats(str(tmp_path), 'veth0') == {'state': 'down', 'mtu': 1500, 'speed_mbps': None, 'duplex': None}
+    assert read_link_stats(str(tmp_path), 'gone') is None
+
+
+@pytest.fixture
+def addresses(monkeypatch):
+    table = {}
+    link = getattr(socket, 'AF_PACKET', -1)
+    monkeypatch.setattr(interfaces, 'psutil', types.SimpleNamespace(net_if_addrs=lambda: table, AF_LINK=link))
+    return table
+
+
+def addr(family, address):
+    return types.SimpleNamespace(family=family, address=address, netmask=None)
+
+
+def test_read_only_refreshes_named_and_new_interfaces(tmp_path, addresses, monkeypatch):
+    make_interface(tmp_path, 'eth0')
+    make_interface(tmp_path, 'eth1', operstate='down')
+    addresses['eth0'] = [addr(socket.AF_INET, '10.0.0.2')]
+    addresses['eth1'] = []
+    table = InterfaceTable(netlink=False, sys_class_net=str(tmp_path))
+    table.interfaces = table._read()
+    assert table.interfaces['eth0']['ipv4'] == '10.0.0.2' and table.interfaces['eth1']['state'] == 'down'
+
+    reads = []
+    read = interfaces.read_link_stats
+    monkeypatch.setattr(interfaces, 'read_link_stats', lambda path, name: reads.append(name) or read(path, name))
+    (tmp_path / 'eth0' / 'mtu').write_text('9000\n')
+    make_interface(tmp_path, 'veth9')
+    addresses['veth9'] = []
+    del addresses['eth1']
+    updated = table._read({'eth0'})
+    assert sorted(reads) == ['eth0', 'veth9']
+    assert updated['eth0']['mtu'] == 9000
+    assert set(updated) == {'eth0', 'veth9'}
+
+    # Without names every interface is read again
+    reads.clear()
+    table._read()
+    assert sorted(reads) == ['eth0', 'veth9']
+
+
+def test_update_calls_on_change_only_for_changes(tmp_path, addresses):
+    make_interface(tmp_path, 'eth0')
+    addresses['eth0'] = []
+    changes = []
+    table = InterfaceTable(on_change=changes.append, netlink=False, sys_class_net=str(tmp_path))
+    table._update(table._read())
+    table._update(table._read())
+    assert changes == []
+    (tmp_path / 'eth0' / 'operstate').write_text('down\n')
+    table._update(table._read({'eth0'}))
+    assert [change['eth0']['state'] for change in changes] == ['down']
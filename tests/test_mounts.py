@@ -0,0 +1,164 @@
+import time
+import types
+from collections import namedtuple
+from threading import Event
+
+import pytest
+
+from ez_monitor import mounts
+from ez_monitor.mounts import (BREAKER_COOLDOWN, DiskUsageCollector, MountFilter, MountTable, nodev_filesystems, parse_mountinfo,
+                               unescape)
+
+usage = namedtuple('usage', 'total used free percent')
+GOOD = usage(100, 40, 60, 40.0)
+
+MOUNTINFO = (
+    '22 1 259:2 / / rw,relatime shared:1 - ext4 /dev/nvme0n1p2 rw,errors=remount-ro\n'
+    '23 22 0:21 / /proc rw,nosuid,nodev,noexec,relatime shared:12 - proc proc rw\n'
+    '24 22 0:22 / /run rw,nosuid,nodev shared:5 - tmpfs tmpfs rw,size=3273984k,mode=755\n'
+    '30 22 7:0 / /snap/core/1 ro,nodev,relatime shared:8 - squashfs /dev/loop0 ro\n'
+    '31 22 259:3 / /mnt/My\\040Disk rw,noatime shared:20 master:3 - ext4 /dev/nvme1n1p1 rw\n'
+    '32 22 0:50 / /mnt/share rw,relatime shared:30 - nfs4 server:/export\\011tab rw,vers=4.2,addr=10.0.0.2\n'
+    '33 22 259:4 / /mnt/My\\040Disk rw,relatime shared:21 - xfs /dev/nvme2n1 rw,attr2\n'
+    'garbage line\n'
+)
+
+
+def test_parse_mountinfo():
+    parsed = parse_mountinfo(MOUNTINFO)
+    # The line without a separator is skipped
+    assert len(parsed) == 7
+    assert parsed[0] == {'device': '/dev/nvme0n1p2', 'mountpoint': '/', 'fstype': 'ext4', 'opts': 'rw,relatime,errors=remount-ro'}
+    # Any number of optional fields come before the separator
+    assert parsed[4]['mountpoint'] == '/mnt/My Disk' and parsed[4]['device'] == '/dev/nvme1n1p1'
+    assert parsed[5]['device'] == 'server:/export\ttab'
+    assert parsed[5]['opts'] == 'rw,relatime,vers=4.2,addr=10.0.0.2'
+
+
+def test_unescape():
+    assert unescape('/a\\040b\\134c') == '/a b\\c'
+    assert unescape('/plain') == '/plain'
+
+
+def test_table_filters_pseudo_filesystems_loop_devices_and_overmounts():
+    table = MountTable(MountFilter(exclude_fstypes={'proc', 'tmpfs', 'squashfs'}))
+    mounts_read = table._read(MOUNTINFO)
+    assert list(mounts_read) == ['/', '/mnt/My Disk', '/mnt/share']
+    # The later mount on the same path hides the earlier one
+    assert mounts_read['/mnt/My Disk']['fstype'] == 'xfs'
+    assert mounts_read['/mnt/share']['remote'] and not mounts_read['/']['remote']
+
+    local = MountTable(MountFilter(exclude_fstypes=set(), include_remote=False))._read(MOUNTINFO)
+    assert '/mnt/share' not in local and '/snap/core/1' not in local and '/proc' in local
+
+
+def test_root_is_always_reported():
+    mount_filter = MountFilter(exclude_fstypes={'overlay'})
+    assert mount_filter.accepts({'device': 'overlay', 'mountpoint': '/', 'fstype': 'overlay', 'remote': False})
+    assert not mount_filter.accepts({'device': 'overlay', 'mountpoint': '/x', 'fstype': 'overlay', 'remote': False})
+
+
+def test_default_filter_keeps_disk_and_network_filesystems(tmp_path, monkeypatch):
+    filesystems = tmp_path / 'filesystems'
+    filesystems.write_text('nodev\tsysfs\nnodev\ttmpfs\nnodev\tproc\n\text4\nnodev\tnfs4\nnodev\tzfs\n')
+    monkeypatch.setattr(mounts, 'nodev_filesystems', lambda: nodev_filesystems(str(filesystems)))
+    assert MountFilter().exclude_fstypes == {'sysfs', 'tmpfs', 'proc'}
+    pool = {'device': 'tank/data', 'mountpoint': '/tank/data', 'fstype': 'zfs', 'remote': False}
+    assert MountFilter().accepts(pool)
+
+
+class StubTable:
+    def __init__(self, *mountpoints):
+        self.mounts = {mountpoint: {'mountpoint': mountpoint} for mountpoint in mountpoints}
+
+    def get(self):
+        return self.mounts
+
+
+class HangingUsage:
+    """Answers at once, except for the hanging mounts, which block until released."""
+
+    def __init__(self, hanging=(), failing=()):
+        self.hanging = set(hanging)
+        self.failing = set(failing)
+        self.release = Event()
+        self.calls = []
+
+    def __call__(self, path):
+        self.calls.append(path)
+        if path in self.hanging:
+            self.release.wait()
+        if path in self.failing:
+            raise OSError(5, 'Input/output error')
+        return GOOD
+
+
+@pytest.fixture
+def hanging():
+    stub = HangingUsage(hanging={'/nfs'})
+    yield stub
+    stub.release.set()
+
+
+def test_hung_mount_does_not_block_the_others(hanging):
+    collector = DiskUsageCollector(StubTable('/', '/nfs'), timeout=0.1, failure_threshold=2, usage=hanging)
+    started = time.monotonic()
+    result = collector.collect()
+    assert time.monotonic() - started < 1
+    assert result['/'][1] == GOOD and not result['/'][2]['stale']
+    _, nfs_usage, nfs_state = result['/nfs']
+    assert nfs_usage is None and nfs_state['stale'] and nfs_state['breaker'] == 'closed'
+    assert nfs_state['error'] == 'statfs timed out after 0.1s'
+
+    # The hanging call is waited on again, not started twice, and opens the breaker
+    result = collector.collect()
+    assert result['/nfs'][2]['breaker'] == 'open'
+    assert hanging.calls.count('/nfs') == 1
+
+    # An open breaker costs the collection nothing
+    started = time.monotonic()
+    result = collector.collect()
+    assert time.monotonic() - started < 0.05
+    assert result['/'][1] == GOOD
+    assert hanging.calls.count('/nfs') == 1
+
+    # Once the call returns its result is picked up and the breaker closes
+    hanging.release.set()
+    collector.breakers['/nfs'].pending.done.wait(1)
+    _, nfs_usage, nfs_state = collector.collect()['/nfs']
+    assert nfs_usage == GOOD
+    assert nfs_state == {'stale': False, 'error': None, 'updated': nfs_state['updated'], 'breaker': 'closed'}
+
+
+def test_failed_mount_reports_its_last_usage_and_backs_off(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(mounts, 'time', types.SimpleNamespace(monotonic=lambda: now[0], time=time.time))
+    stub = HangingUsage()
+    collector = DiskUsageCollector(StubTable('/', '/data'), timeout=1, failure_threshold=2, usage=stub)
+    collector.collect()
+
+    stub.failing.add('/data')
+    _, data_usage, state = collector.collect()['/data']
+    assert data_usage == GOOD and state['stale'] and state['error'] == '[Errno 5] Input/output error'
+    assert state['breaker'] == 'closed'
+    assert collector.collect()['/data'][2]['breaker'] == 'open'
+    calls = stub.calls.count('/data')
+
+    now[0] += BREAKER_COOLDOWN - 1
+    collector.collect()
+    assert stub.calls.count('/data') == calls
+
+    # One probe after the cooldown, and a failed probe doubles it
+    now[0] += 1
+    assert collector.collect()['/data'][2]['breaker'] == 'open'
+    assert stub.calls.count('/data') == calls + 1
+    assert collector.breakers['/data'].open_until == now[0] + BREAKER_COOLDOWN * 2
+
+
+def test_unmounted_mounts_are_forgotten():
+    table = StubTable('/', '/data')
+    collector = DiskUsageCollector(table, usage=HangingUsage())
+    collector.collect()
+    del table.mounts['/data']
+    assert list(collector.collect()) == ['/']
+    assert list(collector.breakers) == ['/']
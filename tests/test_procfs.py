@@ -0,0 +1,139 @@
+import os
+import shutil
+import sys
+import types
+
+import psutil
+import pytest
+
+from ez_monitor import procfs
+from ez_monitor.procfs import CLOCK_TICKS, PAGE_SIZE, SECTOR_SIZE, STAT_MAX_AGE, ProcfsBackend
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'proc')
+KB = 1024
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'preadv'), reason='ProcfsBackend reads with preadv')
+
+
+@pytest.fixture
+def tree(tmp_path):
+    shutil.copytree(FIXTURES, tmp_path, dirs_exist_ok=True)
+    return tmp_path
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(procfs, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def backend(tree, clock):
+    backend = ProcfsBackend(str(tree / 'proc'), str(tree / 'sys'))
+    yield backend
+    for f in backend.files.values():
+        f.close()
+
+
+def write(path, text):
+    # Rewritten in place, so the backend's open descriptors see the new contents
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def test_cpu_times_from_the_captured_stat(backend):
+    total = backend.cpu_times()
+    assert total.user == 2000 / CLOCK_TICKS and total.idle == 6000 / CLOCK_TICKS
+    assert total.guest == 50 / CLOCK_TICKS
+    cores = backend.cpu_times(percpu=True)
+    assert len(cores) == 2
+    assert cores[1].iowait == 200 / CLOCK_TICKS
+    # scaling_cur_freq is in kHz, averaged over the cores
+    assert backend.cpu_freq().current == 2500.0
+
+
+def test_memory_from_the_captured_meminfo_and_vmstat(backend):
+    mem = backend.virtual_memory()
+    assert mem.total == 8000000 * KB and mem.available == 5000000 * KB
+    assert mem.percent == 37.5
+    # Cached includes the reclaimable slab, like psutil
+    assert mem.cached == 2100000 * KB
+    assert mem.used == (8000000 - 2000000 - 100000 - 2100000) * KB
+    assert (mem.shared, mem.slab) == (50000 * KB, 200000 * KB)
+
+    swap = backend.swap_memory()
+    assert (swap.total, swap.used, swap.free) == (2000000 * KB, 500000 * KB, 1500000 * KB)
+    assert swap.percent == 25.0
+    assert (swap.sin, swap.sout) == (100 * PAGE_SIZE, 200 * PAGE_SIZE)
+
+
+def test_disk_and_network_counters(backend):
+    disks = backend.disk_io_counters(perdisk=True)
+    assert set(disks) == {'loop0', 'sda', 'sda1', 'vda'}
+    sda = disks['sda']
+    assert (sda.read_count, sda.write_count) == (100, 200)
+    assert (sda.read_bytes, sda.write_bytes) == (2000 * SECTOR_SIZE, 4000 * SECTOR_SIZE)
+    assert (sda.read_time, sda.write_time, sda.busy_time) == (50, 80, 120)
+    assert (sda.read_merged_count, sda.write_merged_count) == (10, 20)
+    assert backend.disk_io_counters().read_count == 100 + 90 + 6
+
+    nics = backend.net_io_counters(pernic=True)
+    assert set(nics) == {'lo', 'eth0'}
+    eth0 = nics['eth0']
+    assert (eth0.bytes_recv, eth0.bytes_sent) == (2254062, 27433)
+    assert (eth0.packets_recv, eth0.packets_sent) == (226, 219)
+    assert (eth0.errin, eth0.dropin, eth0.errout, eth0.dropout) == (1, 2, 3, 4)
+    assert backend.net_io_counters().bytes_recv == 2254062 + 5000
+
+
+def test_cpu_percent_from_the_previous_sample(backend, tree, clock):
+    assert backend.cpu_percent() == 0.0
+    assert backend.cpu_times_percent().user == 0.0
+
+    write(tree / 'proc/stat', 'cpu  2600 100 1000 6300 500 0 100 0 50 0\n'
+                              'cpu0 1300 50 500 3150 250 0 50 0 25 0\n'
+                              'cpu1 1300 50 500 3150 250 0 50 0 25 0\n'
+                              'intr 0\n')
+    clock[0] += 1
+    # 1000 ticks passed, 400 of them idle or waiting for I/O
+    assert backend.cpu_percent() == 60.0
+    percent = backend.cpu_times_percent()
+    assert (percent.user, percent.idle, percent.iowait, percent.system) == (60.0, 30.0, 10.0, 0.0)
+
+
+def test_stat_is_parsed_once_per_cycle(backend, tree, clock, monkeypatch):
+    stat = backend.files['stat']
+    reads = []
+    read = stat.read
+    monkeypatch.setattr(stat, 'read', lambda: reads.append(1) or read())
+
+    backend.cpu_times_percent()
+    backend.cpu_percent()
+    backend.cpu_times(percpu=True)
+    assert len(reads) == 1
+
+    clock[0] += STAT_MAX_AGE
+    backend.cpu_times()
+    assert len(reads) == 2
+
+
+def test_short_stat_lines_are_padded(tree, clock):
+    # Kernels before 2.6.33 have no guest_nice column
+    write(tree / 'proc/stat', 'cpu  10 0 10 80 0 0 0 0 0\ncpu0 10 0 10 80 0 0 0 0 0\nintr 0\n')
+    backend = ProcfsBackend(str(tree / 'proc'), str(tree / 'sys'))
+    assert backend.cpu_times().guest_nice == 0.0
+    assert backend.cpu_times().idle == 80 / CLOCK_TICKS
+
+
+def test_unhandled_calls_and_load_fall_through(backend):
+    assert backend.getloadavg() == pytest.approx(os.getloadavg(), abs=1)
+    assert backend.cpu_count() == psutil.cpu_count()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='psutil field names differ per platform')
+def test_field_names_match_psutil(backend):
+    assert backend.cpu_times()._fields == psutil.cpu_times()._fields
+    assert backend.virtual_memory()._fields == psutil.virtual_memory()._fields
+    assert backend.swap_memory()._fields == psutil.swap_memory()._fields
+    assert backend.net_io_counters()._fields == psutil.net_io_counters()._fields
@@ -0,0 +1,193 @@
+import types
+from collections import namedtuple
+
+import psutil
+import pytest
+
+from ez_monitor import procscan
+from ez_monitor.procscan import ProcessScanner
+
+pcputimes = namedtuple('pcputimes', 'user system')
+pmem = namedtuple('pmem', 'rss vms')
+pio = namedtuple('pio', 'read_count write_count read_bytes write_bytes')
+MB = 1024 * 1024
+
+
+class Oneshot:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class StubPlatform:
+    """The platform half of a psutil Process on Linux, whose stat read is not cached across scans."""
+
+    def __init__(self, process):
+        self.process = process
+
+    def _parse_stat_file(self):
+        return {'create_time': self.process._entry()['create_time']}
+
+
+class StubProcess:
+    """Reads whatever process holds the PID at each call, like psutil, with the start time cached."""
+
+    def __init__(self, system, pid):
+        self.system = system
+        self.pid = pid
+        self._create_time = self._entry()['create_time']
+        self._proc = StubPlatform(self)
+
+    def _entry(self):
+        entry = self.system.table.get(self.pid)
+        if entry is None:
+            raise psutil.NoSuchProcess(self.pid)
+        return entry
+
+    def oneshot(self):
+        return self.system.oneshot
+
+    def create_time(self):
+        if self._create_time is None:
+            raise psutil.AccessDenied(self.pid)
+        return self._create_time
+
+    def name(self):
+        return self._entry()['name']
+
+    def username(self):
+        return 'root'
+
+    def status(self):
+        return self._entry().get('status', psutil.STATUS_SLEEPING)
+
+    def cpu_times(self):
+        return pcputimes(self._entry()['cpu'], 0.0)
+
+    def memory_info(self):
+        return pmem(self._entry().get('rss', 10 * MB), 0)
+
+    def io_counters(self):
+        entry = self._entry()
+        return pio(0, 0, entry.get('read', 0), entry.get('write', 0))
+
+
+class StubPsutil:
+    NoSuchProcess = psutil.NoSuchProcess
+    AccessDenied = psutil.AccessDenied
+    ZombieProcess = psutil.ZombieProcess
+    STATUS_RUNNING = psutil.STATUS_RUNNING
+
+    def __init__(self):
+        self.table = {}
+        self.constructed = 0
+        self.oneshot = Oneshot()
+
+    def Process(self, pid):
+        self.constructed += 1
+        return StubProcess(self, pid)
+
+    def pids(self):
+        return sorted(self.table)
+
+    def virtual_memory(self):
+        return types.SimpleNamespace(total=1024 * MB)
+
+    def cpu_count(self):
+        return 4
+
+
+@pytest.fixture
+def system(monkeypatch):
+    system = StubPsutil()
+    monkeypatch.setattr(procscan, 'psutil', system)
+    return system
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(procscan, 'time', types.SimpleNamespace(monotonic=lambda: now[0], time=lambda: 1_700_000_000 + now[0],
+                                                                perf_counter=lambda: now[0]))
+    return now
+
+
+def process(name, create_time, cpu, **fields):
+    return {'name': name, 'create_time': create_time, 'cpu': cpu, **fields}
+
+
+def events(scanner):
+    return [(event['event'], event['pid'], event['name']) for event in scanner.get_tracking()['events']]
+
+
+def test_rates_come_from_the_previous_scan(system, clock):
+    system.table[100] = process('worker', 1_700_000_000, 10.0, rss=100 * MB, read=0)
+    scanner = ProcessScanner()
+    scanner.scan()
+    system.table[100].update(cpu=12.0, rss=110 * MB, read=4 * MB)
+    clock[0] += 2
+    [top] = scanner.scan()['top_cpu']
+    assert top['cpu_percent'] == pytest.approx(100.0)
+    assert top['memory_growth_speed'] == pytest.approx(5.0)
+    assert top['read_speed'] == pytest.approx(2.0)
+    # Neither scan saw the process start or exit
+    assert events(scanner) == []
+
+
+def test_reused_pid_is_an_exit_and_a_start_even_when_cpu_time_grows(system, clock):
+    system.table[100] = process('old', 1_700_000_000, 5.0)
+    scanner = ProcessScanner()
+    scanner.scan()
+
+    # The new process already used more CPU time than the old one had
+    system.table[100] = process('new', 1_700_000_500, 50.0)
+    clock[0] += 1
+    result = scanner.scan()
+    assert events(scanner) == [('exit', 100, 'old'), ('start', 100, 'new')]
+    record = scanner.records[100]
+    assert (record.name, record.create_time) == ('new', 1_700_000_500)
+    # Its CPU usage covers its lifetime, not the difference to the old process
+    assert result['top_cpu'][0]['cpu_percent'] == pytest.approx(50.0 / 501 * 100)
+    # The old process's history went with it
+    assert [p['create_time'] for p in scanner.get_tracking()['processes']] == [1_700_000_500]
+    # The reuse shows in the sample itself, only the new process needed constructing
+    assert system.constructed == 2
+
+
+def test_reused_pid_detected_from_the_start_time_alone(system, clock):
+    system.table[100] = process('same-name', 1_700_000_000, 5.0)
+    scanner = ProcessScanner()
+    scanner.scan()
+    system.table[100] = process('same-name', 1_700_000_001, 5.0)
+    scanner.scan()
+    assert [event['event'] for event in scanner.get_tracking()['events']] == ['exit', 'start']
+    assert scanner.records[100].create_time == 1_700_000_001
+
+
+def test_exited_processes_are_dropped(system, clock):
+    system.table[100] = process('short', 1_700_000_000, 1.0)
+    system.table[200] = process('long', 1_700_000_000, 1.0)
+    scanner = ProcessScanner()
+    scanner.scan()
+    del system.table[100]
+    assert scanner.scan()['tasks'] == 1
+    assert list(scanner.records) == [200]
+    [exit_event] = scanner.get_tracking()['events']
+    assert (exit_event['event'], exit_event['pid'], exit_event['cpu_time']) == ('exit', 100, 1.0)
+
+
+def test_without_a_start_time_a_cpu_time_going_backwards_means_reuse(system, clock):
+    system.table[100] = process('old', None, 50.0)
+    scanner = ProcessScanner()
+    scanner.scan()
+    constructed = system.constructed
+    system.table[100] = process('new', None, 5.0)
+    scanner.scan()
+    assert events(scanner) == [('exit', 100, 'old'), ('start', 100, 'new')]
+    # Scans of a known process read it through its record, nothing is constructed for them
+    system.table[100]['cpu'] = 6.0
+    scanner.scan()
+    scanner.scan()
+    assert system.constructed == constructed + 1
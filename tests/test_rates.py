@@ -0,0 +1,57 @@
+import pytest
+
+from ez_monitor.rates import WRAP_32, WRAP_64, CounterRates, counter_delta, time_delta
+
+FIELDS = {'read_bytes': ('read_speed', 1), 'write_bytes': ('write_speed', 1)}
+
+
+def test_counter_delta():
+    assert counter_delta(100, 150) == 50
+    assert counter_delta(WRAP_32 - 100, 50) == 150
+    # Doubles near 2**64 are 2048 apart, so a 64-bit wrap is only as exact as the counters
+    assert counter_delta(float(WRAP_64 - 4096), 4096.0) == pytest.approx(8192, abs=2048)
+    # A drop that is no wrap is a reset, the counter restarted from 0
+    assert counter_delta(10 ** 12, 5) == 5
+    assert counter_delta(3 * WRAP_32, 5) == 5
+
+
+def test_time_delta():
+    assert time_delta(9000.0, 9002.5) == 2.5
+    assert time_delta(9000.0, 8999.99) == 0.0
+
+
+def test_wrapped_counters_give_the_rate_across_the_wrap():
+    rates = CounterRates(FIELDS)
+    rates.update({'sda': {'read_bytes': WRAP_32 - 1000, 'write_bytes': float(WRAP_64 - 8192)}}, 100.0)
+    result = rates.update({'sda': {'read_bytes': 1000, 'write_bytes': 8192.0}}, 102.0)
+    assert result['sda']['read_speed'] == 1000
+    assert result['sda']['write_speed'] == pytest.approx(8192, abs=1024)
+
+
+def test_decreasing_times_count_as_no_change():
+    rates = CounterRates({'total': ('total', 1), 'idle': ('idle', 1)}, delta=time_delta)
+    rates.update({'cpu0': {'total': 20000.0, 'idle': 9000.0}}, 100.0)
+    result = rates.update({'cpu0': {'total': 20002.0, 'idle': 8999.99}}, 102.0)
+    assert result == {'cpu0': {'total': 1.0, 'idle': 0.0}}
+
+    # As wrapping counters the same step back would be a reset to the whole counter
+    rates = CounterRates({'idle': ('idle', 1)})
+    rates.update({'cpu0': {'idle': 9000.0}}, 100.0)
+    assert rates.update({'cpu0': {'idle': 8999.99}}, 102.0)['cpu0']['idle'] == pytest.approx(4499.995)
+
+
+def test_devices_appearing_and_disappearing():
+    rates = CounterRates(FIELDS)
+    assert rates.update({'sda': {'read_bytes': 100, 'write_bytes': 0}}, 100.0) == {'sda': {'read_speed': 0, 'write_speed': 0}}
+
+    # A new device has no previous sample, so its first rate is 0 whatever its counters
+    result = rates.update({'sda': {'read_bytes': 300, 'write_bytes': 0}, 'sdb': {'read_bytes': 5000, 'write_bytes': 80}}, 101.0)
+    assert result == {'sda': {'read_speed': 200, 'write_speed': 0}, 'sdb': {'read_speed': 0, 'write_speed': 0}}
+
+    # A device that disappears is dropped, the others keep their rates
+    result = rates.update({'sdb': {'read_bytes': 5100, 'write_bytes': 80}}, 102.0)
+    assert result == {'sdb': {'read_speed': 100, 'write_speed': 0}}
+
+    # When it comes back it starts over rather than comparing with its old counters
+    result = rates.update({'sda': {'read_bytes': 10, 'write_bytes': 0}, 'sdb': {'read_bytes': 5200, 'write_bytes': 80}}, 103.0)
+    assert result == {'sda': {'read_speed': 0, 'write_speed': 0}, 'sdb': {'read_speed': 100, 'write_speed': 0}}
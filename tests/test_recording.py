@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+
+from ez_monitor.recording import BLOCK_HEADER, INDEX_RECORD, MAGIC, UNCHANGED, Recording, RecordingWriter, index_path, load_index
+
+
+def write_recording(path, timestamps, block_seconds=10):
+    writer = RecordingWriter(str(path), block_seconds=block_seconds)
+    for timestamp in timestamps:
+        # Every third sample repeats the previous value
+        payload = None if timestamp % 3 == 2 else json.dumps({'usage': timestamp})
+        writer.record(timestamp, 'cpu', payload, 0.01)
+    writer.close()
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / 'out.bin'
+    write_recording(path, range(30))
+    return path
+
+
+def test_blocks_are_indexed_and_read_back(recording):
+    entries, end = load_index(str(recording))
+    assert [(first, last) for first, last, _ in entries] == [(0, 10), (11, 21), (22, 29)]
+    assert end == os.path.getsize(recording)
+
+    samples = list(Recording(str(recording)).read())
+    # The first block's keyframe is empty, the first sample follows it
+    assert [timestamp for timestamp, _, _, _ in samples] == list(range(30))
+    assert samples[1] == (1, 'cpu', 0.01, {'usage': 1})
+    assert samples[2][3] is UNCHANGED
+
+
+def test_read_seeks_to_the_block_holding_since(recording):
+    samples = Recording(str(recording)).read(since=15)
+    # The second block starts with a keyframe of the last recorded value
+    assert next(samples) == (10, 'cpu', 0.01, {'usage': 10})
+    assert next(samples)[0] == 11
+
+
+def test_truncated_recording_keeps_its_complete_blocks(recording):
+    entries, _ = load_index(str(recording))
+    last_offset = entries[-1][2]
+    with open(recording, 'r+b') as f:
+        # Cut the last block short, as a crash while writing it would
+        f.truncate(last_offset + BLOCK_HEADER.size + 3)
+    assert load_index(str(recording)) == (entries[:-1], last_offset)
+    assert Recording(str(recording)).end == 21
+
+    # A torn header is dropped the same way
+    with open(recording, 'r+b') as f:
+        f.truncate(last_offset + 5)
+    assert load_index(str(recording)) == (entries[:-1], last_offset)
+
+
+def test_blocks_missing_from_the_index_are_found(recording):
+    entries, end = load_index(str(recording))
+    # The recorder was killed after writing the last block but before indexing it, mid-entry
+    with open(index_path(str(recording)), 'r+b') as f:
+        f.truncate(INDEX_RECORD.size * 2 - 4)
+    assert load_index(str(recording)) == (entries, end)
+    os.remove(index_path(str(recording)))
+    assert load_index(str(recording)) == (entries, end)
+
+
+def test_index_entries_that_do_not_follow_each_other_are_dropped(recording):
+    entries, end = load_index(str(recording))
+    with open(index_path(str(recording)), 'wb') as f:
+        f.write(INDEX_RECORD.pack(entries[0][0], entries[0][1], entries[0][2]))
+        f.write(INDEX_RECORD.pack(entries[1][0], entries[1][1], entries[1][2] + 1))
+    # The bad entry is replaced by walking the block headers
+    assert load_index(str(recording)) == (entries, end)
+
+
+def test_truncated_recording_is_continued_after_its_last_complete_block(recording):
+    entries, _ = load_index(str(recording))
+    with open(recording, 'r+b') as f:
+        f.truncate(entries[-1][2] + BLOCK_HEADER.size + 3)
+    write_recording(recording, range(40, 45))
+    assert [(first, last) for first, last, _ in load_index(str(recording))[0]] == [(0, 10), (11, 21), (40, 44)]
+    # The continuing writer starts without earlier values, so its first keyframe is empty
+    assert [timestamp for timestamp, _, _, _ in Recording(str(recording)).read(since=40)] == list(range(40, 45))
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'not a recording')
+    with pytest.raises(ValueError, match='not an ez_monitor recording'):
+        load_index(str(path))
+    path.write_bytes(MAGIC)
+    with pytest.raises(ValueError, match='no complete blocks'):
+        Recording(str(path))
@@ -0,0 +1,48 @@
+import gzip
+import json
+
+import pytest
+
+from ez_monitor import app
+from ez_monitor.snapshot import RUN_ID, MetricsSnapshot
+
+DISKS = {'/': {'mountpoint': '/', 'percent': 40.0}, '/data': {'mountpoint': '/data', 'percent': 75.0}}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, 'current_snapshot', MetricsSnapshot(7, {'cpu': {'usage': 12.5}}, DISKS))
+    return app.app.test_client()
+
+
+def test_etag_and_not_modified(client):
+    response = client.get('/metrics')
+    etag = response.headers['ETag']
+    assert response.json == {'cpu': {'usage': 12.5}, 'disk': DISKS['/']}
+    assert etag.startswith(f'"{RUN_ID}-7-')
+
+    assert client.get('/metrics', headers={'If-None-Match': etag}).status_code == 304
+    # Each disk and encoding has its own tag
+    other = client.get('/metrics?disk=/data', headers={'If-None-Match': etag})
+    assert other.status_code == 200 and other.json['disk'] == DISKS['/data']
+    assert other.headers['ETag'] != etag
+
+
+def test_etags_differ_between_runs():
+    # Snapshot ids restart with the process, a tag kept by a client across a restart must not match
+    before = MetricsSnapshot(7, {}, DISKS, run_id='0a1b2c3d').get_body('/')[0]
+    after = MetricsSnapshot(7, {}, DISKS, run_id='4e5f6a7b').get_body('/')[0]
+    assert before != after
+
+
+def test_gzip(client):
+    response = client.get('/metrics', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data)) == {'cpu': {'usage': 12.5}, 'disk': DISKS['/']}
+    assert 'Content-Encoding' not in client.get('/metrics').headers
+
+
+def test_unknown_disk_is_not_found(client):
+    response = client.get('/metrics?disk=/nowhere')
+    assert response.status_code == 404
+    assert response.json == {'error': 'Unknown disk: /nowhere'}
@@ -0,0 +1,28 @@
+import time
+
+from ez_monitor import tsdb
+from ez_monitor.tsdb import TimeSeriesStore
+from tests.helpers import wait_for
+
+
+def test_samples_are_written_and_queried(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    now = time.time()
+    for i in range(5):
+        store.record(now + i, {'cpu': {'usage': float(i)}})
+    assert wait_for(lambda: store.queue.empty() and store.query(['cpu.usage'], now - 1, now + 10)['cpu.usage']['values'] == [0.0, 1.0, 2.0, 3.0, 4.0])
+    assert store.dropped == 0
+
+
+def test_queue_is_bounded_while_the_writer_falls_behind(tmp_path, monkeypatch):
+    monkeypatch.setattr(tsdb, 'QUEUE_SIZE', 10)
+    store = TimeSeriesStore(str(tmp_path))
+    now = time.time()
+    # The writer holds the lock while writing, so holding it stands in for a hung disk
+    with store.lock:
+        for i in range(100):
+            store.record(now + i, {'cpu': {'usage': float(i)}})
+        assert store.queue.qsize() <= 10
+        # At most one batch was taken off the queue before the writer blocked
+        assert store.dropped >= 89
+    assert wait_for(store.queue.empty)